@@ -0,0 +1,62 @@
+"""
+Benchmark of the construction of `network_3phases_lindistflow`, with the size of the feeder.
+
+The structure of the network (parents, children, impedance matrices and nominal voltages) is gathered once by
+`lms2.electric.network.network_arrays`, the construction time should thus grow linearly with the number of
+variables.
+
+Usage : python benchmarks/bench_network.py [time steps] [Nd ...]
+"""
+
+import logging
+import sys
+import time
+
+from pyomo.environ import Block, ConcreteModel, Constraint, RangeSet, Var
+
+from lms2.electric.graph_utils import radial_graph, calc_edge_pq_matrix
+from lms2.electric.network import network_3phases_lindistflow, network_arrays, cable_4_70
+
+
+def feeder(nd):
+    g = radial_graph(nd)
+    for n1, n2, data in g.edges(data=True):
+        data.update(length=0.05, cable=cable_4_70)
+    for n, data in g.nodes(data=True):
+        data.update(p_out=[0.] * 3, q_out=[0.] * 3, fix_p_out=[n % 2 == 0] * 3, fix_q_out=[True] * 3)
+    return calc_edge_pq_matrix(g)
+
+
+def build(g, nt):
+    m = ConcreteModel()
+    m.time = RangeSet(0, nt - 1)
+    m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=g))
+    return m
+
+
+def main():
+    logging.getLogger('lms2').setLevel(logging.ERROR)
+    nt = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    sizes = [int(n) for n in sys.argv[2:]] or [10, 30, 100, 300, 1000]
+
+    build(feeder(2), 2)  # units and pyomo plugins are loaded once
+    print(f'{"Nd":>6} {"nodes":>6} {"steps":>6} {"arrays (s)":>11} {"build (s)":>10} {"variables":>10} '
+          f'{"constraints":>12} {"us/variable":>12}')
+    for nd in sizes:
+        g = feeder(nd)
+        t = time.perf_counter()
+        network_arrays(g)
+        t_arrays = time.perf_counter() - t
+
+        t = time.perf_counter()
+        m = build(g, nt)
+        t_build = time.perf_counter() - t
+
+        n_var = sum(1 for _ in m.component_data_objects(Var))
+        n_con = sum(1 for _ in m.component_data_objects(Constraint))
+        print(f'{nd:>6} {g.number_of_nodes():>6} {nt:>6} {t_arrays:>11.4f} {t_build:>10.3f} {n_var:>10} {n_con:>12} '
+              f'{1e6 * t_build / n_var:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark of the synchronization of data with the horizon in `read_data`.
+
+Compares the resampling kernel (`lms2.tools.data_processing.resample`) with the previous implementation, which
+joins the data with the horizon and interpolates the union of both indexes with pandas.
+
+Usage : python benchmarks/bench_resample.py
+"""
+
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from lms2.core.horizon import SimpleHorizon
+from lms2.tools.data_processing import _synchronize, _synchronize_join
+
+
+def timeit(f, *args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        res = f(*args)
+        best = min(best, time.perf_counter() - t)
+    return best, res
+
+
+def main():
+    warnings.simplefilter('ignore')
+    print(f'{"data":>10} {"columns":>8} {"horizon":>8} {"method":>7} {"join (s)":>10} {"kernel (s)":>11} {"speed-up":>9}')
+
+    for freq, n_col, step in [('10min', 3, '15 min'), ('1min', 3, '15 min'), ('1min', 20, '15 min'),
+                              ('1min', 20, '1 min')]:
+        index = pd.date_range('2020-01-01', '2021-01-01', freq=freq, tz='Europe/Paris')
+        data = pd.DataFrame({f'c{k}': np.random.rand(len(index)) for k in range(n_col)}, index=index)
+        horizon = SimpleHorizon(tstart='2020-01-01 00:00:00', tend='2020-12-31 00:00:00', time_step=step)
+
+        for method in ['time', 'pad']:
+            t_join, ref = timeit(_synchronize_join, horizon, data, method, index.dtype)
+            t_kernel, res = timeit(_synchronize, horizon, data, method, index.dtype)
+            pd.testing.assert_frame_equal(ref, res, check_exact=True, check_freq=False)
+            print(f'{len(data):>10} {n_col:>8} {len(horizon.current):>8} {method:>7} {t_join:>10.4f} '
+                  f'{t_kernel:>11.4f} {t_join / t_kernel:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
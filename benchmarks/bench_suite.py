@@ -0,0 +1,392 @@
+"""
+Benchmark suite of the construction of models and of the loading of data, at realistic scales.
+
+Measurements are build-only (no solver is needed) :
+
+    - `battery_v2` and `battery_v3` over horizons of 96, 672 and 35,040 time steps (15 minutes),
+    - `network_3phases_lindistflow` on `radial_graph(Nd)`, for Nd = 10, 100 and 1,000,
+    - generation of random feeders (`random_feeder`) of 1,000 to 100,000 nodes,
+    - the power flow (`power_flow`) of these feeders over a year (hourly and 15 minutes),
+    - fleets of 1, 10 and 100 `dwelling_v2` (one day, 15 minutes), with the finite difference and the state-space
+      thermal structures, and the same fleets as a single `dwelling_fleet` block,
+    - the simulation (`simulate_dwellings`) of 100 and 1,000 dwellings over a week, and of 100 dwellings over a year,
+    - `read_data` (direct, cached and stream modes) and `load_data` on a year-long file (1 minute resolution).
+
+For each case, the wall time of the construction of the blocks, of the discretization (if any), and the number of
+variables and constraints are saved in a json file, with the current commit, so that results of different commits
+can be compared.
+
+Usage :
+    python benchmarks/bench_suite.py [-o results.json] [-k battery] [--quick] [--compare previous.json]
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import Block, Constraint, Param, RangeSet, TransformationFactory, Var
+from pyomo.dae import ContinuousSet
+
+from lms2.core.horizon import SimpleHorizon
+from lms2.core.models import LModel
+
+CASES = []
+
+
+def case(name, **params):
+    """ Registers a benchmark case, the function returns a dictionary of measurements. """
+
+    def decorator(f):
+        CASES.append((name, params, f))
+        return f
+
+    return decorator
+
+
+class Timer(object):
+    """ Accumulates the wall time of named steps. """
+
+    def __init__(self):
+        self.times = dict()
+
+    def __call__(self, step):
+        timer = self
+
+        class _Step(object):
+            def __enter__(self):
+                self.t = time.perf_counter()
+
+            def __exit__(self, *args):
+                timer.times[step] = timer.times.get(step, 0.) + time.perf_counter() - self.t
+
+        return _Step()
+
+
+def _size(m):
+    return dict(variables=sum(1 for _ in m.component_data_objects(Var, descend_into=True)),
+                constraints=sum(1 for _ in m.component_data_objects(Constraint, active=True, descend_into=True)))
+
+
+# -------------------------------------------------------------------------------------------------------------------
+# batteries
+# -------------------------------------------------------------------------------------------------------------------
+
+def _battery(version, n):
+    from lms2.electric.batteries import battery_v2, battery_v3
+
+    rule = dict(v2=battery_v2, v3=battery_v3)[version]
+    timer = Timer()
+    with timer('build'):
+        m = LModel()
+        m.time = ContinuousSet(bounds=(0, n * 900))
+        m.bat = Block(rule=lambda b: rule(b, time=m.time, c_bat=10, p_max=5, p_min=5, soc0=50, socf=50))
+    with timer('discretization'):
+        TransformationFactory('dae.finite_difference').apply_to(m, nfe=n)
+    return dict(timer.times, **_size(m))
+
+
+for _version in ['v2', 'v3']:
+    for _n in [96, 672, 35040]:
+        case(f'battery_{_version}', steps=_n)(lambda version=_version, n=_n: _battery(version, n))
+
+
+# -------------------------------------------------------------------------------------------------------------------
+# distribution network
+# -------------------------------------------------------------------------------------------------------------------
+
+def _network(nd, nt):
+    from lms2.electric.graph_utils import radial_graph, calc_edge_pq_matrix
+    from lms2.electric.network import network_3phases_lindistflow, cable_4_70
+
+    timer = Timer()
+    with timer('graph'):
+        g = radial_graph(nd)
+        for n1, n2, data in g.edges(data=True):
+            data.update(length=0.05, cable=cable_4_70)
+        for n, data in g.nodes(data=True):
+            data.update(p_out=[0.] * 3, q_out=[0.] * 3, fix_p_out=[n % 2 == 0] * 3, fix_q_out=[True] * 3)
+        calc_edge_pq_matrix(g)
+    with timer('build'):
+        m = LModel()
+        m.time = RangeSet(0, nt - 1)
+        m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=g))
+    return dict(timer.times, **_size(m))
+
+
+for _nd in [10, 100, 1000]:
+    case('network_3phases_lindistflow', nd=_nd, time_steps=24)(lambda nd=_nd: _network(nd, 24))
+
+
+def _feeder(n):
+    from lms2.electric.graph_utils import random_feeder
+
+    timer = Timer()
+    with timer('graph'):
+        g = random_feeder(n, seed=0)
+    return dict(timer.times, nodes=g.number_of_nodes())
+
+
+for _n in [1000, 10000, 100000]:
+    case('random_feeder', nodes=_n)(lambda n=_n: _feeder(n))
+
+
+def _power_flow(n, nt):
+    from lms2.electric.graph_utils import random_feeder
+    from lms2.electric.power_flow import power_flow
+
+    g = random_feeder(n, seed=0)
+    rng = np.random.default_rng(0)
+    p = np.zeros((n, 3, nt))
+    for k, (node, data) in enumerate(g.nodes(data=True)):
+        if data['kind'] == 'dwelling':
+            p[k, data['phase']] = rng.uniform(0, data['load'] / 4, nt)
+    timer = Timer()
+    with timer('power_flow'):
+        res = power_flow(g, p, 0.2 * p, power_unit=1e3)
+    return dict(timer.times, iterations=res.iterations)
+
+
+for _n, _nt in [(100, 8760), (1000, 8760), (1000, 35040)]:
+    case('power_flow', nodes=_n, steps=_nt)(lambda n=_n, nt=_nt: _power_flow(n, nt))
+
+
+# -------------------------------------------------------------------------------------------------------------------
+# dwellings
+# -------------------------------------------------------------------------------------------------------------------
+
+def _building_parameters():
+    """ Parameters of a 2 zone building (see :func:`lms2.building.graph.build_2zone_graph`). """
+
+    bp = {f'abs{i}{o}{z}': 0.05 for i in range(1, 6) for o in 'NESW' for z in 'DN'}
+    bp.update({f'f{i}{z}': 0.2 for i in range(1, 6) for z in 'DN'})
+    bp.update(CiD=2e6, CflD=5e7, CwiD=2e7, CwD=9e7, CfiD=3e7, CiN=2e6, CwiN=2e7, CwN=9e7,
+              UwD=60, infD=20, hwD=900, hflD=400, UflD=50, hwiD=800, UfDN=300, UfND=300, hwiN=800, hwN=900,
+              UwN=60, infN=20)
+    return bp
+
+
+def _dwellings(nd, n, mode='dae', fleet=False):
+    from lms2.building.dwellings import dwelling_fleet, dwelling_v2
+    from lms2.building.graph import build_2zone_graph
+    from lms2.environment.environment import environment
+
+    graph = build_2zone_graph(_building_parameters())
+    timer = Timer()
+    with timer('build'):
+        m = LModel()
+        if mode == 'ss':
+            m.time = ContinuousSet(initialize=[900 * k for k in range(n + 1)])
+        else:
+            m.time = ContinuousSet(bounds=(0, n * 900))
+        m.env = Block(rule=lambda b: environment(b, time=m.time))
+        if fleet:
+            m.dwellings = Block(rule=lambda b: dwelling_fleet(b, time=m.time, env=m.env, mode=mode,
+                                                              parameters={'2zone': _building_parameters()},
+                                                              types=['2zone'] * nd))
+        else:
+            m.dwellings = Block(range(nd), rule=lambda b, i: dwelling_v2(b, time=m.time, env=m.env, graph=graph,
+                                                                         mode=mode))
+    with timer('discretization'):
+        TransformationFactory('dae.finite_difference').apply_to(m, nfe=n)
+    return dict(timer.times, **_size(m))
+
+
+for _nd in [1, 10, 100]:
+    case('dwelling_v2', dwellings=_nd, steps=96)(lambda nd=_nd: _dwellings(nd, 96))
+    case('dwelling_v2_ss', dwellings=_nd, steps=96)(lambda nd=_nd: _dwellings(nd, 96, mode='ss'))
+    case('dwelling_fleet', dwellings=_nd, steps=96)(lambda nd=_nd: _dwellings(nd, 96, fleet=True))
+    case('dwelling_fleet_ss', dwellings=_nd, steps=96)(lambda nd=_nd: _dwellings(nd, 96, mode='ss', fleet=True))
+
+
+def _simulation(nd, n):
+    from lms2.building.graph import build_2zone_graph
+    from lms2.building.simulation import simulate_dwellings
+
+    rng = np.random.default_rng(0)
+    t = np.arange(n) * 900
+    profiles = {'Te': 5 + 5 * np.sin(2 * np.pi * t / 86400), 'Tg': np.full(n, 10.),
+                'Q_heat_D': rng.uniform(0, 4000, (nd, n)), 'Q_heat_N': rng.uniform(0, 2000, (nd, n))}
+    graph = build_2zone_graph(_building_parameters())
+    timer = Timer()
+    with timer('simulation'):
+        simulate_dwellings(graph, profiles)
+    return timer.times
+
+
+for _nd, _n in [(100, 672), (1000, 672), (100, 35040)]:
+    case('simulate_dwellings', dwellings=_nd, steps=_n)(lambda nd=_nd, n=_n: _simulation(nd, n))
+
+
+# -------------------------------------------------------------------------------------------------------------------
+# data loading
+# -------------------------------------------------------------------------------------------------------------------
+
+DATA_DIR = os.path.join(tempfile.gettempdir(), 'lms2_benchmarks')
+
+
+def _year_file():
+    """ Year-long csv file, at a 1 minute resolution (generated once). """
+
+    path = os.path.join(DATA_DIR, 'year_1min.csv')
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        index = pd.date_range('2020-01-01', '2021-01-01', freq='1min', inclusive='left')
+        rng = np.random.default_rng(0)
+        hours = (index.hour + index.minute / 60).to_numpy()
+        data = pd.DataFrame({'p_pv': np.maximum(0, np.sin((hours - 6) / 12 * np.pi)) * 3000,
+                             'base_load': 500 + 200 * rng.random(len(index)),
+                             'T_ext': 10 + 8 * np.sin(hours / 24 * 2 * np.pi),
+                             'price': 0.1 + 0.05 * rng.random(len(index))}, index=index)
+        data.index.name = 'Time'
+        data.to_csv(path, date_format='%d/%m/%Y %H:%M', float_format='%.3f')
+    return path
+
+
+def _read(mode):
+    from lms2.tools.data_processing import read_data
+
+    path = _year_file()
+    options = dict(date_parser='%d/%m/%Y %H:%M', tz_data='UTC')
+    timer = Timer()
+    if mode == 'stream':
+        horizon = SimpleHorizon(tstart='2020-07-01 00:00:00', tend='2020-07-08 00:00:00', time_step='15 minutes')
+        with timer('read'):
+            df = read_data(horizon, path, stream=True, **options)
+    else:
+        horizon = SimpleHorizon(tstart='2020-01-02 00:00:00', tend='2020-12-30 00:00:00', time_step='15 minutes')
+        if mode == 'cache':
+            cache = os.path.join(DATA_DIR, 'cache')
+            shutil.rmtree(cache, ignore_errors=True)
+            with timer('cold'):
+                read_data(horizon, path, cache=cache, **options)
+            with timer('read'):
+                df = read_data(horizon, path, cache=cache, **options)
+        else:
+            with timer('read'):
+                df = read_data(horizon, path, **options)
+    return dict(timer.times, rows=len(df))
+
+
+for _mode in ['direct', 'cache', 'stream']:
+    case('read_data', mode=_mode)(lambda mode=_mode: _read(mode))
+
+
+@case('load_data', steps=34752)
+def _load():
+    from lms2.tools.data_processing import load_data, read_data
+
+    horizon = SimpleHorizon(tstart='2020-01-02 00:00:00', tend='2020-12-30 00:00:00', time_step='15 minutes')
+    df = read_data(horizon, _year_file(), date_parser='%d/%m/%Y %H:%M', tz_data='UTC')
+
+    m = LModel()
+    # same points as a model discretized with horizon.nfe finite elements
+    m.time = ContinuousSet(initialize=horizon.index)
+    m.p = Param(m.time, mutable=True, default=0)
+    m.nodes = RangeSet(0, 9)
+    m.q = Param(m.nodes, m.time, mutable=True, default=0)
+
+    timer = Timer()
+    with timer('load'):
+        load_data(horizon, m.p, df['p_pv'])
+    with timer('load_slices'):
+        for k in m.nodes:
+            load_data(horizon, m.q[k, :], df['base_load'])
+    return timer.times
+
+
+# -------------------------------------------------------------------------------------------------------------------
+# runner
+# -------------------------------------------------------------------------------------------------------------------
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(pattern=None, quick=False):
+    """
+    Runs the benchmark cases.
+
+    :param str pattern: only run the cases whose name contains `pattern`
+    :param bool quick: only run the smallest size of each case
+    :return: list of results
+    """
+
+    results = []
+    seen = set()
+    for name, params, f in CASES:
+        if pattern is not None and pattern not in name:
+            continue
+        if quick and name in seen and name != 'read_data':
+            continue
+        seen.add(name)
+
+        gc.collect()
+        t = time.perf_counter()
+        try:
+            res = f()
+            status = 'ok'
+        except Exception as err:
+            res, status = dict(), f'{type(err).__name__}: {err}'
+        res['total'] = time.perf_counter() - t
+        results.append(dict(name=name, params=params, status=status, results=res))
+
+        print(f'{name:<30} {json.dumps(params):<35} {res["total"]:>9.3f} s  '
+              + ('  '.join(f'{k}={v:.3f}' if isinstance(v, float) else f'{k}={v}'
+                           for k, v in res.items() if k != 'total') if status == 'ok' else status))
+    return results
+
+
+def compare(results, previous):
+    """ Prints the ratio of the total times of the cases of two runs. """
+
+    ref = {(r['name'], json.dumps(r['params'], sort_keys=True)): r for r in previous['results']}
+    print(f'\ncomparison with {previous.get("commit")} ({previous.get("date")}) :')
+    for r in results:
+        p = ref.get((r['name'], json.dumps(r['params'], sort_keys=True)))
+        if p is None or r['status'] != 'ok' or p['status'] != 'ok':
+            continue
+        ratio = r['results']['total'] / p['results']['total']
+        print(f'{r["name"]:<30} {json.dumps(r["params"]):<35} {p["results"]["total"]:>9.3f} s -> '
+              f'{r["results"]["total"]:>9.3f} s  (x{ratio:.2f})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='json file of the results')
+    parser.add_argument('-k', dest='pattern', default=None, help='only run the cases containing this pattern')
+    parser.add_argument('--quick', action='store_true', help='only run the smallest size of each case')
+    parser.add_argument('--compare', default=None, help='json file of previous results')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    logging.getLogger('pyomo').setLevel(logging.ERROR)
+
+    results = run(args.pattern, args.quick)
+    output = dict(commit=_commit(), date=datetime.datetime.now().isoformat(timespec='seconds'),
+                  python=platform.python_version(), platform=platform.platform(), results=results)
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f'\nresults saved in {args.output}')
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,9 @@
 Basic Units, multi-physical base model
 """
 
+import weakref
+
+import numpy as np
 from pyomo.core import Reals
 from pyomo.environ import *
 from pyomo.network import Port
@@ -69,20 +72,9 @@ def effort_source(b, **options):
 
     return b
 
-## OLD CODE : DEPRECIATED
-#
-def _init_input(m, t, index_name='profile_index', profile_name='profile_value'):
-    """
-    Rule for initiating variable profile using interpolation of a given profile.
-
-    :param m: Block
-    :param t: Set time
-    :param index_name: name of the index set
-    :param profile_name: name of the profile parameter
-    :return: None
-    """
 
-    from scipy.interpolate.interpolate import interp1d
+def _check_profile(m, index_name, profile_name):
+    """ Check that the profile index and values exist in the block m, before interpolating the profile. """
 
     if not hasattr(m, index_name):
         raise AttributeError(f'{m} object has no attribute {index_name}.'
@@ -97,6 +89,23 @@ def _init_input(m, t, index_name='profile_index', profile_name='profile_value'):
         raise TypeError(f'{profile_name} is not a instance of Param,'
                         f' but is actually : f{type(m.component(profile_name))}. Cannot proceed.')
 
+## OLD CODE : DEPRECIATED
+#
+def _init_input(m, t, index_name='profile_index', profile_name='profile_value'):
+    """
+    Rule for initiating variable profile using interpolation of a given profile.
+
+    :param m: Block
+    :param t: Set time
+    :param index_name: name of the index set
+    :param profile_name: name of the profile parameter
+    :return: None
+    """
+
+    from scipy.interpolate import interp1d
+
+    _check_profile(m, index_name, profile_name)
+
     interp_x = list(m.component(index_name).ordered_data())
     interp_y = list(m.component(profile_name).extract_values().values())
     funct = interp1d(interp_x, interp_y, kind='linear', fill_value='extrapolate')
@@ -109,6 +118,57 @@ def _init_input(m, t, index_name='profile_index', profile_name='profile_value'):
         return b
 
 
+class _ProfileInterpolator(object):
+    """
+    Default rule of the profile parameter created by :func:`fix_profile`.
+
+    The interpolant of the given profile is built once per block, and all the time points of the parameter are
+    evaluated in one vectorized call. Values are then returned from the cache. They are evaluated again only if the
+    profile changes (i.e. if its components are replaced, or if points are added to or removed from the profile
+    index), or if new time points are requested (after discretization, for instance).
+
+    The cache does not compare the data of the profile: the profile parameter is immutable, and its values are
+    copied from the data (e.g. a DataFrame) when the instance is created, so that later edits of the data are not
+    seen by the profile, nor by its interpolation. A new profile must be given by replacing the profile parameter.
+    Moving points of the profile index in place, without changing its length, is not detected either.
+
+    The cache is weakly keyed by the blocks, so that blocks which are no longer used (e.g. instances rebuilt at each
+    step of a receding horizon) are released with their profile components and cached values.
+    """
+
+    def __init__(self, flow_name='flow', index_name='profile_index', profile_name='profile_value'):
+        self.flow_name = flow_name
+        self.index_name = index_name
+        self.profile_name = profile_name
+        self._cache = weakref.WeakKeyDictionary()
+
+    def _is_valid(self, m, key):
+        index, profile, n = key
+        return index is m.component(self.index_name) and profile is m.component(self.profile_name) \
+            and n == len(index)
+
+    def _evaluate(self, m, points):
+        from scipy.interpolate import interp1d
+
+        _check_profile(m, self.index_name, self.profile_name)
+
+        interp_x = list(m.component(self.index_name).ordered_data())
+        interp_y = list(m.component(self.profile_name).extract_values().values())
+        funct = interp1d(interp_x, interp_y, kind='linear', fill_value='extrapolate')
+        return dict(zip(points, funct(np.asarray(points, dtype=float)).tolist()))
+
+    def __call__(self, m, t):
+        key, values = self._cache.get(m, (None, None))
+        if key is None or not self._is_valid(m, key) or t not in values:
+            points = list(m.component(self.flow_name).index_set())
+            if t not in points:
+                points.append(t)
+            values = self._evaluate(m, points)
+            index = m.component(self.index_name)
+            self._cache[m] = ((index, m.component(self.profile_name), len(index)), values)
+        return values[t]
+
+
 def _set_bounds(m, t,
                 index_name='profile_index',
                 up_profile_name='up_profile_value',
@@ -188,12 +248,13 @@ def fix_profile(m, flow_name='flow', index_name='profile_index', profile_name='p
     m.add_component(index_name, Set(doc=doc_index))
     m.add_component(profile_name, Param(m.component(index_name), default=_rule, doc=doc_value))
 
+    # Pyomo only calls plain functions as default rules
+    interpolator = _ProfileInterpolator(flow_name=flow_name, index_name=index_name, profile_name=profile_name)
+
     m.del_component(flow_name)
     m.add_component(flow_name, Param(m.time,
                                      doc='new profile, indexed by time',
-                                     default=lambda bl, t: _init_input(bl, t,
-                                                                       index_name=index_name,
-                                                                       profile_name=profile_name)))
+                                     default=lambda bl, t: interpolator(bl, t)))
 
 #
 # def bound_profile(m, t, flow_name='flow',
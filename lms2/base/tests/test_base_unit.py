@@ -259,6 +259,82 @@ class TestAbsFixedFlowLoad(TestCase):
         self.assertEqual(inst.u.p.extract_values(), {0: 10.0, 7.5: 10.75, 15: 12.0})
 
 
+class TestProfileInterpolator(TestCase):
+
+    def test_interpolation(self):
+        from lms2.base.block import fix_profile, _init_input
+        from pyomo.environ import AbstractModel, TransformationFactory, Var, value
+        from pyomo.dae import ContinuousSet
+
+        m = AbstractModel()
+        m.time = ContinuousSet()
+        m.p = Var(m.time)
+
+        fix_profile(m, flow_name='p', profile_name='pro', index_name='ind')
+
+        data = {None: {'time': {None: [0, 15]},
+                       'ind': {None: [0, 10, 15]},
+                       'pro': dict(zip([0, 10, 15], [10, 11, 12]))}}
+
+        inst = m.create_instance(data)
+        TransformationFactory('dae.finite_difference').apply_to(inst, nfe=6)
+
+        for t in inst.time:
+            self.assertAlmostEqual(value(inst.p[t]), _init_input(inst, t, index_name='ind', profile_name='pro'))
+        self.assertEqual(value(inst.p[5]), 10.5)
+
+    def test_profile_data(self):
+        """ the interpolation follows replaced profiles, data edited after the creation of the instance is ignored """
+        from lms2.base.block import fix_profile
+        from pyomo.environ import AbstractModel, Param, Var, value
+        from pyomo.dae import ContinuousSet
+
+        m = AbstractModel()
+        m.time = ContinuousSet()
+        m.p = Var(m.time)
+        fix_profile(m, flow_name='p', profile_name='pro', index_name='ind')
+
+        profile = dict(zip([0, 10, 15], [10, 11, 12]))
+        inst = m.create_instance({None: {'time': {None: [0, 15]}, 'ind': {None: [0, 10, 15]}, 'pro': profile}})
+        self.assertEqual(value(inst.p[15]), 12)
+
+        # the data is copied in the immutable profile
+        profile[15] = 100
+        self.assertEqual(value(inst.p[15]), 12)
+        with self.assertRaises(TypeError):
+            inst.pro[15] = 100
+
+        inst.del_component('pro')
+        inst.add_component('pro', Param(inst.ind, initialize={0: 0, 10: 0, 15: 30}))
+        self.assertEqual(value(inst.p[15]), 30)
+        self.assertEqual(value(inst.p[0]), 0)
+
+    def test_profile_release(self):
+        """ the cache of the interpolation does not keep the instances, nor their profiles, alive """
+        import gc
+        import weakref
+        from lms2.base.block import fix_profile
+        from pyomo.environ import AbstractModel, Var, value
+        from pyomo.dae import ContinuousSet
+
+        m = AbstractModel()
+        m.time = ContinuousSet()
+        m.p = Var(m.time)
+        fix_profile(m, flow_name='p', profile_name='pro', index_name='ind')
+
+        refs = []
+        for _ in range(3):
+            inst = m.create_instance({None: {'time': {None: [0, 15]}, 'ind': {None: [0, 10, 15]},
+                                             'pro': dict(zip([0, 10, 15], [10, 11, 12]))}})
+            self.assertEqual(value(inst.p[15]), 12)
+            refs += [weakref.ref(inst), weakref.ref(inst.ind), weakref.ref(inst.pro)]
+        del inst
+        # entries of the cache are removed when the instances are collected, their profiles at the next collection
+        gc.collect()
+        gc.collect()
+        self.assertTrue(all(r() is None for r in refs))
+
+
 if __name__ == '__main__':
     import unittest
 
@@ -1,2 +1,2 @@
 # -*- coding: utf-8 -*-
-__all__ = ['dwellings', 'graph', 'structure', 'systems']
+__all__ = ['dwellings', 'graph', 'structure', 'systems', 'state_space', 'simulation']
@@ -2,13 +2,16 @@
 """
 Dwelling models
 """
+import numpy as np
 from pyomo.environ import *
 from pyomo.environ import units as u
-from pyomo.dae import Integral, ContinuousSet
+from pyomo.dae import Integral, ContinuousSet, DerivativeVar
 
-__all__ = ['dwelling_v2']
+__all__ = ['dwelling_v2', 'dwelling_fleet']
 
-from lms2.building.structure import thermal_structure_block
+from lms2.building.graph import build_2zone_graph
+from lms2.building.state_space import ThermalStateSpace, OPERATIVE_TEMPERATURES
+from lms2.building.structure import thermal_structure_block, ThermalIncidence, _linear_combinations
 from lms2.building.systems import hot_water_tank, heat_pump
 from lms2.social.occupancy import occupancy
 from lms2.environment.environment import solar_inputs, environment
@@ -78,6 +81,10 @@ def dwelling_v1(b, **kwargs):
             # summing all the heat transfer from the neighbours (arithmetic sum)
             exp += sum([b.struct.q[qe[0], qe[1], t] for qe in b.struct.graph.in_edges(n)])
             exp -= sum([b.struct.q[qe[0], qe[1], t] for qe in b.struct.graph.out_edges(n)])
+
+            # nodes without capacity nor heat flow (e.g. the hot water tank, balanced in hw_balance)
+            if is_constant(exp):
+                return Constraint.Skip
             return exp, 0
 
     @b.Expression(b.time, doc='total electric power')
@@ -159,13 +166,21 @@ def dwelling_v2(b, **kwargs):
         comfort         total comfort of night and day zone (linear expression)
         =============== ===================================================================
 
+    With `mode='ss'`, the thermal structure is an exact discrete state-space model (see
+    :func:`lms2.building.structure.thermal_structure_block`), the constraint `thermal_balance` is then not declared.
+    The time set must contain all its (uniformly spaced) points at construction, e.g.
+    ``ContinuousSet(initialize=np.arange(0, 96 * 900 + 1, 900))``.
+
     :param b: Dwelling Block
-    :param kwargs:
+    :param kwargs: graph, time, env, mode ('dae' or 'ss') and state_space (see
+        :func:`lms2.building.structure.thermal_structure_block`)
     :return:
     """
 
     graph = kwargs.pop('graph', None)
     time = kwargs.pop('time', ContinuousSet(bounds=(0, 1), doc='Time set'))
+    mode = kwargs.pop('mode', 'dae')
+    state_space = kwargs.pop('state_space', None)
     dict_env = {'time': time}
     env_temp = Block()
     env = kwargs.pop('env', environment(env_temp, **dict_env))
@@ -191,7 +206,8 @@ def dwelling_v2(b, **kwargs):
     heat_pump(b.hp, **dict_hp)
 
     # thermal structure block:
-    dict_struct = {'time': time, 'graph': graph, 'env': env, 'occ': b.occ}
+    dict_struct = {'time': time, 'graph': graph, 'env': env, 'occ': b.occ, 'mode': mode, 'hp': b.hp,
+                   'state_space': state_space}
     b.struct = Block()
     thermal_structure_block(b.struct, **dict_struct)
 
@@ -202,30 +218,27 @@ def dwelling_v2(b, **kwargs):
         # ..note :: the factor 900 comes from the hot water flow unit, which is liter per 15 min
         return b.hwt.V * b.hwt.dT_HW[t], b.hp.Q_heat_HW[t] - (b.hwt.T_HW_d - b.hwt.T_CW) * b.occ.Flow_HW[t] / 900
 
-    @b.Constraint(time, b.struct.id_nodes, doc='thermal power balance')
-    def thermal_balance(b, t, n):
-        if b.struct.C[n]() is None and b.struct.graph.nodes(data='T_fix')[n] is not None:
-            return Constraint.Skip
-        else:
-            q_fix_dict = b.struct.graph.nodes(data='Q_fix')[n]
-            q_control_dict = b.struct.graph.nodes(data='Q_control')[n]
-            exp = 0
+    # in the state-space mode, the heat balance is part of the state equations of the thermal structure
+    if mode == 'dae':
+        # heat gains and controls are resolved once, from the incidence table of the structure
+        inc = b.struct.incidence
+        gains = {n: [(fact, b.occ.component(q)) for q, fact in inc.Q_fix[n]] +
+                    [(fact, b.hp.component(q)) for q, fact in inc.Q_control[n]] for n in inc.balanced}
 
-            # Discharge of thermal capacity (First law of thermodynamics)
-            if b.struct.C[n]() is not None:
-                exp -= b.struct.C[n] * b.struct.dT[n, t]
+        @b.Constraint(time, b.struct.id_nodes, doc='thermal power balance')
+        def thermal_balance(b, t, n):
+            if n not in inc.balanced:
+                return Constraint.Skip
 
-            # summing all the heat flow inputs (Q_fix in the graph description)
-            if (q_fix_dict is not None) & (isinstance(q_fix_dict, dict)):
-                exp += sum([round(fact, 6) * b.occ.component(q)[t] for q, fact in q_fix_dict.items()])
-
-            # summing all the heat flow control variable (Q_control in the graph description)
-            if (q_control_dict is not None) & (isinstance(q_control_dict, dict)):
-                exp += sum([round(fact, 6) * b.hp.component(q)[t] for q, fact in q_control_dict.items()])
+            # summing all the heat flow inputs and control variables (Q_fix and Q_control in the graph description)
+            exp = sum(fact * q[t] for fact, q in gains[n])
 
             # summing all the heat transfer from the neighbours (arithmetic sum)
-            exp += sum([b.struct.q[qe[0], qe[1], t] for qe in b.struct.graph.in_edges(n)])
-            exp -= sum([b.struct.q[qe[0], qe[1], t] for qe in b.struct.graph.out_edges(n)])
+            exp += sum(sign * b.struct.q[n1, n2, t] for n1, n2, sign in inc.incidence[n])
+
+            # Discharge of thermal capacity (First law of thermodynamics)
+            if n in inc.C:
+                exp -= inc.C[n] * b.struct.dT[n, t]
             return exp, 0
 
     @b.Expression(time, doc='total electric power')
@@ -249,4 +262,313 @@ def dwelling_v2(b, **kwargs):
     # integral are not working well for blocks and sub-blocks, defining confort on the upper level (feeder)
     #b.kpi_comfort = Integral(time, wrt=time, rule=comfort, doc='Integral of the comfort over the time horizon')
 
-    return b
\ No newline at end of file
+    return b
+
+
+def dwelling_fleet(b, **kwargs):
+    """
+    Fleet of dwellings
+
+    Same model as :func:`dwelling_v2`, for a fleet of dwellings sharing the same time set and environment, where the
+    dwelling is an index of the components (e.g. `T[d, n, t]`, `Q_heat_D[d, t]`) instead of a sub-block per dwelling.
+    The number of components does not depend on the number of dwellings. As in :func:`dwelling_v2`, the occupancy,
+    the hot water tanks and the heat pumps are the sub-blocks `occ`, `hwt` and `hp` (see
+    :func:`lms2.social.occupancy.occupancy`, :func:`lms2.building.systems.hot_water_tank` and
+    :func:`lms2.building.systems.heat_pump`), their components being indexed by the dwellings (e.g.
+    `hp.Q_heat_D[d, t]`).
+
+    The thermal structure of each dwelling is built (by `graph_builder`, :func:`lms2.building.graph.build_2zone_graph`
+    by default) from the building parameters of its type, given in the table `parameters` (a dictionary or a
+    ``pandas.DataFrame`` indexed by the names of the types, e.g. the names of `lms2.building.graph.model_types`, one
+    column per building parameter). All the graphs must have the same nodes and edges.
+
+    With `mode='ss'`, the thermal structures are exact discrete state-space models (see
+    :func:`lms2.building.structure.thermal_structure_block`), `T` is then indexed by the nodes with a thermal
+    capacity (`states`), and `q`, `dT`, `heat_flow`, `boundary_conditions` and `thermal_balance` are not declared.
+
+    .. table::
+        :width: 100%
+
+        =============== ===================================================================
+        Sets            Documentation
+        =============== ===================================================================
+        dwellings       dwellings of the fleet
+        nodes           thermal nodes
+        edges           thermal edges
+        states          nodes with a thermal capacity (state-space mode)
+        =============== ===================================================================
+
+    .. table::
+        :width: 100%
+
+        =============== ===================================================================
+        Variables       Documentation
+        =============== ===================================================================
+        T               nodes temperature (°C)
+        q               heat flow (W)
+        comfort_N       comfort in the night zone
+        comfort_D       comfort in the day zone
+        p_elec_max      Maximal electrical power
+        =============== ===================================================================
+
+    .. table::
+        :width: 100%
+
+        =============== ===================================================================
+        Parameters      Documentation
+        =============== ===================================================================
+        U               thermal resistance of edges
+        C               Thermal capacities of nodes
+        T_0             Initial temperature of nodes
+        =============== ===================================================================
+
+    .. table::
+        :width: 100%
+
+        =================== ===================================================================
+        Constraints         Documentation
+        =================== ===================================================================
+        heat_flow           Edge heat transfer
+        t_init              Initial condition on node temperature
+        boundary_conditions Dirichlet condition for thermal nodes
+        thermal_balance     thermal power balance
+        state_equation      Discrete state equation (state-space mode)
+        hw_balance          HW power balance
+        _p_elec_max         maximal electric power
+        thermal_comfort     absolute value constraint, upper bound
+        =================== ===================================================================
+
+    .. table::
+        :width: 100%
+
+        =============== ===================================================================
+        Expressions     Documentation
+        =============== ===================================================================
+        Top_N           Operational temperature Night zone
+        Top_D           Operational temperature Day zone
+        p_elec          total electric power
+        comfort         total comfort of night and day zone (linear expression)
+        =============== ===================================================================
+
+    Example:
+        >>> m.fleet = Block(rule=lambda b: dwelling_fleet(b, time=m.time, env=m.env, parameters=df,
+        ...                                               types=['SFH_D_1_2zone_TAB'] * 50 + ['SFH_T_3_2zone_REF1'] * 50))
+
+    :param b: fleet Block
+    :param kwargs: time, env, parameters (table of building parameters), types (type of each dwelling, list or
+        dictionary indexed by the labels of the dwellings), mode ('dae' or 'ss') and graph_builder
+    :return:
+    """
+
+    time = kwargs.pop('time', ContinuousSet(bounds=(0, 1), doc='Time set'))
+    env = kwargs.pop('env', None)
+    parameters = kwargs.pop('parameters')
+    types = kwargs.pop('types')
+    mode = kwargs.pop('mode', 'dae')
+    graph_builder = kwargs.pop('graph_builder', build_2zone_graph)
+
+    if mode not in ('dae', 'ss'):
+        raise ValueError(f"Unknown mode {mode!r} of the fleet, expected 'dae' or 'ss'.")
+    if hasattr(parameters, 'iterrows'):
+        parameters = {k: dict(row) for k, row in parameters.iterrows()}
+    types = dict(types) if isinstance(types, dict) else dict(enumerate(types))
+    unknown = sorted(set(types.values()) - set(parameters), key=str)
+    if unknown:
+        raise ValueError(f'The building parameters of the types {unknown} are not given.')
+
+    # one thermal graph per type of building, sharing the same topology
+    graphs = {k: graph_builder(parameters[k]) for k in dict.fromkeys(types.values())}
+    incidences = {k: ThermalIncidence.from_graph(g) for k, g in graphs.items()}
+    graph = next(iter(graphs.values()))
+    for k, g in graphs.items():
+        if list(g.nodes) != list(graph.nodes) or list(g.edges) != list(graph.edges):
+            raise ValueError(f'The thermal graph of the type {k} has not the same nodes and edges as the others.')
+    missing = [n for w in OPERATIVE_TEMPERATURES.values() for n in w if n not in graph.nodes]
+    if missing:
+        raise ValueError(f'The nodes {missing} of the operative temperatures are not in the thermal graphs.')
+
+    b.types = types
+    b.dwellings = Set(initialize=list(types), doc='dwellings of the fleet')
+    b.nodes = Set(initialize=list(graph.nodes), doc='thermal nodes')
+    b.edges = Set(initialize=list(graph.edges), dimen=2, doc='thermal edges')
+
+    # occupancy, hot water tanks and heat pumps, indexed by the dwellings
+    b.occ = Block()
+    occupancy(b.occ, time=time, index=b.dwellings)
+    b.hwt = Block()
+    hot_water_tank(b.hwt, time=time, index=b.dwellings)
+    b.hp = Block()
+    heat_pump(b.hp, time=time, occ=b.occ, index=b.dwellings)
+
+    # thermal structures
+    b.U = Param(b.dwellings, b.edges,
+                initialize={(d,) + e: v for d, k in types.items() for e, v in incidences[k].U.items()},
+                doc='thermal resistance of edges', default=0, domain=Reals)
+    b.C = Param(b.dwellings, b.nodes,
+                initialize={(d, n): v for d, k in types.items() for n, v in incidences[k].C.items()},
+                doc='Thermal capacities of nodes', default=0, within=Any)
+    b.T_0 = Param(b.dwellings, b.nodes,
+                  initialize={(d, n): v for d, k in types.items() for n, v in incidences[k].T_init.items()},
+                  doc='Initial temperature of nodes', mutable=True, within=Reals)
+    b.alpha = Param(mutable=True, default=0.5, doc='weight coefficient between negative and positive deviation')
+    b.delta_T = Param(default=2.5, doc='acceptable temperature deviation for normal comfort')
+
+    b.comfort_N = Var(b.dwellings, time, initialize=0, doc='comfort in the night zone', domain=NonNegativeReals)
+    b.comfort_D = Var(b.dwellings, time, initialize=0, doc='comfort in the day zone', domain=NonNegativeReals)
+
+    if mode == 'dae':
+        _fleet_structure_dae(b, time, env, incidences)
+    else:
+        _fleet_structure_ss(b, time, env, graphs)
+
+    @b.Constraint(b.dwellings, time, doc='HW power balance')
+    def hw_balance(b, d, t):
+        # ..note :: the factor 900 comes from the hot water flow unit, which is liter per 15 min
+        return b.hwt.V * b.hwt.dT_HW[d, t], \
+            b.hp.Q_heat_HW[d, t] - (b.hwt.T_HW_d - b.hwt.T_CW) * b.occ.Flow_HW[d, t] / 900
+
+    @b.Expression(b.dwellings, time, doc='total electric power')
+    def p_elec(b, d, t):
+        return (b.hp.Q_heat_N[d, t] + b.hp.Q_heat_D[d, t] + b.hp.Q_heat_HW[d, t]) / b.hp.COP
+
+    b.p_elec_max = Var(b.dwellings, initialize=0, doc='Maximal electrical power ', units=u.watt, bounds=(0, 1e6))
+
+    @b.Constraint(b.dwellings, time, doc='maximal electric power')
+    def _p_elec_max(b, d, t):
+        return 0, b.p_elec_max[d] - b.p_elec[d, t], None
+
+    @b.Constraint(b.dwellings, time, doc='absolute value constraint, lower bound N')
+    def _bound_N1(b, d, t):
+        return b.comfort_N[d, t] >= -b.alpha * (b.Top_N[d, t] - b.occ.Tset_n[d, t])
+
+    @b.Constraint(b.dwellings, time, doc='absolute value constraint, upper bound N')
+    def _bound_N2(b, d, t):
+        return b.comfort_N[d, t] >= (1 - b.alpha) * (b.Top_N[d, t] - b.occ.Tset_n[d, t])
+
+    @b.Constraint(b.dwellings, time, doc='absolute value constraint, lower bound D')
+    def _bound_D1(b, d, t):
+        return b.comfort_D[d, t] >= -b.alpha * (b.Top_D[d, t] - b.occ.Tset_d[d, t])
+
+    @b.Constraint(b.dwellings, time, doc='absolute value constraint, upper bound D')
+    def _bound_D2(b, d, t):
+        return b.comfort_D[d, t] >= (1 - b.alpha) * (b.Top_D[d, t] - b.occ.Tset_d[d, t])
+
+    @b.Expression(b.dwellings, time, doc='total comfort of night and day zone (linear expression)')
+    def comfort(b, d, t):
+        return b.occ.u_D[d, t] * b.comfort_D[d, t] + b.occ.u_N[d, t] * b.comfort_N[d, t]
+
+    @b.Constraint(b.dwellings, time, doc='absolute value constraint, upper bound')
+    def thermal_comfort(b, d, t):
+        return b.comfort[d, t] <= b.delta_T
+
+    return b
+
+
+def _fleet_structure_dae(b, time, env, incidences):
+    """ Heat flows, boundary conditions and heat balances of the thermal structures of a fleet (finite differences). """
+
+    b.q = Var(b.dwellings, b.edges, time, doc="heat flow (W)", units=u.watt)
+    b.T = Var(b.dwellings, b.nodes, time, initialize=0, units=u.deg, bounds=(-20, 55), doc="nodes temp.")
+    b.dT = DerivativeVar(b.T, wrt=time, doc="node temperature derivative", units=u.deg / u.s)
+
+    # tables of the types of the dwellings, the heat gains and heat controls being indexed by the dwellings
+    inc = {d: incidences[k] for d, k in b.types.items()}
+    t_fix = {n: env.component(name) for n, name in next(iter(incidences.values())).T_fix.items()}
+    gains = {k: {n: [(fact, b.occ.component(q)) for q, fact in i.Q_fix[n]] +
+                    [(fact, b.hp.component(q)) for q, fact in i.Q_control[n]] for n in i.balanced}
+             for k, i in incidences.items()}
+
+    @b.Constraint(b.dwellings, time, b.edges, doc='Edge heat transfer')
+    def heat_flow(b, d, t, e1, e2):
+        return inc[d].U[e1, e2] * (b.T[d, e1, t] - b.T[d, e2, t]), b.q[d, e1, e2, t]
+
+    @b.Constraint(b.dwellings, b.nodes, doc='Initial condition on node temperature')
+    def t_init(b, d, n):
+        if n in inc[d].T_init:
+            return b.T[d, n, 0] == b.T_0[d, n]
+        else:
+            return Constraint.Skip
+
+    @b.Constraint(b.dwellings, time, b.nodes, doc='Dirichlet condition for thermal nodes')
+    def boundary_conditions(b, d, t, n):
+        if n in t_fix:
+            return b.T[d, n, t] == t_fix[n][t]
+        else:
+            return Constraint.Skip
+
+    @b.Constraint(b.dwellings, time, b.nodes, doc='thermal power balance')
+    def thermal_balance(b, d, t, n):
+        k = inc[d]
+        if n not in k.balanced:
+            return Constraint.Skip
+        exp = sum(fact * q[d, t] for fact, q in gains[b.types[d]][n])
+        exp += sum(sign * b.q[d, n1, n2, t] for n1, n2, sign in k.incidence[n])
+        if n in k.C:
+            exp -= k.C[n] * b.dT[d, n, t]
+        return exp, 0
+
+    @b.Expression(b.dwellings, time, doc='Operational temperature Night zone')
+    def Top_N(b, d, t):
+        return sum(w * b.T[d, n, t] for n, w in OPERATIVE_TEMPERATURES['Top_N'].items())
+
+    @b.Expression(b.dwellings, time, doc='Operational temperature Day zone')
+    def Top_D(b, d, t):
+        return sum(w * b.T[d, n, t] for n, w in OPERATIVE_TEMPERATURES['Top_D'].items())
+
+
+def _fleet_structure_ss(b, time, env, graphs):
+    """ Discrete state equations of the thermal structures of a fleet (exact state-space models, one per type). """
+
+    points = list(time)
+    steps = np.diff(points)
+    if len(points) < 2 or not np.allclose(steps, steps[0]):
+        raise ValueError('The state-space mode of the fleet needs a time set of uniformly spaced points, '
+                         'e.g. a ContinuousSet initialized with all its points.')
+
+    models = {k: ThermalStateSpace.from_graph(g) for k, g in graphs.items()}
+    states = next(iter(models.values())).states
+    for k, ss in models.items():
+        if ss.states != states or ss.inputs != next(iter(models.values())).inputs:
+            raise ValueError(f'The state-space model of the type {k} has not the same states and inputs as the others.')
+    b.states = Set(initialize=states, doc='nodes with a thermal capacity')
+    b.T = Var(b.dwellings, b.states, time, initialize=0, units=u.deg, bounds=(-20, 55), doc="states temperature")
+
+    # fixed temperatures are shared by the fleet, heat gains and heat controls are indexed by the dwellings
+    sources = {'Q_fix': b.occ, 'Q_control': b.hp}
+    inputs = [(env.component(name), False) if kind == 'T_fix' else (sources[kind].component(name), True)
+              for kind, name in models[next(iter(models))].inputs]
+    tables = {}
+    for k, ss in models.items():
+        Ad, Bd = ss.discretize(steps[0])
+        outputs = {name: (ss.C[i].tolist(), ss.D[i].tolist()) for i, name in enumerate(ss.outputs)}
+        tables[k] = Ad.tolist(), Bd.tolist(), outputs
+    row = {n: i for i, n in enumerate(states)}
+    following = dict(zip(points[:-1], points[1:]))
+
+    def _data(key):
+        d, t = key
+        return [b.T[d, s, t] for s in states], [v[d, t] if indexed else v[t] for v, indexed in inputs]
+
+    _combination = _linear_combinations(_data)
+
+    @b.Constraint(b.dwellings, time, b.states, doc='Discrete state equation')
+    def state_equation(b, d, t, n):
+        if t not in following:
+            return Constraint.Skip
+        Ad, Bd, _ = tables[b.types[d]]
+        return b.T[d, n, following[t]] == _combination((d, t), Ad[row[n]], Bd[row[n]])
+
+    @b.Constraint(b.dwellings, b.states, doc='Initial condition on node temperature')
+    def t_init(b, d, n):
+        if (d, n) in b.T_0:
+            return b.T[d, n, points[0]] == b.T_0[d, n]
+        else:
+            return Constraint.Skip
+
+    @b.Expression(b.dwellings, time, doc='Operational temperature Night zone')
+    def Top_N(b, d, t):
+        return _combination((d, t), *tables[b.types[d]][2]['Top_N'])
+
+    @b.Expression(b.dwellings, time, doc='Operational temperature Day zone')
+    def Top_D(b, d, t):
+        return _combination((d, t), *tables[b.types[d]][2]['Top_D'])
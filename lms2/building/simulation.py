@@ -0,0 +1,219 @@
+"""
+Fast simulation of the thermal structures of dwellings, for given heating schedules
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from pyomo.environ import value
+
+from lms2.building.state_space import ThermalStateSpace, OPERATIVE_TEMPERATURES
+
+__all__ = ['ThermalSimulation', 'simulate_dwellings']
+
+
+@dataclass(repr=False)
+class ThermalSimulation:
+    """
+    Temperatures of a fleet of dwellings over uniformly spaced time points (see :func:`simulate_dwellings`), the
+    dwellings being the leading axis of the arrays.
+    """
+    time: np.ndarray            # (T,) time points (s)
+    nodes: list                 # nodes of the graphs with a temperature
+    T: np.ndarray               # (D, nodes, T) temperatures of the nodes
+    outputs: list               # names of the outputs (operative temperatures)
+    y: np.ndarray               # (D, outputs, T) outputs
+    T_HW: np.ndarray            # (D, T) temperature of the hot water tanks
+    edges: list                 # edges of the graphs
+    U: np.ndarray               # (D, edges) conductances of the edges
+    inputs: dict                # (D, T) values of the inputs (profiles and heat controls)
+
+    @property
+    def q(self):
+        """ (D, edges, T) heat flows of the edges """
+
+        row = {n: k for k, n in enumerate(self.nodes)}
+        q = np.zeros((self.T.shape[0], len(self.edges), len(self.time)))
+        for k, (n1, n2) in enumerate(self.edges):
+            if n1 in row and n2 in row:
+                q[:, k] = self.U[:, k, None] * (self.T[:, row[n1]] - self.T[:, row[n2]])
+        return q
+
+    def load(self, block, dwelling=0):
+        """
+        Sets the simulated values as initial values of the variables of a dwelling (see
+        :func:`lms2.building.dwellings.dwelling_v2`), or of all the dwellings of a fleet (see
+        :func:`lms2.building.dwellings.dwelling_fleet`, in the order of its set `dwellings`), e.g. to warm start an
+        optimization. Values are interpolated at the points of the time set of the block.
+
+        Temperatures and their derivatives, heat flows, heat controls, maximal electric power and hot water
+        temperatures are set, as well as the comfort variables if the set temperatures `Tset_d` and `Tset_n` are
+        inputs of the simulation. The states of a reduced state-space structure are not set.
+
+        :param block: dwelling_v2 or dwelling_fleet block
+        :param int dwelling: index of the simulated dwelling loaded into a dwelling_v2 block
+        """
+
+        if hasattr(block, 'dwellings'):
+            for k, d in enumerate(block.dwellings):
+                self._load(k, lambda c, *index, d=d: c[(d,) + index], block,
+                           {'T': block.T, 'dT': getattr(block, 'dT', None), 'q': getattr(block, 'q', None),
+                            'T_HW': (block.hwt.T_HW, block.hwt.dT_HW), 'p_elec': (block.p_elec, block.p_elec_max[d]),
+                            'comfort_N': block.comfort_N, 'comfort_D': block.comfort_D, 'Q': block.hp})
+        else:
+            struct = block.struct
+            self._load(dwelling, lambda c, *index: c[index], struct,
+                       {'T': struct.T, 'dT': getattr(struct, 'dT', None), 'q': getattr(struct, 'q', None),
+                        'T_HW': (block.hwt.T_HW, block.hwt.dT_HW), 'p_elec': (block.p_elec, block.p_elec_max),
+                        'comfort_N': struct.comfort_N, 'comfort_D': struct.comfort_D, 'Q': block.hp})
+
+    def _load(self, k, get, params, components):
+        """ Sets the values of the dwelling `k`, `get(component, *index)` being the data of the component. """
+
+        T = components['T']
+        time = list(list(T.index_set().subsets())[-1])
+
+        def _set(component, index, series, derivative=None):
+            values = np.interp(time, self.time, series)
+            try:
+                data = [get(component, *index, t) for t in time]
+            except KeyError:
+                # e.g. nodes which are not states of the state-space mode
+                return
+            for d, v in zip(data, values.tolist()):
+                d.set_value(v)
+            if derivative is not None and len(time) > 1:
+                # backward differences, the first point taking the first difference
+                slopes = np.diff(values) / np.diff(time)
+                for t, v in zip(time, np.concatenate([slopes[:1], slopes]).tolist()):
+                    get(derivative, *index, t).set_value(v)
+
+        for i, n in enumerate(self.nodes):
+            _set(T, (n,), self.T[k, i], components['dT'])
+        _set(T, ('T_HW',), self.T_HW[k], components['dT'])
+        T_HW, dT_HW = components['T_HW']
+        _set(T_HW, (), self.T_HW[k], dT_HW)
+        if components['q'] is not None:
+            q = self.q[k]
+            for i, e in enumerate(self.edges):
+                _set(components['q'], tuple(e), q[i])
+        for name, series in self.inputs.items():
+            if name.startswith('Q_heat'):
+                _set(components['Q'].component(name), (), series[k])
+        p_elec, p_elec_max = components['p_elec']
+        p_elec_max.set_value(max(value(get(p_elec, t)) for t in time))
+
+        if 'Tset_n' in self.inputs and 'Tset_d' in self.inputs:
+            alpha = value(params.alpha)
+            for zone, tset in [('N', 'Tset_n'), ('D', 'Tset_d')]:
+                deviation = self.y[k, self.outputs.index(f'Top_{zone}')] - self.inputs[tset][k]
+                comfort = np.maximum(-alpha * deviation, (1 - alpha) * deviation)
+                _set(components[f'comfort_{zone}'], (), comfort)
+
+
+def simulate_dwellings(graphs, profiles, dt=900, T0=None, T_HW_0=None, V=200, T_HW_d=42, T_CW=10):
+    """
+    Simulation of the thermal structures of dwellings, for given heating schedules.
+
+    Each thermal graph (see :mod:`lms2.building.graph`) is assembled into its linear state-space model (see
+    :class:`lms2.building.state_space.ThermalStateSpace`), discretized exactly with the time step `dt`, inputs being
+    held between time points as in the state-space mode of the thermal structure. The dwellings are simulated
+    together, by vectorized updates of the states of all the dwellings at each time step. The temperatures of the
+    nodes without capacity are recovered from the states, and the hot water tanks are integrated as in the constraint
+    `hw_balance` of the dwelling discretized by backward finite differences.
+
+    Profiles are given by the names of the components of the `occupancy`, `environment` and `heat_pump` blocks :
+    fixed temperatures (`Te`, `Tg`), heat gains (`Q_sol_N`, `Q_int_D`, ...), heat controls (`Q_heat_N`, `Q_heat_D`,
+    `Q_heat_HW`), hot water demand (`Flow_HW`), and set temperatures (`Tset_n`, `Tset_d`, used to compute the
+    comfort variables when loaded, see :meth:`ThermalSimulation.load`). Each profile is an array of shape (T,),
+    shared by the dwellings, or (D, T). Missing heat gains and heat controls are null, fixed temperatures must be
+    given.
+
+    >>> res = simulate_dwellings([build_2zone_graph(bp) for bp in parameters], {'Te': te, 'Q_heat_D': q_heat_d})
+    >>> res.load(m.dwelling, dwelling=3)
+
+    :param graphs: thermal graph (networkx.DiGraph) shared by the dwellings, or list of the graphs of the D dwellings,
+        with the same nodes
+    :param dict profiles: (T,) or (D, T) values of the inputs at the T time points (a DataFrame of shared profiles
+        might be given)
+    :param float dt: time step (s)
+    :param T0: initial temperatures of the nodes with a capacity, dictionary or (D, states) array (default: `T_init`
+        of the nodes)
+    :param T_HW_0: initial temperature of the hot water tanks, float or (D,) array (default: `T_init` of the node
+        `T_HW` or 55)
+    :param float V: volume of the hot water tanks
+    :param float T_HW_d: temperature of the demanded hot water
+    :param float T_CW: temperature of the cold water
+    :return: ThermalSimulation
+    """
+
+    profiles = {k: np.asarray(v, dtype=float) for k, v in dict(profiles).items()}
+    if any(v.ndim not in (1, 2) for v in profiles.values()):
+        raise ValueError('Profiles must be arrays of shape (time,) or (dwellings, time).')
+    if isinstance(graphs, (list, tuple)):
+        nd = len(graphs)
+    else:
+        nd = max([v.shape[0] for v in profiles.values() if v.ndim == 2], default=1)
+        graphs = [graphs] * nd
+    lengths = {v.shape[-1] for v in profiles.values()}
+    if len(lengths) != 1:
+        raise ValueError(f'Profiles must have the same number of time points, received {sorted(lengths)}.')
+    nt = lengths.pop()
+    try:
+        profiles = {k: np.broadcast_to(v, (nd, nt)) for k, v in profiles.items()}
+    except ValueError:
+        raise ValueError(f'Profiles of shape (dwellings, time) must have {nd} rows.')
+
+    # state-space models of the distinct graphs, whose outputs are the temperatures of the nodes
+    graph = graphs[0]
+    nodes = [n for n in graph.nodes if graph.nodes[n].get('T_fix') is not None
+             or graph.nodes[n].get('C') is not None or graph.degree(n) > 0]
+    operative = {name: w for name, w in OPERATIVE_TEMPERATURES.items() if set(w) <= set(graph.nodes)}
+    models = {}
+    for g in graphs:
+        if id(g) not in models:
+            if list(g.nodes) != list(graph.nodes) or list(g.edges) != list(graph.edges):
+                raise ValueError('The thermal graphs of the dwellings must have the same nodes and edges.')
+            models[id(g)] = ThermalStateSpace.from_graph(g, outputs={**{n: {n: 1} for n in nodes}, **operative})
+    ss = models[id(graph)]
+    if any(m.inputs != ss.inputs for m in models.values()):
+        raise ValueError('The thermal graphs of the dwellings must have the same inputs.')
+
+    missing = [name for kind, name in ss.inputs if kind == 'T_fix' and name not in profiles]
+    if missing:
+        raise ValueError(f'The profiles of the fixed temperatures {missing} are not given.')
+    u = np.stack([profiles.get(name, np.zeros((nd, nt))) for _, name in ss.inputs], axis=1)
+
+    # discrete matrices of each dwelling, shared by the dwellings of the same graph
+    discrete = {k: m.discretize(dt) for k, m in models.items()}
+    Ad = np.stack([discrete[id(g)][0] for g in graphs])
+    Bd = np.stack([discrete[id(g)][1] for g in graphs])
+    C = np.stack([models[id(g)].C for g in graphs])
+    D = np.stack([models[id(g)].D for g in graphs])
+
+    if T0 is None:
+        T0 = np.array([[models[id(g)].x0.get(s, np.nan) for s in ss.states] for g in graphs])
+    elif isinstance(T0, dict):
+        T0 = np.array([[T0.get(s, np.nan) for s in ss.states]] * nd)
+    T0 = np.broadcast_to(np.asarray(T0, dtype=float), (nd, len(ss.states)))
+    if np.isnan(T0).any():
+        raise ValueError('The initial temperatures of the nodes with a capacity are not all known.')
+
+    x = np.empty((nd, len(ss.states), nt))
+    x[:, :, 0] = T0
+    forced = np.einsum('dij,djt->dit', Bd, u)
+    for k in range(nt - 1):
+        x[:, :, k + 1] = np.einsum('dij,dj->di', Ad, x[:, :, k]) + forced[:, :, k]
+    y = np.einsum('dij,djt->dit', C, x) + np.einsum('dij,djt->dit', D, u)
+
+    # hot water tanks : V dT_HW/dt = Q_heat_HW - (T_HW_d - T_CW) Flow_HW / 900 (flows in liter per 15 min)
+    if T_HW_0 is None:
+        T_HW_0 = [g.nodes['T_HW'].get('T_init', 55) if 'T_HW' in g.nodes else 55 for g in graphs]
+    heat = profiles.get('Q_heat_HW', np.zeros((nd, nt))) - (T_HW_d - T_CW) * profiles.get('Flow_HW', 0) / 900
+    T_HW = np.empty((nd, nt))
+    T_HW[:, 0] = T_HW_0
+    T_HW[:, 1:] = T_HW[:, :1] + np.cumsum(heat[:, 1:], axis=1) * dt / V
+
+    return ThermalSimulation(time=np.arange(nt) * dt, nodes=nodes, T=y[:, :len(nodes)],
+                             outputs=list(operative), y=y[:, len(nodes):], T_HW=T_HW, edges=list(graph.edges),
+                             U=np.array([[u for *_, u in g.edges(data='U', default=0)] for g in graphs]),
+                             inputs=dict(profiles))
@@ -0,0 +1,294 @@
+"""
+State-space representation of thermal RC graphs
+"""
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.linalg import expm, solve_continuous_lyapunov
+
+__all__ = ['ThermalStateSpace', 'ReductionReport', 'OPERATIVE_TEMPERATURES']
+
+logger = logging.getLogger('lms2.building.state_space')
+
+# weights of the node temperatures in the operative temperatures of the 2 zone graphs (see
+# :func:`lms2.building.graph.build_2zone_graph` and the expressions `Top_N` and `Top_D` of the thermal structure)
+OPERATIVE_TEMPERATURES = {
+    'Top_N': {'TwiN': 1 / 6, 'TwN': 1 / 6, 'TfiN': 1 / 6, 'TiN': 1 / 2},
+    'Top_D': {'TwiD': 1 / 8, 'TwD': 1 / 8, 'TfiD': 1 / 8, 'TflD': 1 / 8, 'TiD': 1 / 2},
+}
+
+
+@dataclass(repr=False)
+class ThermalStateSpace:
+    """
+    Linear state-space model of a thermal RC graph
+
+        dx/dt = A x + B u,      y = C x + D u
+
+    The states `x` are the temperatures of the nodes with a thermal capacity `C`. The inputs `u` are the fixed
+    temperatures (`T_fix` of the nodes, e.g. `Te`, `Tg`), the heat gains (keys of the `Q_fix` dictionaries, e.g.
+    `Q_sol_N`, `Q_int_D`) and the heat controls (keys of the `Q_control` dictionaries, e.g. `Q_heat_D`). Each input is
+    described by a couple (kind, name), the kind being 'T_fix', 'Q_fix' or 'Q_control'. The outputs `y` are linear
+    combinations of the temperatures of the nodes (operative temperatures by default).
+
+    Units are the ones of the graph: J/K for the capacities, W/K for the conductances `U`, seconds for the time.
+
+    A reduced model (see :meth:`reduce`) has abstract states `x0`, `x1`, ..., whose initial values are given by the
+    `projection` of the temperatures of the `nodes` of the original model.
+    """
+    states: list                # names of the states (nodes of the graph)
+    inputs: list                # (kind, name) of the inputs
+    outputs: list               # names of the outputs
+    A: np.ndarray               # (states, states)
+    B: np.ndarray               # (states, inputs)
+    C: np.ndarray               # (outputs, states)
+    D: np.ndarray               # (outputs, inputs)
+    x0: dict                    # initial temperature of the states (`T_init` of the nodes)
+    nodes: list = None          # nodes of the original model, if the states are reduced (see :meth:`reduce`)
+    projection: np.ndarray = None   # (states, nodes) initial states of a reduced model, from node temperatures
+
+    @classmethod
+    def from_graph(cls, graph, outputs=None):
+        """
+        Assembles the continuous state-space model of a thermal graph (see :mod:`lms2.building.graph`).
+
+        Nodes without capacity, nor fixed temperature, are eliminated if they are connected (steady state heat
+        balance), and ignored otherwise (e.g. `T_HW`, balanced by the hot water tank).
+
+        :param graph: thermal graph (networkx.DiGraph)
+        :param dict outputs: weights of the node temperatures of each output (default: operative temperatures of
+            the nodes of the graph, see OPERATIVE_TEMPERATURES)
+        :return: ThermalStateSpace
+        """
+
+        nodes = list(graph.nodes())
+        fixed = [n for n in nodes if graph.nodes[n].get('T_fix') is not None]
+        dynamic = [n for n in nodes if n not in fixed and graph.nodes[n].get('C') is not None]
+        algebraic = [n for n in nodes if n not in fixed and n not in dynamic and graph.degree(n) > 0]
+
+        inputs = [('T_fix', graph.nodes[n]['T_fix']) for n in fixed]
+        for kind in ['Q_fix', 'Q_control']:
+            for n in dynamic + algebraic:
+                gains = graph.nodes[n].get(kind)
+                if isinstance(gains, dict):
+                    inputs.extend((kind, q) for q in gains if (kind, q) not in inputs)
+        column = {u: k for k, u in enumerate(inputs)}
+
+        # conductance matrix of the free nodes (K), coupling with the fixed temperatures and gains (G)
+        free = dynamic + algebraic
+        index = {n: k for k, n in enumerate(free)}
+        K = np.zeros((len(free), len(free)))
+        G = np.zeros((len(free), len(inputs)))
+        for n1, n2, u in graph.edges(data='U', default=0):
+            for a, b in [(n1, n2), (n2, n1)]:
+                if a in index:
+                    K[index[a], index[a]] -= u
+                    if b in index:
+                        K[index[a], index[b]] += u
+                    elif b in fixed:
+                        G[index[a], column['T_fix', graph.nodes[b]['T_fix']]] += u
+        for n in free:
+            for kind in ['Q_fix', 'Q_control']:
+                gains = graph.nodes[n].get(kind)
+                if isinstance(gains, dict):
+                    for q, fact in gains.items():
+                        G[index[n], column[kind, q]] += fact
+
+        # elimination of the nodes without capacity: T_a = -K_aa^-1 (K_ad T_d + G_a u)
+        d, a = slice(0, len(dynamic)), slice(len(dynamic), len(free))
+        elim_x = -np.linalg.solve(K[a, a], K[a, d]) if algebraic else np.zeros((0, len(dynamic)))
+        elim_u = -np.linalg.solve(K[a, a], G[a]) if algebraic else np.zeros((0, len(inputs)))
+        capacity = np.array([graph.nodes[n]['C'] for n in dynamic], dtype=float)
+        A = (K[d, d] + K[d, a] @ elim_x) / capacity[:, None]
+        B = (G[d] + K[d, a] @ elim_u) / capacity[:, None]
+
+        # outputs, as combinations of the temperatures of the nodes
+        if outputs is None:
+            outputs = {name: w for name, w in OPERATIVE_TEMPERATURES.items() if set(w) <= set(graph.nodes)}
+        C = np.zeros((len(outputs), len(dynamic)))
+        D = np.zeros((len(outputs), len(inputs)))
+        for k, weights in enumerate(outputs.values()):
+            for n, w in weights.items():
+                if n in dynamic:
+                    C[k, dynamic.index(n)] += w
+                elif n in algebraic:
+                    C[k] += w * elim_x[algebraic.index(n)]
+                    D[k] += w * elim_u[algebraic.index(n)]
+                elif n in fixed:
+                    D[k, column['T_fix', graph.nodes[n]['T_fix']]] += w
+                else:
+                    raise ValueError(f'The node {n} of the output {list(outputs)[k]} has no temperature.')
+
+        x0 = {n: graph.nodes[n]['T_init'] for n in dynamic if graph.nodes[n].get('T_init') is not None}
+        return cls(states=dynamic, inputs=inputs, outputs=list(outputs), A=A, B=B, C=C, D=D, x0=x0)
+
+    def discretize(self, dt):
+        """
+        Exact discretization of the model with a zero-order hold on the inputs :
+
+            x[k+1] = Ad x[k] + Bd u[k]
+
+        :param float dt: time step (s)
+        :return: Ad, Bd
+        """
+
+        n, m = self.B.shape
+        M = np.zeros((n + m, n + m))
+        M[:n, :n] = self.A
+        M[:n, n:] = self.B
+        E = expm(M * dt)
+        return E[:n, :n], E[:n, n:]
+
+    def simulate(self, u, dt, x0=None):
+        """
+        Simulation of the discrete model (see :meth:`discretize`), inputs being held between time points.
+
+        :param u: (inputs, T) values of the inputs at the T time points
+        :param float dt: time step (s)
+        :param x0: initial states (default: `x0` of the model)
+        :return: states (states, T) and outputs (outputs, T)
+        """
+
+        u = np.asarray(u, dtype=float)
+        if u.ndim != 2 or u.shape[0] != len(self.inputs):
+            raise ValueError(f'u must be an array of shape ({len(self.inputs)}, time), received {u.shape}.')
+        if x0 is None:
+            missing = [s for s in self.states if s not in self.x0]
+            if missing:
+                raise ValueError(f'The initial temperatures of the states {missing} are not known.')
+            x0 = [self.x0[s] for s in self.states]
+
+        Ad, Bd = self.discretize(dt)
+        x = np.empty((len(self.states), u.shape[1]))
+        x[:, 0] = x0
+        forced = Bd @ u
+        for k in range(u.shape[1] - 1):
+            x[:, k + 1] = Ad @ x[:, k] + forced[:, k]
+        return x, self.C @ x + self.D @ u
+
+    def reduce(self, order=None, tol=None, u=None, dt=900, method='balanced', match_dc=True, scale=None):
+        """
+        Model-order reduction, by balanced truncation or by modal truncation.
+
+        The balanced truncation keeps the states of largest Hankel singular values (states that are both well
+        controlled by the inputs and well observed on the outputs), the modal truncation keeps the slowest modes of
+        `A`. With `match_dc`, the removed states are residualized (singular perturbation) instead of truncated, so that
+        the steady state outputs are exact.
+
+        The order is either given, or the smallest order keeping the outputs (e.g. `Top_D`, `Top_N`) within `tol`
+        (in K) of the ones of the original model, simulated with the representative inputs `u` (see
+        :meth:`simulate`). If no order meets `tol`, a warning is logged and the model of full order is returned.
+
+        :param int order: number of states of the reduced model
+        :param float tol: tolerance on the outputs (K), used if `order` is None
+        :param u: (inputs, T) representative inputs (weather, gains and heating), needed with `tol`
+        :param float dt: time step of the simulations (s)
+        :param str method: 'balanced' or 'modal'
+        :param bool match_dc: residualization of the removed states
+        :param scale: typical amplitudes of the inputs, balancing inputs of different units (default: largest
+            absolute values of `u`, or 1)
+        :return: reduced ThermalStateSpace, and ReductionReport
+        """
+
+        if method not in ('balanced', 'modal'):
+            raise ValueError(f"Unknown reduction method {method!r}, expected 'balanced' or 'modal'.")
+        if np.linalg.eigvals(self.A).real.max() >= 0:
+            raise ValueError('The model is not asymptotically stable, and cannot be reduced.')
+        if order is None and (tol is None or u is None):
+            raise ValueError('The order of the reduced model, or a tolerance and representative inputs, are needed.')
+
+        if scale is None:
+            scale = np.ones(len(self.inputs)) if u is None else np.abs(u).max(axis=1)
+        scale = np.where(np.asarray(scale, dtype=float) > 0, scale, 1.)
+
+        T, Tinv, hankel = self._balancing(scale) if method == 'balanced' else self._modal()
+        x_ref = y_ref = None
+        if u is not None:
+            x_ref, y_ref = self.simulate(u, dt)
+
+        orders = [order] if order is not None else range(1, len(self.states) + 1)
+        for r in orders:
+            reduced = self._project(T, Tinv, r, match_dc)
+            error = None
+            if u is not None:
+                _, y = reduced.simulate(u, dt)
+                error = np.abs(y - y_ref).max(axis=1)
+                if order is None and error.max() <= tol:
+                    break
+        if order is None and error.max() > tol:
+            logger.warning(f'reduce: no order meets the tolerance {tol} K, the full order {len(reduced.states)} is '
+                           f'kept, with an error of {error.max():.3g} K.')
+
+        dc = self.C @ np.linalg.solve(self.A, self.B) - reduced.C @ np.linalg.solve(reduced.A, reduced.B) \
+            - (self.D - reduced.D)
+        report = ReductionReport(order=len(reduced.states), method=method, hankel=hankel,
+                                 bound=2 * hankel[len(reduced.states):].sum() if method == 'balanced' else np.nan,
+                                 dc_error=np.abs(dc * scale).max(axis=1), error=error)
+        return reduced, report
+
+    def _balancing(self, scale):
+        """ Balancing transformation (square root method), and Hankel singular values. """
+
+        def _factor(w):
+            values, vectors = np.linalg.eigh((w + w.T) / 2)
+            return vectors * np.sqrt(np.clip(values, 0, None))
+
+        B = self.B * scale
+        Lc = _factor(solve_continuous_lyapunov(self.A, -B @ B.T))
+        Lo = _factor(solve_continuous_lyapunov(self.A.T, -self.C.T @ self.C))
+        U, hankel, Vt = np.linalg.svd(Lo.T @ Lc)
+        keep = hankel > hankel[0] * 1e-12
+        U, hankel_kept, Vt = U[:, keep], hankel[keep], Vt[keep]
+        T = Lc @ Vt.T / np.sqrt(hankel_kept)
+        Tinv = (U / np.sqrt(hankel_kept)).T @ Lo.T
+        return T, Tinv, hankel
+
+    def _modal(self):
+        """ Modal transformation, slowest modes first (the modes of RC graphs are real). """
+
+        values, vectors = np.linalg.eig(self.A)
+        order = np.argsort(np.abs(values.real))
+        T = vectors[:, order].real
+        return T, np.linalg.inv(T), np.full(len(values), np.nan)
+
+    def _project(self, T, Tinv, r, match_dc):
+        """ Reduced model keeping the r first states of the transformed coordinates z = Tinv x. """
+
+        A, B, C = Tinv @ self.A @ T, Tinv @ self.B, self.C @ T
+        D = self.D.copy()
+        kept, removed = slice(0, r), slice(r, A.shape[0])
+        Ar, Br, Cr = A[kept, kept], B[kept], C[:, kept]
+        if match_dc and r < A.shape[0]:
+            # residualization : dz2/dt = 0
+            Z = np.linalg.solve(A[removed, removed], np.hstack([A[removed, kept], B[removed]]))
+            Ar = Ar - A[kept, removed] @ Z[:, :r]
+            Br = Br - A[kept, removed] @ Z[:, r:]
+            Cr = Cr - C[:, removed] @ Z[:, :r]
+            D = D - C[:, removed] @ Z[:, r:]
+
+        projection = Tinv[kept] if self.projection is None else Tinv[kept] @ self.projection
+        nodes = list(self.states) if self.nodes is None else self.nodes
+        states = [f'x{k}' for k in range(r)]
+        x0 = {}
+        if all(n in self.x0 for n in self.states):
+            z0 = Tinv[kept] @ np.array([self.x0[n] for n in self.states])
+            x0 = dict(zip(states, z0.tolist()))
+        return ThermalStateSpace(states=states, inputs=list(self.inputs), outputs=list(self.outputs), A=Ar, B=Br,
+                                 C=Cr, D=D, x0=x0, nodes=nodes, projection=projection)
+
+
+@dataclass(repr=False)
+class ReductionReport:
+    """ Errors of a reduced thermal model (see :meth:`ThermalStateSpace.reduce`). """
+    order: int                  # number of states of the reduced model
+    method: str                 # 'balanced' or 'modal'
+    hankel: np.ndarray          # Hankel singular values of the original model (nan for the modal truncation)
+    bound: float                # a priori bound of the error of the balanced truncation (scaled inputs)
+    dc_error: np.ndarray        # (outputs,) largest steady state error of each output, for inputs of amplitude scale
+    error: np.ndarray           # (outputs,) largest error of each output (K) over the simulation (None without inputs)
+
+    def __repr__(self):
+        error = 'not simulated' if self.error is None else np.array2string(self.error, precision=3)
+        return f'ReductionReport(order={self.order}, method={self.method}, max error={error}, ' \
+               f'steady state error={np.array2string(self.dc_error, precision=3)})'
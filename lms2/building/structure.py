@@ -1,10 +1,65 @@
 """
 Thermal structure of buildings
 """
+from dataclasses import dataclass
+
+import numpy as np
 from pyomo.core import Set, Var, Param, Constraint, Reals, NonNegativeReals
 from pyomo.core.base.units_container import units as u
 from pyomo.dae import ContinuousSet, DerivativeVar
 from pyomo.core.base.set import Any
+from pyomo.core.expr.numeric_expr import LinearExpression, MonomialTermExpression
+
+from lms2.building.state_space import ThermalStateSpace
+
+__all__ = ['thermal_structure_block', 'ThermalIncidence']
+
+
+@dataclass(repr=False)
+class ThermalIncidence:
+    """
+    Incidence table of a thermal graph, compiled once per structure, from which the rules of the heat flows, boundary
+    conditions, initial conditions and heat balances are built (instead of querying the graph for each node and time).
+    """
+    U: dict                     # conductance of each edge
+    C: dict                     # thermal capacity of each node with a capacity
+    T_fix: dict                 # name of the fixed temperature of each node with a Dirichlet condition
+    T_init: dict                # initial temperature of the nodes
+    Q_fix: dict                 # (name, factor) of the heat gains of each node
+    Q_control: dict             # (name, factor) of the heat controls of each node
+    incidence: dict             # (node 1, node 2, sign) of the edges of each node, +1 for entering edges
+    balanced: set               # nodes with a heat balance
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        :param graph: thermal graph (networkx.DiGraph, see :mod:`lms2.building.graph`)
+        :return: ThermalIncidence
+        """
+
+        def _gains(d):
+            # factors are rounded as in the heat balance of the dwelling
+            return [(q, round(fact, 6)) for q, fact in d.items()] if isinstance(d, dict) else []
+
+        nodes = dict(graph.nodes(data=True))
+        incidence = {n: [] for n in nodes}
+        for n1, n2 in graph.edges():
+            incidence[n2].append((n1, n2, 1))
+            incidence[n1].append((n1, n2, -1))
+
+        C = {n: d['C'] for n, d in nodes.items() if d.get('C') is not None}
+        T_fix = {n: d['T_fix'] for n, d in nodes.items() if d.get('T_fix') is not None}
+        Q_fix = {n: _gains(d.get('Q_fix')) for n, d in nodes.items()}
+        Q_control = {n: _gains(d.get('Q_control')) for n, d in nodes.items()}
+
+        # nodes with a fixed temperature and no capacity, and nodes without any heat flow (e.g. the hot water tank,
+        # balanced in hw_balance), have no heat balance
+        balanced = {n for n in nodes if not (n not in C and n in T_fix)
+                    and (n in C or Q_fix[n] or Q_control[n] or incidence[n])}
+
+        return cls(U={(n1, n2): u for n1, n2, u in graph.edges(data='U', default=0)}, C=C, T_fix=T_fix,
+                   T_init={n: d['T_init'] for n, d in nodes.items() if d.get('T_init') is not None},
+                   Q_fix=Q_fix, Q_control=Q_control, incidence=incidence, balanced=balanced)
 
 
 def thermal_structure_block(struct, **kwargs):
@@ -51,6 +106,7 @@ def thermal_structure_block(struct, **kwargs):
         =============== ===================================================================
         U               thermal resistance of edges
         C               Thermal capacities of nodes
+        T_0             Initial temperature of nodes
         alpha           weight coefficient between negative and positive deviation
         delta_T         acceptable temperature deviation for normal comfort
         =============== ===================================================================
@@ -81,16 +137,44 @@ def thermal_structure_block(struct, **kwargs):
         Top_D           Operational temperature Day zone
         =============== ===================================================================
 
+    With `mode='ss'`, the RC graph is assembled into a linear state-space model (see
+    :class:`lms2.building.state_space.ThermalStateSpace`), discretized exactly (zero-order hold on the inputs) with the
+    time step of `time`, which must be a set of uniformly spaced points (e.g. a ContinuousSet initialized with all its
+    points). Only the temperatures `T` of the nodes with a thermal capacity are declared, linked by the discrete state
+    equations : the variables `q` and `dT`, and the constraints `heat_flow` and `boundary_conditions`, are not
+    declared, the fixed temperatures, heat gains and heat controls being inputs of the state equations. The heat
+    controls (`Q_control`) are taken from the block `hp`, and the heat balance must not be declared by the dwelling.
+
+    .. table::
+        :width: 100%
+
+        =================== ===================================================================
+        State-space mode    Documentation
+        =================== ===================================================================
+        states              states of the thermal model (Set)
+        T                   states temperature (°C)
+        state_equation      Discrete state equation
+        =================== ===================================================================
+
     :param struct: thermal structure block
-    :param kwargs: kwargs needed for the block construction
+    :param kwargs: kwargs needed for the block construction (time, occ, graph, env, and for the state-space mode :
+        mode, hp, state_space to use a given ThermalStateSpace instead of the one of the graph, e.g. a reduced model
+        (see :meth:`lms2.building.state_space.ThermalStateSpace.reduce`), whose states `T` are then abstract)
     :return:
     """
     time  = kwargs.pop('time', ContinuousSet(bounds=(0, 1), doc='Time set'))
     occ   = kwargs.pop('occ', None)
     graph = kwargs.pop('graph', None)
     env   = kwargs.pop('env', None)
+    mode  = kwargs.pop('mode', 'dae')
+    hp    = kwargs.pop('hp', None)
+    ss    = kwargs.pop('state_space', None)
+
+    if mode not in ('dae', 'ss'):
+        raise ValueError(f"Unknown mode {mode!r} of the thermal structure, expected 'dae' or 'ss'.")
 
     struct.graph = graph
+    struct.incidence = ThermalIncidence.from_graph(graph)
 
     struct.id_nodes = Set(initialize=list(graph.nodes), doc="set of thermal nodes")
     struct.id_edges = Set(initialize=list(graph.edges), doc="set of thermal edges")
@@ -98,13 +182,21 @@ def thermal_structure_block(struct, **kwargs):
     struct.id_nodes.construct()
 
     # Variables
-    struct.q     = Var(struct.id_edges, time, doc="heat flow (W)", units=u.watt)
-    struct.T     = Var(struct.id_nodes, time, initialize=0, units=u.deg, bounds=(-20, 55), doc="nodes temp.")
+    if mode == 'dae':
+        struct.q     = Var(struct.id_edges, time, doc="heat flow (W)", units=u.watt)
+        struct.T     = Var(struct.id_nodes, time, initialize=0, units=u.deg, bounds=(-20, 55), doc="nodes temp.")
+    else:
+        ss = ThermalStateSpace.from_graph(graph) if ss is None else ss
+        struct.state_space = ss
+        struct.states = Set(initialize=ss.states, doc='states of the thermal model')
+        struct.T     = Var(struct.states, time, initialize=0, units=u.deg, doc="states temperature",
+                           bounds=(-20, 55) if set(ss.states) <= set(graph.nodes) else None)
 
     struct.comfort_N = Var(time, initialize=0, doc='comfort in the night zone', domain=NonNegativeReals)
     struct.comfort_D = Var(time, initialize=0, doc='comfort in the day zone', domain=NonNegativeReals)
 
-    struct.dT    = DerivativeVar(struct.T, wrt=time, doc="node temperature derivative", units=u.deg / u.s)
+    if mode == 'dae':
+        struct.dT    = DerivativeVar(struct.T, wrt=time, doc="node temperature derivative", units=u.deg / u.s)
 
     # Parameters of the thermal structure (names are based on the rc model description)
     struct.U = Param(struct.id_edges,
@@ -120,35 +212,46 @@ def thermal_structure_block(struct, **kwargs):
                      default=0,
                      within=Any)
 
+    struct.T_0 = Param(struct.id_nodes,
+                       initialize={n: d for n, d in graph.nodes(data='T_init') if d is not None},
+                       doc='Initial temperature of nodes',
+                       mutable=True,
+                       within=Reals)
+
     struct.alpha = Param(mutable=True, default=0.5, doc='weight coefficient between negative and positive deviation')
     struct.delta_T = Param(default=2.5, doc='acceptable temperature deviation for normal comfort')
 
-    @struct.Constraint(time, struct.id_edges, doc='Edge heat transfer')
-    def heat_flow(b, t, e1, e2):
-        return b.U[(e1, e2)] * (b.T[e1, t] - b.T[e2, t]), b.q[(e1, e2), t]
+    if mode == 'ss':
+        _state_space_structure(struct, time, ss, env, occ, hp)
+    else:
+        inc = struct.incidence
+        t_fix = {n: env.component(name) for n, name in inc.T_fix.items()}
 
-    @struct.Constraint(struct.id_nodes, doc='Initial condition on node temperature')
-    def t_init(b, n):
-        t_0 = b.graph.nodes(data='T_init')[n]
-        if t_0 is not None:
-            return b.T[n, 0] == t_0
-        else:
-            return Constraint.Skip
+        @struct.Constraint(time, struct.id_edges, doc='Edge heat transfer')
+        def heat_flow(b, t, e1, e2):
+            return inc.U[e1, e2] * (b.T[e1, t] - b.T[e2, t]), b.q[(e1, e2), t]
 
-    @struct.Constraint(time, struct.id_nodes, doc='Dirichlet condition for thermal nodes')
-    def boundary_conditions(b, t, n):
-        if b.graph.nodes(data='T_fix')[n] is not None:
-            return b.T[n, t] == env.component(b.graph.nodes(data='T_fix')[n])[t]
-        else:
-            return Constraint.Skip
+        @struct.Constraint(struct.id_nodes, doc='Initial condition on node temperature')
+        def t_init(b, n):
+            if n in inc.T_init:
+                return b.T[n, 0] == b.T_0[n]
+            else:
+                return Constraint.Skip
 
-    @struct.Expression(time, doc='Operational temperature Night zone')
-    def Top_N(b, t):
-        return ((b.T['TwiN', t] + b.T['TwN', t] + b.T['TfiN', t]) / 3 + b.T['TiN', t]) / 2
+        @struct.Constraint(time, struct.id_nodes, doc='Dirichlet condition for thermal nodes')
+        def boundary_conditions(b, t, n):
+            if n in t_fix:
+                return b.T[n, t] == t_fix[n][t]
+            else:
+                return Constraint.Skip
 
-    @struct.Expression(time, doc='Operational temperature Day zone')
-    def Top_D(b, t):
-        return ((b.T['TwiD', t] + b.T['TwD', t] + b.T['TfiD', t] + b.T['TflD', t]) / 4 + b.T['TiD', t]) / 2
+        @struct.Expression(time, doc='Operational temperature Night zone')
+        def Top_N(b, t):
+            return ((b.T['TwiN', t] + b.T['TwN', t] + b.T['TfiN', t]) / 3 + b.T['TiN', t]) / 2
+
+        @struct.Expression(time, doc='Operational temperature Day zone')
+        def Top_D(b, t):
+            return ((b.T['TwiD', t] + b.T['TwD', t] + b.T['TfiD', t] + b.T['TflD', t]) / 4 + b.T['TiD', t]) / 2
 
     @struct.Constraint(time, doc='absolute value constraint, lower bound N')
     def _bound_N1(b, t):
@@ -164,4 +267,82 @@ def thermal_structure_block(struct, **kwargs):
 
     @struct.Constraint(time, doc='absolute value constraint, upper bound D')
     def _bound_D2(b, t):
-        return b.comfort_D[t] >= (1 - b.alpha) * (b.Top_D[t] - occ.Tset_d[t])
\ No newline at end of file
+        return b.comfort_D[t] >= (1 - b.alpha) * (b.Top_D[t] - occ.Tset_d[t])
+
+
+def _linear_combinations(data):
+    """
+    Builder of the linear combinations `x . states + u . inputs` of the discrete state equations and outputs of the
+    state-space mode, `data(key)` giving the data objects of the states and inputs of a key (e.g. a time step).
+
+    The data objects of each key are shared by the rows of the discrete matrices, and the combinations are built as
+    linear expressions (faster than generic sums).
+    """
+
+    cache = {}
+
+    def combination(key, x, u):
+        if key not in cache:
+            states, values = data(key)
+            cache[key] = states, [(v, v.is_variable_type()) for v in values]
+        states, values = cache[key]
+        terms = [MonomialTermExpression((a, d)) for a, d in zip(x, states) if a != 0]
+        terms += [MonomialTermExpression((a, d)) if var else a * d for a, (d, var) in zip(u, values) if a != 0]
+        return LinearExpression(terms)
+
+    return combination
+
+
+def _state_space_structure(struct, time, ss, env, occ, hp):
+    """ Discrete state equations, initial conditions and operative temperatures of the state-space mode. """
+
+    points = list(time)
+    steps = np.diff(points)
+    if len(points) < 2 or not np.allclose(steps, steps[0]):
+        raise ValueError('The state-space mode of the thermal structure needs a time set of uniformly spaced points, '
+                         'e.g. a ContinuousSet initialized with all its points.')
+    for name in ['Top_N', 'Top_D']:
+        if name not in ss.outputs:
+            raise ValueError(f'The state-space model has no output {name}.')
+
+    sources = {'T_fix': env, 'Q_fix': occ, 'Q_control': hp}
+    for kind, name in ss.inputs:
+        if sources[kind] is None:
+            raise ValueError(f'The input {name} ({kind}) of the thermal structure has no block to be taken from.')
+    inputs = [sources[kind].component(name) for kind, name in ss.inputs]
+
+    Ad, Bd = ss.discretize(steps[0])
+    Ad, Bd, C, D = Ad.tolist(), Bd.tolist(), ss.C.tolist(), ss.D.tolist()
+    row = {n: k for k, n in enumerate(ss.states)}
+    following = dict(zip(points[:-1], points[1:]))
+
+    _combination = _linear_combinations(lambda t: ([struct.T[s, t] for s in ss.states], [v[t] for v in inputs]))
+
+    @struct.Constraint(time, struct.states, doc='Discrete state equation')
+    def state_equation(b, t, n):
+        if t not in following:
+            return Constraint.Skip
+        return b.T[n, following[t]] == _combination(t, Ad[row[n]], Bd[row[n]])
+
+    @struct.Constraint(struct.states, doc='Initial condition on node temperature')
+    def t_init(b, n):
+        if ss.projection is not None:
+            # reduced model: initial states are projections of the initial temperatures of the nodes
+            if not all(node in b.T_0 for node in ss.nodes):
+                return Constraint.Skip
+            weights = ss.projection[row[n]].tolist()
+            return b.T[n, points[0]] == sum(w * b.T_0[node] for w, node in zip(weights, ss.nodes))
+        if n in ss.x0 and n in b.T_0:
+            return b.T[n, points[0]] == b.T_0[n]
+        else:
+            return Constraint.Skip
+
+    @struct.Expression(time, doc='Operational temperature Night zone')
+    def Top_N(b, t):
+        k = ss.outputs.index('Top_N')
+        return _combination(t, C[k], D[k])
+
+    @struct.Expression(time, doc='Operational temperature Day zone')
+    def Top_D(b, t):
+        k = ss.outputs.index('Top_D')
+        return _combination(t, C[k], D[k])
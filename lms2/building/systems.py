@@ -58,13 +58,16 @@ def hot_water_tank(hwt, **kwargs):
         =============== ===================================================================
 
     :param hwt:
-    :param kwargs:
+    :param kwargs: kwargs for the block construction (time set, and index: optional set of the block indexing the
+        tanks, see :func:`lms2.social.occupancy.occupancy`)
     :return:
     """
     time  = kwargs.pop('time', ContinuousSet(bounds=(0, 1), doc='Time set'))
+    index = kwargs.pop('index', None)
+    tanks = () if index is None else (index,)
 
-    hwt.T_HW_0  = Param(default=55, doc='Initial temperature ', within=Reals, units=u.deg)
-    hwt.T_HW    = Var(time, initialize=55, units=u.deg, bounds=(0, 100), doc="HW storage temperature")
+    hwt.T_HW_0  = Param(*tanks, default=55, doc='Initial temperature ', within=Reals, mutable=True, units=u.deg)
+    hwt.T_HW    = Var(*tanks, time, initialize=55, units=u.deg, bounds=(0, 100), doc="HW storage temperature")
     hwt.T_CW    = Param(default=10, doc='Temperature of cold water', within=Reals, units=u.deg)
     hwt.T_HW_d  = Param(default=42, doc='Temperature of demanded hot water', within=Reals, units=u.deg)
     hwt.V       = Param(default=200, doc='HW storage tank Volume', within=Reals, units=u.kg)
@@ -74,13 +77,15 @@ def hot_water_tank(hwt, **kwargs):
 
     hwt.dT_HW = DerivativeVar(hwt.T_HW, wrt=time, doc="HW temperature derivative",  units=u.deg / u.s)
 
-    @hwt.Constraint(time, doc = 'HW temperature bounds')
-    def bounds(b, t):
-        return b.T_HW_LB, b.T_HW[t], b.T_HW_UB
+    @hwt.Constraint(*tanks, time, doc = 'HW temperature bounds')
+    def bounds(b, *index):
+        return b.T_HW_LB, b.T_HW[index], b.T_HW_UB
 
-    @hwt.Constraint(doc = 'HW initial temperature')
-    def init(b):
-        return b.T_HW[0] == b.T_HW_0
+    @hwt.Constraint(*tanks, doc = 'HW initial temperature')
+    def init(b, *tank):
+        if index is None:
+            return b.T_HW[0] == b.T_HW_0
+        return b.T_HW[tank + (0,)] == b.T_HW_0[tank]
 
 
 def heat_pump(hp, **kwargs):
@@ -134,34 +139,37 @@ def heat_pump(hp, **kwargs):
         =============== ===================================================================
 
     :param hp: Heat pump block
-    :param kwargs: kwargs for the block construction (time set and occupancy block)
+    :param kwargs: kwargs for the block construction (time set, occupancy block, and index: optional set of the block
+        indexing the heat pumps, see :func:`lms2.social.occupancy.occupancy`)
     :return:
     """
     time  = kwargs.pop('time', ContinuousSet(bounds=(0, 1), doc='Time set'))
     occ   = kwargs.pop('occ', None)
+    index = kwargs.pop('index', None)
+    sets  = (time,) if index is None else (index, time)
 
     hp.Q_heat_D_max = Param(default=10000, doc='Maximal heat production in the day-zone')
     hp.Q_heat_N_max = Param(default=10000, doc='Maximal heat production in the night-zone')
     hp.Q_HW_max     = Param(default=2000,  doc='Maximal heat production in the HW storage tank')
 
-    hp.Q_heat_N  = Var(time, initialize=0, doc='Heat pump flow Night zone', units=u.watt, bounds=(0, hp.Q_heat_N_max.value))
-    hp.Q_heat_D  = Var(time, initialize=0, doc='Heat pump flow Day zone', units=u.watt, bounds=(0, hp.Q_heat_D_max.value))
-    hp.Q_heat_HW = Var(time, initialize=0, doc='Heat pump flow HW tank', units=u.watt, bounds=(0, hp.Q_HW_max.value))
+    hp.Q_heat_N  = Var(*sets, initialize=0, doc='Heat pump flow Night zone', units=u.watt, bounds=(0, hp.Q_heat_N_max.value))
+    hp.Q_heat_D  = Var(*sets, initialize=0, doc='Heat pump flow Day zone', units=u.watt, bounds=(0, hp.Q_heat_D_max.value))
+    hp.Q_heat_HW = Var(*sets, initialize=0, doc='Heat pump flow HW tank', units=u.watt, bounds=(0, hp.Q_HW_max.value))
 
     hp.COP = Param(default=3, domain=NonNegativeReals, doc='Coefficient of performance')
 
-    @hp.Expression(time, doc='Electrical power in the day zone')
-    def p_elec_D(b, t):
-        return b.Q_heat_D[t] / b.COP
+    @hp.Expression(*sets, doc='Electrical power in the day zone')
+    def p_elec_D(b, *index):
+        return b.Q_heat_D[index] / b.COP
 
-    @hp.Expression(time, doc='Electrical power in the night zone')
-    def p_elec_N(b, t):
-        return b.Q_heat_N[t] / b.COP
+    @hp.Expression(*sets, doc='Electrical power in the night zone')
+    def p_elec_N(b, *index):
+        return b.Q_heat_N[index] / b.COP
 
-    @hp.Expression(time, doc='Electrical power for DHW')
-    def p_elec_HW(b, t):
-        return b.Q_heat_HW[t] / b.COP
+    @hp.Expression(*sets, doc='Electrical power for DHW')
+    def p_elec_HW(b, *index):
+        return b.Q_heat_HW[index] / b.COP
 
-    @hp.Constraint(time, doc='heat_pumps heating bounds')
-    def limits(b, t):
-        return 0, b.Q_heat_N[t], occ.u_N[t] * b.Q_heat_N_max
\ No newline at end of file
+    @hp.Constraint(*sets, doc='heat_pumps heating bounds')
+    def limits(b, *index):
+        return 0, b.Q_heat_N[index], occ.u_N[index] * b.Q_heat_N_max
\ No newline at end of file
@@ -0,0 +1,96 @@
+import unittest
+
+import numpy as np
+from pyomo.dae import ContinuousSet
+from pyomo.environ import Block, ConcreteModel, Objective, SolverFactory, TransformationFactory, value
+
+from lms2.building.dwellings import dwelling_fleet, dwelling_v2
+from lms2.building.graph import build_2zone_graph
+from lms2.building.tests.test_state_space import building_parameters
+from lms2.environment.environment import environment
+
+HIGHS = SolverFactory('appsi_highs').available(exception_flag=False)
+
+
+def fleet_parameters():
+    light = building_parameters()
+    light.update({k: v / 2 for k, v in light.items() if k.startswith('C')})
+    return {'heavy': building_parameters(), 'light': light}
+
+
+class TestFleet(unittest.TestCase):
+    horizon, dt = 6 * 3600, 900
+
+    def build(self, mode, fleet):
+        m = ConcreteModel()
+        if mode == 'ss':
+            m.time = ContinuousSet(initialize=np.arange(0, self.horizon + 1, self.dt))
+        else:
+            m.time = ContinuousSet(bounds=(0, self.horizon))
+        m.env = Block(rule=lambda b: environment(b, time=m.time))
+        parameters, types = fleet_parameters(), {'a': 'heavy', 'b': 'light', 'c': 'heavy'}
+        if fleet:
+            m.f = Block(rule=lambda b: dwelling_fleet(b, time=m.time, env=m.env, parameters=parameters,
+                                                      types=types, mode=mode))
+        else:
+            m.d = Block(list(types), rule=lambda b, d: dwelling_v2(b, time=m.time, env=m.env, mode=mode,
+                                                                    graph=build_2zone_graph(parameters[types[d]])))
+        TransformationFactory('dae.finite_difference').apply_to(m, nfe=self.horizon // self.dt)
+
+        for t in m.time:
+            m.env.Te[t] = 5 + 5 * np.sin(2 * np.pi * t / self.horizon)
+        p_elec = m.f.p_elec if fleet else {(d, t): m.d[d].p_elec[t] for d in types for t in m.time}
+        comfort = m.f.comfort if fleet else {(d, t): m.d[d].comfort[t] for d in types for t in m.time}
+        m.obj = Objective(expr=sum(1e-3 * p_elec[d, t] + comfort[d, t] for d in types for t in m.time))
+        return m
+
+    def test_components(self):
+        m = self.build('dae', fleet=True)
+        self.assertEqual(list(m.f.dwellings), ['a', 'b', 'c'])
+        self.assertEqual(len(m.f.T), 3 * len(m.f.nodes) * len(m.time))
+        self.assertEqual(len(m.f.hp.Q_heat_D), 3 * len(m.time))
+        self.assertEqual(len(m.f.occ.Tset_d), 3 * len(m.time))
+        self.assertEqual(len(m.f.hwt.init), 3)
+        self.assertEqual(value(m.f.C['b', 'TiD']), value(m.f.C['a', 'TiD']) / 2)
+
+        m = self.build('ss', fleet=True)
+        self.assertEqual(len(m.f.T), 3 * len(m.f.states) * len(m.time))
+        self.assertFalse(hasattr(m.f, 'thermal_balance'))
+
+    def test_unknown_type(self):
+        m = ConcreteModel()
+        m.time = ContinuousSet(bounds=(0, 1))
+        m.env = Block(rule=lambda b: environment(b, time=m.time))
+        with self.assertRaises(ValueError):
+            m.f = Block(rule=lambda b: dwelling_fleet(b, time=m.time, env=m.env, parameters=fleet_parameters(),
+                                                      types=['heavy', 'medium']))
+
+    def test_operative_nodes(self):
+        def graph_builder(parameters):
+            graph = build_2zone_graph(parameters)
+            graph.remove_node('TflD')
+            return graph
+
+        m = ConcreteModel()
+        m.time = ContinuousSet(bounds=(0, 1))
+        m.env = Block(rule=lambda b: environment(b, time=m.time))
+        with self.assertRaises(ValueError):
+            m.f = Block(rule=lambda b: dwelling_fleet(b, time=m.time, env=m.env, parameters=fleet_parameters(),
+                                                      types=['heavy', 'light'], graph_builder=graph_builder))
+
+    @unittest.skipUnless(HIGHS, 'appsi_highs is not available')
+    def test_same_solution(self):
+        """ the fleet and one block per dwelling have the same optimum """
+        opt = SolverFactory('appsi_highs')
+        for mode in ['dae', 'ss']:
+            m1, m2 = self.build(mode, fleet=True), self.build(mode, fleet=False)
+            opt.solve(m1)
+            opt.solve(m2)
+            self.assertAlmostEqual(value(m1.obj), value(m2.obj), places=4)
+            for d in 'abc':
+                np.testing.assert_allclose([value(m1.f.Top_D[d, t]) for t in m1.time],
+                                           [value(m2.d[d].struct.Top_D[t]) for t in m2.time], atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
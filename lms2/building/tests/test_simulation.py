@@ -0,0 +1,108 @@
+import unittest
+
+import numpy as np
+from pyomo.dae import ContinuousSet
+from pyomo.environ import Block, ConcreteModel, Constraint, TransformationFactory, value
+
+from lms2.building.dwellings import dwelling_fleet, dwelling_v2
+from lms2.building.graph import build_2zone_graph
+from lms2.building.simulation import simulate_dwellings
+from lms2.building.state_space import ThermalStateSpace
+from lms2.building.tests.test_fleet import fleet_parameters
+from lms2.building.tests.test_state_space import building_parameters
+from lms2.environment.environment import environment
+
+
+def profiles(n=97, dt=900):
+    t = np.arange(n) * dt
+    return {'Te': 5 + 5 * np.sin(2 * np.pi * t / 86400), 'Tg': np.full(n, 10.),
+            'Q_sol_S': np.clip(800 * np.sin(2 * np.pi * (t / 86400 - 0.25)), 0, None),
+            'Q_heat_D': np.where(t < 8 * 3600, 4000., 0), 'Q_heat_N': np.full(n, 1000.),
+            'Q_heat_HW': np.full(n, 0.15), 'Flow_HW': np.full(n, 5.),
+            'Tset_d': np.full(n, 20.), 'Tset_n': np.full(n, 18.)}
+
+
+def violation(m):
+    """ largest violation of the active constraints """
+    worst = 0
+    for c in m.component_data_objects(Constraint, active=True):
+        body = value(c.body)
+        if c.has_lb():
+            worst = max(worst, value(c.lower) - body)
+        if c.has_ub():
+            worst = max(worst, body - value(c.upper))
+    return worst
+
+
+class TestSimulation(unittest.TestCase):
+    def setUp(self):
+        self.profiles = profiles()
+        self.graphs = [build_2zone_graph(bp) for bp in fleet_parameters().values()]
+
+    def test_state_space(self):
+        res = simulate_dwellings(self.graphs[0], self.profiles)
+        ss = ThermalStateSpace.from_graph(self.graphs[0])
+        u = np.array([self.profiles.get(name, np.zeros(97)) for _, name in ss.inputs])
+        x, y = ss.simulate(u, 900)
+        self.assertEqual(res.T.shape, (1, len(res.nodes), 97))
+        np.testing.assert_allclose(res.T[0, [res.nodes.index(s) for s in ss.states]], x, atol=1e-9)
+        np.testing.assert_allclose(res.y[0], y, atol=1e-9)
+
+    def test_fleet(self):
+        """ dwellings simulated together or one by one """
+        heating = np.array([self.profiles['Q_heat_D'], 2 * self.profiles['Q_heat_D']])
+        res = simulate_dwellings(self.graphs, dict(self.profiles, Q_heat_D=heating))
+        self.assertEqual(res.T.shape[0], 2)
+        for k, g in enumerate(self.graphs):
+            single = simulate_dwellings(g, dict(self.profiles, Q_heat_D=heating[k]))
+            np.testing.assert_allclose(res.T[k], single.T[0], atol=1e-9)
+            np.testing.assert_allclose(res.T_HW[k], single.T_HW[0])
+
+        with self.assertRaises(ValueError):
+            simulate_dwellings(self.graphs, {'Te': self.profiles['Te']})
+        with self.assertRaises(ValueError):
+            simulate_dwellings(self.graphs * 2, dict(self.profiles, Q_heat_D=heating))
+
+    def test_load(self):
+        """ simulations are feasible initial values of the state-space dwellings """
+        res = simulate_dwellings(self.graphs, self.profiles)
+
+        m = ConcreteModel()
+        m.time = ContinuousSet(initialize=res.time)
+        m.env = Block(rule=lambda b: environment(b, time=m.time))
+        m.d = Block(rule=lambda b: dwelling_v2(b, time=m.time, env=m.env, graph=self.graphs[1], mode='ss'))
+        m.f = Block(rule=lambda b: dwelling_fleet(b, time=m.time, env=m.env, parameters=fleet_parameters(),
+                                                  types=['heavy', 'light'], mode='ss'))
+        TransformationFactory('dae.finite_difference').apply_to(m, nfe=len(res.time) - 1)
+        for k, t in enumerate(m.time):
+            m.env.Te[t] = self.profiles['Te'][k]
+            for name in ['Q_sol_S', 'Flow_HW', 'Tset_d', 'Tset_n']:
+                m.d.occ.component(name)[t] = self.profiles[name][k]
+                for d in m.f.dwellings:
+                    m.f.occ.component(name)[d, t] = self.profiles[name][k]
+        m.d.thermal_comfort.deactivate()
+        m.f.thermal_comfort.deactivate()
+
+        res.load(m.d, dwelling=1)
+        res.load(m.f)
+        self.assertLess(violation(m), 1e-6)
+        self.assertAlmostEqual(value(m.f.Top_D[1, 3600]), value(m.d.struct.Top_D[3600]))
+
+    def test_load_dae(self):
+        """ values are interpolated at the points of finer time sets """
+        res = simulate_dwellings(self.graphs[0], self.profiles)
+        m = ConcreteModel()
+        m.time = ContinuousSet(bounds=(0, res.time[-1]))
+        m.env = Block(rule=lambda b: environment(b, time=m.time))
+        m.d = Block(rule=lambda b: dwelling_v2(b, time=m.time, env=m.env, graph=self.graphs[0]))
+        TransformationFactory('dae.finite_difference').apply_to(m, nfe=4 * (len(res.time) - 1))
+        res.load(m.d)
+
+        self.assertAlmostEqual(m.d.struct.T['TiD', 450].value,
+                               (res.T[0, res.nodes.index('TiD'), 0] + res.T[0, res.nodes.index('TiD'), 1]) / 2)
+        self.assertAlmostEqual(value(m.d.struct.heat_flow[900, 'TiD', 'TwiD'].body), 0)
+        self.assertEqual(m.d.hp.Q_heat_D[0].value, 4000)
+
+
+if __name__ == '__main__':
+    unittest.main()
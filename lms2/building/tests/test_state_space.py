@@ -0,0 +1,172 @@
+import unittest
+
+import networkx as nx
+import numpy as np
+from pyomo.dae import ContinuousSet
+from pyomo.environ import Block, ConcreteModel, Objective, SolverFactory, TransformationFactory, value
+
+from lms2.building.dwellings import dwelling_v2
+from lms2.building.graph import build_2zone_graph
+from lms2.building.state_space import ThermalStateSpace
+from lms2.environment.environment import environment
+
+HIGHS = SolverFactory('appsi_highs').available(exception_flag=False)
+
+
+def building_parameters():
+    bp = {f'abs{i}{o}{z}': 0.05 for i in range(1, 6) for o in 'NESW' for z in 'DN'}
+    bp.update({f'f{i}{z}': 0.2 for i in range(1, 6) for z in 'DN'})
+    bp.update(CiD=2e6, CflD=5e7, CwiD=2e7, CwD=9e7, CfiD=3e7, CiN=2e6, CwiN=2e7, CwN=9e7,
+              UwD=60, infD=20, hwD=900, hflD=400, UflD=50, hwiD=800, UfDN=300, UfND=300, hwiN=800, hwN=900,
+              UwN=60, infN=20)
+    return bp
+
+
+class TestThermalStateSpace(unittest.TestCase):
+    def setUp(self):
+        self.graph = build_2zone_graph(building_parameters())
+        self.ss = ThermalStateSpace.from_graph(self.graph)
+
+    def test_from_graph(self):
+        ss = self.ss
+        self.assertEqual(len(ss.states), 9)
+        self.assertNotIn('T_HW', ss.states)
+        self.assertEqual(ss.inputs[:2], [('T_fix', 'Te'), ('T_fix', 'Tg')])
+        self.assertIn(('Q_control', 'Q_heat_D'), ss.inputs)
+        self.assertEqual(ss.outputs, ['Top_N', 'Top_D'])
+        np.testing.assert_allclose(ss.C.sum(axis=1), 1)
+
+        # uniform temperatures, without heat gains, are a steady state
+        fixed = [k for k, (kind, _) in enumerate(ss.inputs) if kind == 'T_fix']
+        np.testing.assert_allclose(ss.A.sum(axis=1) + ss.B[:, fixed].sum(axis=1), 0, atol=1e-15)
+
+    def test_discretize(self):
+        Ad, Bd = self.ss.discretize(900)
+        Ad2, Bd2 = self.ss.discretize(1800)
+        np.testing.assert_allclose(Ad2, Ad @ Ad, atol=1e-12)
+        np.testing.assert_allclose(Bd2, Ad @ Bd + Bd, atol=1e-12)
+
+    def test_eliminate(self):
+        g = nx.DiGraph()
+        g.add_node('Te', T_fix='Te')
+        g.add_node('Ts')
+        g.add_node('Ti', C=1e6, T_init=20, Q_control={'Q_heat': 1})
+        g.add_edge('Te', 'Ts', U=100)
+        g.add_edge('Ts', 'Ti', U=100)
+        ss = ThermalStateSpace.from_graph(g, outputs={'Ts': {'Ts': 1}})
+        self.assertEqual(ss.states, ['Ti'])
+        # conductances in series
+        np.testing.assert_allclose(ss.A, [[-50 / 1e6]])
+        np.testing.assert_allclose(ss.C, [[0.5]])
+        np.testing.assert_allclose(ss.D, [[0.5, 0]])
+
+
+def representative_inputs(ss, n=96 * 7, dt=900):
+    t = np.arange(n) * dt
+    names = [name for kind, name in ss.inputs]
+    u = np.zeros((len(ss.inputs), n))
+    u[names.index('Te')] = 5 + 5 * np.sin(2 * np.pi * t / 86400)
+    u[names.index('Tg')] = 10
+    u[names.index('Q_sol_S')] = np.clip(800 * np.sin(2 * np.pi * (t / 86400 - 0.25)), 0, None)
+    u[names.index('Q_heat_D')] = np.where(t % 86400 < 8 * 3600, 4000, 0)
+    u[names.index('Q_heat_N')] = 1000
+    return u
+
+
+class TestReduction(unittest.TestCase):
+    def setUp(self):
+        self.ss = ThermalStateSpace.from_graph(build_2zone_graph(building_parameters()))
+        self.u = representative_inputs(self.ss)
+
+    def test_tolerance(self):
+        reduced, report = self.ss.reduce(tol=0.1, u=self.u)
+        self.assertLess(len(reduced.states), len(self.ss.states))
+        self.assertEqual(report.order, len(reduced.states))
+        self.assertLessEqual(report.error.max(), 0.1)
+        self.assertEqual(reduced.projection.shape, (report.order, len(self.ss.states)))
+
+        # residualization keeps the steady state
+        np.testing.assert_allclose(report.dc_error, 0, atol=1e-9)
+
+        _, y = self.ss.simulate(self.u, 900)
+        _, y_reduced = reduced.simulate(self.u, 900)
+        np.testing.assert_allclose(np.abs(y - y_reduced).max(axis=1), report.error)
+
+    def test_unreachable_tolerance(self):
+        with self.assertLogs('lms2.building.state_space', 'WARNING'):
+            reduced, report = self.ss.reduce(tol=0., u=self.u)
+        self.assertEqual(report.order, len(self.ss.states))
+        self.assertGreater(report.error.max(), 0.)
+
+    def test_methods(self):
+        for method in ['balanced', 'modal']:
+            reduced, report = self.ss.reduce(order=len(self.ss.states) - 1, u=self.u, method=method)
+            self.assertLess(report.error.max(), 0.5)
+        with self.assertRaises(ValueError):
+            self.ss.reduce(tol=0.1)
+
+
+class TestStateSpaceDwelling(unittest.TestCase):
+    def build(self, mode, dt, horizon=86400, state_space=None):
+        graph = build_2zone_graph(building_parameters())
+        m = ConcreteModel()
+        if mode == 'ss':
+            m.time = ContinuousSet(initialize=np.arange(0, horizon + 1, dt))
+        else:
+            m.time = ContinuousSet(bounds=(0, horizon))
+        m.env = Block(rule=lambda b: environment(b, time=m.time))
+        m.d = Block(rule=lambda b: dwelling_v2(b, time=m.time, env=m.env, graph=graph, mode=mode,
+                                                        state_space=state_space))
+        TransformationFactory('dae.finite_difference').apply_to(m, nfe=horizon // dt)
+        for t in m.time:
+            m.env.Te[t] = 5 + 5 * np.sin(2 * np.pi * t / horizon)
+            m.d.hp.Q_heat_D[t].fix(3000 if t < horizon / 2 else 0)
+            m.d.hp.Q_heat_N[t].fix(1000)
+            m.d.hp.Q_heat_HW[t].fix(0)
+        m.d.thermal_comfort.deactivate()
+        m.obj = Objective(expr=0)
+        return m
+
+    def test_components(self):
+        m = self.build('ss', 900)
+        self.assertFalse(hasattr(m.d.struct, 'q'))
+        self.assertFalse(hasattr(m.d.struct, 'dT'))
+        self.assertFalse(hasattr(m.d, 'thermal_balance'))
+        self.assertEqual(len(m.d.struct.T), 9 * 97)
+        self.assertEqual(len(m.d.struct.state_equation), 9 * 96)
+
+    def test_uniform_time(self):
+        graph = build_2zone_graph(building_parameters())
+        m = ConcreteModel()
+        m.time = ContinuousSet(initialize=[0, 900, 3600])
+        m.env = Block(rule=lambda b: environment(b, time=m.time))
+        with self.assertRaises(ValueError):
+            m.d = Block(rule=lambda b: dwelling_v2(b, time=m.time, env=m.env, graph=graph, mode='ss'))
+
+    @unittest.skipUnless(HIGHS, 'needs the highs solver')
+    def test_accuracy(self):
+        opt = SolverFactory('appsi_highs')
+        ss = self.build('ss', 1800, horizon=21600)
+        fine = self.build('dae', 60, horizon=21600)
+        opt.solve(ss)
+        opt.solve(fine)
+        for t in range(0, 21601, 1800):
+            self.assertAlmostEqual(value(ss.d.struct.Top_D[t]), value(fine.d.struct.Top_D[t]), delta=0.05)
+            self.assertAlmostEqual(value(ss.d.struct.Top_N[t]), value(fine.d.struct.Top_N[t]), delta=0.05)
+
+    @unittest.skipUnless(HIGHS, 'needs the highs solver')
+    def test_reduced(self):
+        full = ThermalStateSpace.from_graph(build_2zone_graph(building_parameters()))
+        reduced, report = full.reduce(order=5, u=representative_inputs(full))
+        opt = SolverFactory('appsi_highs')
+        m_full = self.build('ss', 900)
+        m_reduced = self.build('ss', 900, state_space=reduced)
+        self.assertEqual(len(m_reduced.d.struct.states), 5)
+        opt.solve(m_full)
+        opt.solve(m_reduced)
+        for t in m_full.time:
+            self.assertAlmostEqual(value(m_reduced.d.struct.Top_D[t]), value(m_full.d.struct.Top_D[t]), delta=0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
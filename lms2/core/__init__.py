@@ -1,3 +1,3 @@
 # -*- coding: utf-8 -*-
 
-__all__ = ['models', 'time', 'units']
+__all__ = ['models', 'time', 'units', 'receding', 'snapshot', 'admm']
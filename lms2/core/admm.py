@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+Distributed coordination of a distribution network and of many local units (dwellings, batteries) by ADMM.
+
+The network and each unit are separate small models, exchanging only the trajectories of the powers of the units
+(`p_out`, `q_out`, with the sign convention of :func:`lms2.electric.network.network_3phases_lindistflow`) and the
+associated prices. The units are solved in parallel by a pool of processes, each process owning a fixed group of
+units, built once and updated between iterations.
+"""
+
+import logging
+import multiprocessing
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+from pyomo.environ import (Block, ConcreteModel, Constraint, Objective, Param, RangeSet, Set, SolverFactory, Var,
+                           minimize, value)
+from pyomo.opt import check_optimal_termination
+
+__all__ = ['AdmmAgent', 'AdmmResult', 'AdmmCoordinator']
+logger = logging.getLogger('lms2.admm')
+
+
+@dataclass
+class AdmmAgent:
+    """
+    Local unit connected to a node and a phase of the network.
+
+    `rule(m)` builds the model of the unit on an empty ``ConcreteModel``. It must declare an ordered time set `m.time`
+    (with the same number of points as the network), and the power leaving the network `m.p_out[t]` (in kW, Var or
+    Expression indexed by `m.time`), and `m.q_out[t]` if `reactive` is True. Its active objectives are the local cost
+    of the unit. The rule is sent to the processes of the pool, it should be a module level function.
+    """
+    node: object
+    phase: int
+    rule: Callable
+    reactive: bool = False
+    name: str = None
+
+
+@dataclass(repr=False)
+class AdmmResult:
+    """ Result of the coordination (see :meth:`AdmmCoordinator.run`), arrays are indexed by (agent, time). """
+    agents: list                # names of the agents
+    p: np.ndarray               # active powers of the agents (kW)
+    q: np.ndarray               # reactive powers of the agents (kVAr, nan if not exchanged)
+    price_p: np.ndarray         # prices of the active powers (cost of a kW leaving the network, per time step)
+    price_q: np.ndarray         # prices of the reactive powers
+    rho: float                  # final penalty
+    iterations: int
+    converged: bool
+    history: np.ndarray         # (iterations, 3) primal residual, dual residual and penalty of each iteration
+
+
+def _penalized(m, powers):
+    """
+    Replaces the active objectives of `m` by their sum plus the augmented lagrangian terms
+    rho / 2 * (power - target)² of each power (list of time indexed components).
+    """
+
+    cost = 0
+    for obj in list(m.component_data_objects(Objective, active=True)):
+        cost += obj.expr if obj.sense == minimize else -obj.expr
+        obj.deactivate()
+
+    m.admm_k = RangeSet(0, len(powers) - 1)
+    m.admm_i = RangeSet(0, len(powers[0]) - 1)
+    m.admm_rho = Param(initialize=1., mutable=True)
+    m.admm_target = Param(m.admm_k, m.admm_i, initialize=0., mutable=True)
+    m.admm_obj = Objective(expr=cost + m.admm_rho / 2 * sum((x - m.admm_target[k, i]) ** 2
+                                                            for k, data in enumerate(powers)
+                                                            for i, x in enumerate(data)))
+    return cost
+
+
+def _solve(m, opt, name, rho, targets, solve_kwargs):
+    m.admm_rho.set_value(rho)
+    for k, target in enumerate(targets):
+        for i, x in enumerate(target.tolist()):
+            m.admm_target[k, i].set_value(x)
+
+    results = opt.solve(m, **solve_kwargs)
+    if not check_optimal_termination(results):
+        raise RuntimeError(f'ADMM: the subproblem {name} terminated with {results.solver.termination_condition}.')
+
+
+class _AgentModel(object):
+    """ Model of an agent, built once and solved for successive targets. """
+
+    def __init__(self, agent, solver, solver_options, solve_kwargs):
+        self.agent = agent
+        self.m = m = ConcreteModel(name=agent.name)
+        agent.rule(m)
+        time = list(m.time)
+        self.powers = [[m.p_out[t] for t in time]]
+        if agent.reactive:
+            self.powers.append([m.q_out[t] for t in time])
+        _penalized(m, self.powers)
+
+        self.opt = SolverFactory(solver)
+        for k, v in (solver_options or {}).items():
+            self.opt.options[k] = v
+        self.solve_kwargs = solve_kwargs or {}
+
+    def solve(self, rho, targets):
+        _solve(self.m, self.opt, self.agent.name, rho, targets, self.solve_kwargs)
+        return [np.array([value(x) for x in data], dtype=float) for data in self.powers]
+
+
+def _worker(conn, agents, solver, solver_options, solve_kwargs):
+    """ Process of the pool: builds its group of agents, then solves them for each received (rho, targets). """
+
+    try:
+        models = [_AgentModel(a, solver, solver_options, solve_kwargs) for a in agents]
+        conn.send(None)
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            rho, targets = msg
+            conn.send([model.solve(rho, t) for model, t in zip(models, targets)])
+    except Exception as err:
+        conn.send(err)
+    finally:
+        conn.close()
+
+
+class _Group(object):
+    """ Group of agents solved in the current process. """
+
+    def __init__(self, agents, *args):
+        self.models = [_AgentModel(a, *args) for a in agents]
+        self.pending = None
+
+    def send(self, rho, targets):
+        self.pending = [model.solve(rho, t) for model, t in zip(self.models, targets)]
+
+    def recv(self):
+        return self.pending
+
+    def close(self):
+        pass
+
+
+class _RemoteGroup(object):
+    """ Group of agents solved by a process of the pool. """
+
+    def __init__(self, agents, *args):
+        ctx = multiprocessing.get_context()
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker, args=(child, agents) + args, daemon=True)
+        self.process.start()
+        child.close()
+        self._check(self.conn.recv())
+
+    @staticmethod
+    def _check(msg):
+        if isinstance(msg, Exception):
+            raise RuntimeError(f'ADMM: a process of the pool failed ({msg!r}).') from msg
+        return msg
+
+    def send(self, rho, targets):
+        self.conn.send((rho, targets))
+
+    def recv(self):
+        return self._check(self.conn.recv())
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join()
+
+
+class AdmmCoordinator(object):
+    """
+    ADMM coordinator of a distribution network and of local units (agents)
+
+    The network model is built by :func:`lms2.electric.network.network_3phases_lindistflow` (block `net` of a model
+    whose time set is `time`), the powers `p_out` (and `q_out`) of the nodes and phases of the agents being freed.
+    Several agents may share a node and a phase (e.g. a dwelling and a battery) : each agent has its own power in the
+    network model (`admm_p`, `admm_q`), the injection of the node and phase being the sum of the powers of its agents
+    (only of its reactive agents for `q_out`).
+    `network_rule(m)` may add the cost of the network (e.g. of the power imported at the root) and other components.
+
+    Each iteration k of the (scaled) ADMM solves:
+
+        - the network, minimizing its cost + rho/2 ||x - z_k + u_k||², where x are the powers of the agents seen by
+          the network,
+        - the agents, in parallel, each minimizing its cost + rho/2 ||x_k+1 - z + u_k||², where z are the powers of
+          the agents, receiving the trajectory x_k+1 and the price -rho * u_k,
+        - the prices : u_k+1 = u_k + x_k+1 - z_k+1.
+
+    The iterations stop when the primal residual ||x - z|| and the dual residual rho ||z_k+1 - z_k|| (root mean
+    square values, in kW) are both lower than `tol`. The penalty is updated by residual balancing: rho is multiplied
+    (divided) by `tau` if the primal residual is larger (smaller) than `mu` times the dual residual. A callable
+    `penalty(k, rho, r, s)`, returning the next penalty, may be given instead.
+
+    The agents are split into `processes` groups, each group being built and solved by its own process for the whole
+    coordination (`processes=1` solves the agents in the current process). The coordinator should be closed to stop
+    the processes, or used as a context manager.
+
+    Example:
+        >>> agents = [AdmmAgent(node=n, phase=d['phase'], rule=dwelling_rule) for n, d in graph.nodes(data=True)
+        ...           if d.get('kind') == 'dwelling']
+        >>> with AdmmCoordinator(graph, agents, time=range(96), network_rule=import_cost, processes=8) as admm:
+        ...     res = admm.run(max_iter=200, tol=1e-2)
+    """
+
+    def __init__(self, graph, agents, time, network_rule=None, solver='highs', rho=1., mu=10., tau=2.,
+                 penalty=None, processes=None, solver_options=None, solve_kwargs=None, **kwargs):
+        """
+
+        :param graph: radial network (networkx.DiGraph)
+        :param list agents: AdmmAgent of the units
+        :param time: time points of the network model
+        :param network_rule: function of the network model adding its cost
+        :param str solver: name of the solver (of quadratic problems)
+        :param float rho: initial penalty
+        :param float mu: ratio of the residuals triggering an update of the penalty
+        :param float tau: factor of the updates of the penalty (1 to keep it constant)
+        :param penalty: callable (iteration, rho, primal residual, dual residual) returning the next penalty
+        :param int processes: number of processes (None for the number of CPUs)
+        :param dict solver_options: options of the solver
+        :param dict solve_kwargs: key-word arguments passed to `solver.solve()`
+        :param kwargs: other options of :func:`lms2.electric.network.network_3phases_lindistflow`
+        """
+        from lms2.electric.network import network_3phases_lindistflow
+
+        self.agents = list(agents)
+        for k, a in enumerate(self.agents):
+            if a.name is None:
+                a.name = f'agent_{k}'
+        self.rho, self.mu, self.tau, self.penalty = rho, mu, tau, penalty
+        self.solve_kwargs = solve_kwargs or {}
+
+        # network model, with free powers at the connections of the agents
+        self.model = m = ConcreteModel()
+        m.time = Set(initialize=list(time), ordered=True)
+        m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=graph, **kwargs))
+        if network_rule is not None:
+            network_rule(m)
+
+        # powers of the agents seen by the network, whose sum at each node and phase is the injection of the network
+        m.admm_agents = RangeSet(0, len(self.agents) - 1)
+        m.admm_p = Var(m.admm_agents, m.time, doc='active powers of the agents (kW)')
+        m.admm_q = Var([k for k, a in enumerate(self.agents) if a.reactive], m.time,
+                       doc='reactive powers of the agents (kVAr)')
+        connections = {}
+        for k, a in enumerate(self.agents):
+            connections.setdefault((a.node, a.phase), []).append(k)
+        m.admm_connections = Set(initialize=list(connections), dimen=2, ordered=True)
+
+        @m.Constraint(m.admm_connections, m.time, doc='active power of the agents of each node and phase')
+        def admm_p_sum(m, node, phase, t):
+            return m.net.p_out[node, phase, t] == sum(m.admm_p[k, t] for k in connections[node, phase])
+
+        @m.Constraint(m.admm_connections, m.time, doc='reactive power of the agents of each node and phase')
+        def admm_q_sum(m, node, phase, t):
+            reactive = [k for k in connections[node, phase] if self.agents[k].reactive]
+            if not reactive:
+                return Constraint.Skip
+            return m.net.q_out[node, phase, t] == sum(m.admm_q[k, t] for k in reactive)
+
+        for (node, phase), ks in connections.items():
+            for var in [m.net.p_out] + ([m.net.q_out] if any(self.agents[k].reactive for k in ks) else []):
+                for t in m.time:
+                    var[node, phase, t].unfix()
+
+        self.powers = []
+        for k, a in enumerate(self.agents):
+            for var in [m.admm_p] + ([m.admm_q] if a.reactive else []):
+                self.powers.append([var[k, t] for t in m.time])
+        _penalized(m, self.powers)
+
+        self.opt = SolverFactory(solver)
+        for k, v in (solver_options or {}).items():
+            self.opt.options[k] = v
+
+        # rows of the powers of each agent
+        self._rows, row = [], 0
+        for a in self.agents:
+            n = 2 if a.reactive else 1
+            self._rows.append(slice(row, row + n))
+            row += n
+
+        processes = multiprocessing.cpu_count() if processes is None else processes
+        processes = max(1, min(processes, len(self.agents)))
+        args = (solver, solver_options, solve_kwargs)
+        split = np.array_split(np.arange(len(self.agents)), processes)
+        self._split = [s for s in split if len(s)]
+        group = _Group if processes == 1 else _RemoteGroup
+        self._groups = []
+        try:
+            for s in self._split:
+                self._groups.append(group([self.agents[k] for k in s], *args))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Stops the processes of the pool. """
+        for g in self._groups:
+            g.close()
+        self._groups = []
+
+    def _solve_agents(self, rho, targets):
+        for g, s in zip(self._groups, self._split):
+            g.send(rho, [targets[self._rows[k]] for k in s])
+        z = []
+        for g in self._groups:
+            for powers in g.recv():
+                z.extend(powers)
+        return np.array(z)
+
+    def _next_rho(self, k, rho, r, s):
+        if self.penalty is not None:
+            return self.penalty(k, rho, r, s)
+        if r > self.mu * s:
+            return rho * self.tau
+        if s > self.mu * r:
+            return rho / self.tau
+        return rho
+
+    def run(self, max_iter=100, tol=1e-3):
+        """
+        Runs the coordination.
+
+        :param int max_iter: maximum number of iterations
+        :param float tol: tolerance on the primal and dual residuals (root mean square, kW)
+        :return: AdmmResult
+        """
+
+        if not self._groups:
+            raise RuntimeError('The coordinator is closed.')
+
+        rho = self.rho
+        nt = len(self.model.time)
+        z = np.zeros((len(self.powers), nt))
+        u = np.zeros_like(z)
+        history, converged = [], False
+
+        for k in range(max_iter):
+            _solve(self.model, self.opt, 'network', rho, z - u, self.solve_kwargs)
+            x = np.array([[value(v) for v in data] for data in self.powers], dtype=float)
+
+            z_prev, z = z, self._solve_agents(rho, x + u)
+            if z.shape != x.shape:
+                raise ValueError(f'The agents have {z.shape[1]} time steps, and the network {nt}.')
+            u += x - z
+
+            r = np.sqrt(np.mean((x - z) ** 2))
+            s = rho * np.sqrt(np.mean((z - z_prev) ** 2))
+            history.append((r, s, rho))
+            logger.info(f'ADMM iteration {k}: primal residual {r:.3g}, dual residual {s:.3g}, rho {rho:.3g}')
+
+            if r <= tol and s <= tol:
+                converged = True
+                break
+
+            new_rho = self._next_rho(k, rho, r, s)
+            u *= rho / new_rho
+            rho = new_rho
+
+        if not converged:
+            logger.warning(f'ADMM did not converge in {max_iter} iterations.')
+
+        self.rho = rho
+        nan = np.full(nt, np.nan)
+        p = np.array([z[s][0] for s in self._rows])
+        q = np.array([z[s][1] if s.stop - s.start > 1 else nan for s in self._rows])
+        price_p = np.array([-rho * u[s][0] for s in self._rows])
+        price_q = np.array([-rho * u[s][1] if s.stop - s.start > 1 else nan for s in self._rows])
+        return AdmmResult(agents=[a.name for a in self.agents], p=p, q=q, price_p=price_p, price_q=price_q, rho=rho,
+                          iterations=len(history), converged=converged, history=np.array(history))
@@ -60,10 +60,30 @@ class SimpleHorizon(object):
         self.index = np.linspace(0, self.horizon.total_seconds(), num=len(self._current))  # time steps in seconds
         self.map = pd.Series(self._current, index=self.index)
         self.nfe = len(self.index) - 1  # number of finite element for discretisation
+        self._positions = dict()  # positions of the time sets of the models in the index (see load_data)
 
     def __repr__(self):
         return f'SimpleHorizon(tstart={self.TSTART}, tend={self.TEND}, time_step={self.time_step}, nfe={self.nfe})'
 
+    def shift(self, delta):
+        """
+        Returns a copy of the horizon, shifted by `delta`.
+
+        The length, time step and index (in seconds) of the horizon are kept, so that a model built on the
+        original horizon is still valid on the shifted one. Only the time stamps are moved.
+
+        :param delta: shift of the horizon (string or `pandas.Timedelta`)
+        :return: SimpleHorizon
+        """
+        from copy import copy
+
+        delta = pd.Timedelta(delta)
+        h = copy(self)
+        h.TSTART = self.TSTART + delta
+        h.TEND = self.TEND + delta
+        h._current = self._current + delta
+        h.map = pd.Series(h._current, index=self.index)
+        return h
 
     @property
     def current(self):
@@ -86,49 +86,40 @@ class LModel(ConcreteModel):
                 if u.is_binary():
                     u.unfix()
 
-    def get_duals(self, dual_name='dual'):
+    def get_duals(self, dual_name='dual', as_xarray=False):
         """ Return dual coefficient of LP model.
 
         :param dual_name: name of the Suffix
+        :param bool as_xarray: return a xarray Dataset (see :func:`lms2.tools.model_processing.get_duals`)
         :return: Dual coefficient (DataFrame)
 
         """
+        from lms2.tools.model_processing import get_duals
 
-        from pandas import DataFrame, concat
-        from pyomo.environ import Constraint
-        df = DataFrame()
+        return get_duals(self, dual_name=dual_name, as_xarray=as_xarray)
 
-        assert hasattr(self, dual_name), f'"{self.name}" does not have attribute named "{dual_name}".'
-
-        for cst in self.component_objects(Constraint, active=True):
-            if cst.is_indexed():
-                s = DataFrame(
-                    {cst.getname(fully_qualified=True) + '_' + dual_name: {i: self.component(dual_name)[c]
-                                                                           for (i, c) in cst.iteritems()}})
-                df = concat([df, s], axis=1)
-            else:
-                Warning('Trying to get dual coefficient from a non-index variable. Not Implemented Yet')
-        return df
-
-    def get_slack(self):
+    def get_slack(self, as_xarray=False):
         """
         Return slack variables values for all
         the active constraints of a model.
 
+        :param bool as_xarray: return a xarray Dataset (see :func:`lms2.tools.model_processing.get_slack`)
         :return: DataFrame
         """
+        from lms2.tools.model_processing import get_slack
+
+        return get_slack(self, as_xarray=as_xarray)
 
-        from pandas import DataFrame, Series, concat
+    def snapshot(self, **kwargs):
+        """
+        Return a snapshot of the values of the Var, Param and Expression components of the model.
+
+        :param kwargs: see :meth:`lms2.core.snapshot.Snapshot.from_model`
+        :return: Snapshot
+        """
+        from lms2.core.snapshot import Snapshot
 
-        df = DataFrame()
-        for c in self.component_objects(Constraint, active=True):
-            if c.is_indexed():
-                s1 = Series({i: c[i].lslack() for i in c.__iter__()})
-                s2 = Series({i: c[i].uslack() for i in c.__iter__()})
-                df_c = DataFrame(
-                    {c.getname(fully_qualified=True).replace('.', '_') + '_ls': s1, c.getname() + '_us': s2})
-                df = concat([df, df_c], axis=1)
-        return df
+        return Snapshot.from_model(self, **kwargs)
 
     def construct_objective_from_expression_list(self, wrt, *args):
         """
@@ -223,49 +214,41 @@ class AbsLModel(AbstractModel):
                 if u.is_binary():
                     u.unfix()
 
-    def get_duals(self, dual_name='dual'):
+    def get_duals(self, dual_name='dual', as_xarray=False):
         """
         Return dual coefficient of LP abstract model.
 
         :param str dual_name: name of the Suffix
+        :param bool as_xarray: return a xarray Dataset (see :func:`lms2.tools.model_processing.get_duals`)
         :return: Dual coefficient (DataFrame)
 
         """
-        from pandas import DataFrame, concat
-        from pyomo.environ import Constraint
-        df = DataFrame()
+        from lms2.tools.model_processing import get_duals
 
-        assert hasattr(self, dual_name), f'"{self.name}" does not have attribute named "{dual_name}".'
+        return get_duals(self, dual_name=dual_name, as_xarray=as_xarray)
 
-        for cst in self.component_objects(Constraint, active=True):
-            if cst.is_indexed():
-                s = DataFrame(
-                    {cst.getname(fully_qualified=True) + '_' + dual_name: {i: self.component(dual_name)[c]
-                                                                           for (i, c) in cst.iteritems()}})
-                df = concat([df, s], axis=1)
-            else:
-                Warning('Trying to get dual coefficient from a non-index variable. Not Implemented Yet')
-        return df
-
-    def get_slack(self):
+    def get_slack(self, as_xarray=False):
         """
         Return slack variables values for all
         the active constraints of a abstract model.
 
+        :param bool as_xarray: return a xarray Dataset (see :func:`lms2.tools.model_processing.get_slack`)
         :return: DataFrame
         """
+        from lms2.tools.model_processing import get_slack
+
+        return get_slack(self, as_xarray=as_xarray)
+
+    def snapshot(self, **kwargs):
+        """
+        Return a snapshot of the values of the Var, Param and Expression components of the model.
 
-        from pandas import DataFrame, Series, concat
+        :param kwargs: see :meth:`lms2.core.snapshot.Snapshot.from_model`
+        :return: Snapshot
+        """
+        from lms2.core.snapshot import Snapshot
 
-        df = DataFrame()
-        for c in self.component_objects(Constraint, active=True):
-            if c.is_indexed():
-                s1 = Series({i: c[i].lslack() for i in c.__iter__()})
-                s2 = Series({i: c[i].uslack() for i in c.__iter__()})
-                df_c = DataFrame(
-                    {c.getname(fully_qualified=True).replace('.', '_') + '_ls': s1, c.getname() + '_us': s2})
-                df = concat([df, df_c], axis=1)
-        return df
+        return Snapshot.from_model(self, **kwargs)
 
     def construct_objective_from_expression_list(self, wrt, *args):
         """
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Receding horizon (rolling horizon, MPC) driver.
+
+The model is built once, for a fixed window length. For each shift of the window, only the mutable parameters of
+the model (input profiles and initial states) are updated, before solving the problem again.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from pyomo.core.base.component import Component, ComponentData
+from pyomo.core.base.indexed_component_slice import IndexedComponent_slice
+from pyomo.environ import SolverFactory, Param, value
+from pyomo.opt import check_optimal_termination
+
+__all__ = ['RecedingHorizon']
+logger = logging.getLogger('lms2.receding')
+
+
+def _check_mutable(obj, name):
+    """ Raise an error if obj is a Param (or a Param data) that can not be updated between two windows. """
+
+    if isinstance(obj.parent_component(), Param) and not obj.parent_component().mutable:
+        raise ValueError(f'{name} must be a mutable Param to be updated by the receding horizon, '
+                         f'consider declaring it with mutable=True.')
+
+
+def _time_data(component, time_points):
+    """
+    Returns the list of the data objects of a time indexed component (or of a slice over time), ordered as
+    time_points.
+    """
+
+    if isinstance(component, IndexedComponent_slice):
+        data = dict(component.wildcard_items())
+    else:
+        data = component
+    try:
+        return [data[t] for t in time_points]
+    except KeyError as err:
+        raise KeyError(f'Could not find the time index {err} in {component}. '
+                       f'Components must be indexed by the time set of the model.')
+
+
+class RecedingHorizon(object):
+    """
+    Receding horizon driver
+
+    The model is built once by the user, on a first window described by a :class:`lms2.core.horizon.SimpleHorizon`
+    (and discretized with `horizon.nfe` finite elements). The driver then moves the window by `shift`, until the end
+    of the study `tend`. Between two windows, only the following values are updated :
+
+        - `profiles` : list of couples of time indexed mutable parameters (or slices), and their data over the whole
+          study (``pandas.Series`` indexed by time stamps, as returned by :func:`lms2.tools.data_processing.read_data`).
+          Data are loaded using :func:`lms2.tools.data_processing.load_bulk_data`.
+        - `states` : list of couples of mutable scalar parameters (such as `soc0` or `T_HW_0`) and of the time indexed
+          component (Var, Expression or slice) from which their value is taken at the beginning of the next window.
+          A callable `f(model, t)`, returning an expression of the model, may also be given as source.
+
+    Pyomo components are not hashable, `profiles` and `states` are thus lists of tuples (a
+    ``pyomo.core.expr.ComponentMap`` is also accepted).
+
+    Results are streamed window by window: :meth:`run` yields the applied part of each window, i.e. the first
+    `shift` of the window.
+
+    Example:
+        >>> mpc = RecedingHorizon(m, horizon, tend='2020-02-01 00:00:00', shift='1 hour', solver='glpk',
+        ...                       profiles=[(m.pv.p0, data_pv['p_PV']), (m.charge.p, data_charge['base_load1'])],
+        ...                       states=[(m.bat.soc0, m.bat.soc)],
+        ...                       outputs={'p_bat': m.bat.p, 'soc': m.bat.soc})
+        >>> df = pd.concat([res for window, results, res in mpc.run()])
+    """
+
+    def __init__(self, model, horizon, tend, shift=None, time=None, solver='glpk', solve_kwargs=None,
+                 profiles=None, states=None, outputs=None, stop_on_failure=True):
+        """
+
+        :param model: model built (and discretized) over the first window
+        :param horizon: first window of the study (SimpleHorizon)
+        :param tend: end of the study (string or `pandas.Timestamp`)
+        :param shift: shift between two windows (default: horizon.time_step)
+        :param time: time set of the model (default: `model.time`)
+        :param solver: name of the solver, or solver object
+        :param dict solve_kwargs: key-word arguments passed to `solver.solve()`
+        :param list profiles: mutable parameters to update, and their data over the study
+        :param list states: mutable parameters to update, and the component giving their next value
+        :param dict outputs: name and time indexed components (or slices) returned for each window
+        :param bool stop_on_failure: raise an error if a window is not solved to optimality
+        """
+
+        self.model = model
+        self.horizon = horizon
+        self.shift = horizon.time_step if shift is None else pd.Timedelta(shift)
+        self.solver = SolverFactory(solver) if isinstance(solver, str) else solver
+        self.solve_kwargs = {} if solve_kwargs is None else solve_kwargs
+        self.profiles = [] if profiles is None else list(getattr(profiles, 'items', lambda: profiles)())
+        self.states = [] if states is None else list(getattr(states, 'items', lambda: states)())
+        self.outputs = {} if outputs is None else outputs
+        self.stop_on_failure = stop_on_failure
+
+        tend = pd.Timestamp(tend)
+        self.tend = tend.tz_localize(horizon.tz_info) if tend.tzinfo is None else tend.tz_convert(horizon.tz_info)
+
+        if time is None:
+            if not hasattr(model, 'time'):
+                raise AttributeError(f'{model.name} has no attribute named "time", the time set must be given.')
+            time = model.time
+
+        self.time_points = list(time)
+        if len(self.time_points) != len(horizon.index):
+            raise ValueError(f'The time set contains {len(self.time_points)} points, but the horizon contains '
+                             f'{len(horizon.index)} time steps. The model should be discretized using horizon.nfe.')
+
+        assert self.shift % horizon.time_step == pd.Timedelta('0s'), \
+            "Parameter 'shift' should be divisible by the time step of the horizon."
+        self.n_shift = self.shift // horizon.time_step
+        assert 0 < self.n_shift <= horizon.nfe, \
+            "Parameter 'shift' should be positive, and shorter than the horizon."
+
+        for p, _ in self.profiles:
+            _check_mutable(next(iter(p)) if isinstance(p, IndexedComponent_slice) else p, str(p))
+
+        # the model is never rebuilt, so that data objects can be retrieved once and for all
+        t_next = self.time_points[self.n_shift]
+        self._states = []
+        for target, source in self.states:
+            _check_mutable(target, target.name)
+            if isinstance(source, (Component, ComponentData, IndexedComponent_slice)):
+                self._states.append((target, _time_data(source, [t_next])[0]))
+            else:
+                self._states.append((target, source(self.model, t_next)))
+
+        self._outputs = {name: _time_data(c, self.time_points[:self.n_shift]) for name, c in self.outputs.items()}
+
+    def __repr__(self):
+        return f'RecedingHorizon(tstart={self.horizon.TSTART}, tend={self.tend}, shift={self.shift}, ' \
+               f'windows={len(self)})'
+
+    def __len__(self):
+        return max(0, (self.tend - self.horizon.TEND) // self.shift + 1)
+
+    def windows(self):
+        """
+        Generator of the successive windows (SimpleHorizon) of the study.
+        """
+
+        for k in range(len(self)):
+            yield self.horizon if k == 0 else self.horizon.shift(k * self.shift)
+
+    def update(self, window, next_states=None):
+        """
+        Update the mutable parameters of the model for a given window.
+
+        :param window: current window (SimpleHorizon)
+        :param list next_states: couples of states and values, taken from the previous solution
+        """
+        from lms2.tools.data_processing import load_bulk_data
+
+        load_bulk_data(window, self.profiles)
+
+        if next_states is not None:
+            for target, v in next_states:
+                target.set_value(v)
+
+    def _next_states(self):
+        return [(target, value(source)) for target, source in self._states]
+
+    def _results(self, window):
+        index = window.current[:self.n_shift]
+        values = {name: [value(d, exception=False) for d in data] for name, data in self._outputs.items()}
+        return pd.DataFrame({name: np.array([np.nan if v is None else v for v in val], dtype=float)
+                             for name, val in values.items()}, index=index)
+
+    def run(self):
+        """
+        Solves the successive windows of the study.
+
+        :return: generator of tuples (window, solver results, applied results as a `pandas.DataFrame`)
+        """
+
+        next_states = None
+        for k, window in enumerate(self.windows()):
+            self.update(window, next_states)
+
+            results = self.solver.solve(self.model, **self.solve_kwargs)
+
+            if not check_optimal_termination(results):
+                msg = f'Window {k} ({window.TSTART}) : solver terminated with ' \
+                      f'{results.solver.termination_condition}.'
+                if self.stop_on_failure:
+                    logger.error(msg)
+                    raise RuntimeError(msg)
+                logger.warning(msg + ' States are not updated.')
+            else:
+                logger.info(f'Window {k} ({window.TSTART}) : solved.')
+                next_states = self._next_states()
+
+            yield window, results, self._results(window)
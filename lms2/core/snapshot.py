@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot of the solution of a model.
+
+The values of the components of a model (Var, Param, Expression) are stored as dense float64 arrays, with their index
+labels (one array per dimension of the index). Components indexed by the same set share their label arrays.
+"""
+
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import Var, Param, Expression, value
+
+__all__ = ['Snapshot']
+logger = logging.getLogger('lms2.snapshot')
+
+
+def _labels(keys):
+    """ Returns the tuple of label arrays (one per dimension) of a list of keys. """
+
+    if not keys or keys == [None]:
+        return ()
+    if not isinstance(keys[0], tuple):
+        return np.asarray(keys),
+    return tuple(np.asarray(level) for level in zip(*keys))
+
+
+def _values(component):
+    """ Returns the values of a component as a float64 array (nan for the undefined values). """
+
+    if isinstance(component, Var):
+        return np.array([v.value for v in component.values()], dtype=float)
+    return np.array([value(v, exception=False) for v in component.values()], dtype=float)
+
+
+class Snapshot(object):
+    """
+    Snapshot of the solution of a model
+
+    Each component is stored as a couple (labels, values), where `values` is a dense float64 array and `labels` a
+    tuple of arrays, one for each dimension of the index of the component (empty for scalar components).
+
+    Snapshots are saved in a npz file (see :meth:`save` and :meth:`load`), and snapshots of successive windows of a
+    receding horizon are concatenated using :meth:`concat`.
+
+    Example:
+        >>> snap = m.snapshot()
+        >>> snap['bat.soc']
+        >>> snap.save('results.npz')
+        >>> res = Snapshot.concat([Snapshot.load(f) for f in files], keys=range(len(files)))
+    """
+
+    VERSION = 1
+
+    def __init__(self, data=None, attrs=None):
+        """
+
+        :param dict data: name of the components, and couples (labels, values)
+        :param dict attrs: attributes of the snapshot (json serializable)
+        """
+
+        self.data = {} if data is None else data
+        self.attrs = {} if attrs is None else attrs
+
+    def __repr__(self):
+        return f'Snapshot(components={len(self)}, nbytes={self.nbytes})'
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def __getitem__(self, name):
+        """ Returns the values of a component as a `pandas.Series`. """
+
+        labels, values = self.data[name]
+        if len(labels) == 0:
+            index = None
+        elif len(labels) == 1:
+            index = pd.Index(labels[0])
+        else:
+            index = pd.MultiIndex.from_arrays(labels)
+        return pd.Series(values, index=index, name=name)
+
+    @property
+    def nbytes(self):
+        """ Memory used by the arrays of the snapshot (shared labels are counted once). """
+
+        arrays = {id(a): a for labels, values in self.data.values() for a in labels + (values,)}
+        return sum(a.nbytes for a in arrays.values())
+
+    @classmethod
+    def from_model(cls, model, ctypes=(Var, Param, Expression), descend_into=True, attrs=None):
+        """
+        Takes a snapshot of the values of the components of a model.
+
+        Components are named by their name relative to the model. Components with non numerical values are ignored.
+
+        :param model: model or block
+        :param ctypes: types of the stored components
+        :param bool descend_into: also store the components of the sub-blocks
+        :param dict attrs: attributes of the snapshot (json serializable)
+        :return: Snapshot
+        """
+
+        data = dict()
+        shared = dict()
+        for c in model.component_objects(ctypes, active=True, descend_into=descend_into):
+            try:
+                values = _values(c)
+            except (TypeError, ValueError):
+                logger.debug(f'{c.name} has non numerical values and is not stored in the snapshot.')
+                continue
+
+            # dense components indexed by the same set share their labels
+            key = (id(c.index_set()), len(c))
+            if c.is_indexed() and key in shared and len(c) == len(c.index_set()):
+                labels = shared[key]
+            else:
+                labels = _labels(list(c.keys()))
+                if c.is_indexed() and len(c) == len(c.index_set()):
+                    shared[key] = labels
+
+            data[c.getname(fully_qualified=True, relative_to=model)] = (labels, values)
+
+        return cls(data, attrs)
+
+    def to_frame(self, names=None):
+        """
+        Returns the values of components as a `pandas.DataFrame` (components are aligned on their index).
+
+        :param names: names of the components (default: all the components)
+        :return: DataFrame
+        """
+
+        names = list(self.data) if names is None else names
+        return pd.concat([self[name] for name in names], axis=1)
+
+    def save(self, path, compressed=False):
+        """
+        Saves the snapshot in a npz file. Shared label arrays are stored once.
+
+        :param path: path of the file
+        :param bool compressed: compress the file
+        """
+
+        arrays = dict()
+        ids = dict()
+        components = dict()
+
+        def _store(a):
+            if id(a) not in ids:
+                ids[id(a)] = f'a{len(ids)}'
+                arrays[ids[id(a)]] = a
+            return ids[id(a)]
+
+        for name, (labels, values) in self.data.items():
+            components[name] = dict(labels=[_store(a) for a in labels], values=_store(values))
+
+        meta = dict(version=self.VERSION, attrs=self.attrs, components=components)
+        arrays['meta'] = np.array(json.dumps(meta, default=str))
+        (np.savez_compressed if compressed else np.savez)(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a snapshot from a npz file (see :meth:`save`).
+
+        :param path: path of the file
+        :return: Snapshot
+        """
+
+        with np.load(path, allow_pickle=False) as f:
+            meta = json.loads(str(f['meta']))
+            if meta.get('version') != cls.VERSION:
+                raise ValueError(f'Unknown version of snapshot file {path}: {meta.get("version")}.')
+            arrays = {k: f[k] for k in f.files if k != 'meta'}
+
+        data = {name: (tuple(arrays[k] for k in c['labels']), arrays[c['values']])
+                for name, c in meta['components'].items()}
+        return cls(data, meta['attrs'])
+
+    @classmethod
+    def concat(cls, snapshots, keys=None):
+        """
+        Concatenates snapshots (e.g. of the successive windows of a receding horizon).
+
+        Only the components present in all the snapshots are kept. If `keys` are given, a first level is added to
+        the labels of each component, with the key of its snapshot.
+
+        :param list snapshots: snapshots to concatenate
+        :param keys: key of each snapshot (e.g. start time stamps of the windows)
+        :return: Snapshot
+        """
+
+        snapshots = list(snapshots)
+        if not snapshots:
+            return cls()
+        if keys is not None:
+            keys = list(keys)
+            assert len(keys) == len(snapshots), 'keys and snapshots must have the same length.'
+
+        names = [name for name in snapshots[0] if all(name in s for s in snapshots[1:])]
+        data = dict()
+        shared = dict()
+        for name in names:
+            parts = [s.data[name] for s in snapshots]
+            ndim = len(parts[0][0])
+            if any(len(labels) != ndim for labels, _ in parts):
+                logger.warning(f'{name} has different dimensions in the snapshots, and is not concatenated.')
+                continue
+
+            key = tuple(id(a) for labels, _ in parts for a in labels)
+            if key not in shared:
+                labels = tuple(np.concatenate([p[0][j] for p in parts]) for j in range(ndim))
+                if keys is not None:
+                    labels = (np.repeat(np.asarray(keys), [len(v) for _, v in parts]),) + labels
+                shared[key] = labels
+            data[name] = (shared[key], np.concatenate([v for _, v in parts]))
+
+        return cls(data, snapshots[0].attrs)
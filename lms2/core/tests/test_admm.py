@@ -0,0 +1,107 @@
+import unittest
+
+import numpy as np
+from pyomo.environ import (ConcreteModel, Block, Constraint, Expression, Objective, RangeSet, SolverFactory, Var,
+                           value)
+
+from lms2.core.admm import AdmmAgent, AdmmCoordinator
+from lms2.electric.graph_utils import random_feeder
+from lms2.electric.network import network_3phases_lindistflow
+
+HIGHS = SolverFactory('highs').available(exception_flag=False)
+NT = 6
+LOAD = np.array([1., 2., 3., 3., 2., 1.])
+PRICE = np.array([1., 1., 3., 3., 1., 1.])
+
+
+def _battery(b, time):
+    b.pb = Var(time, bounds=(-2, 2))
+    b.e = Var(time, bounds=(0, 4))
+    b.dyn = Constraint(time, rule=lambda b, t: b.e[t] == (b.e[t - 1] if t else 2) + b.pb[t])
+    b.p_out = Expression(time, rule=lambda b, t: LOAD[t] + b.pb[t])
+    b.wear = Objective(expr=0.01 * sum(b.pb[t] ** 2 for t in time))
+
+
+def battery(m):
+    m.time = RangeSet(0, NT - 1)
+    _battery(m, m.time)
+
+
+def import_cost(m):
+    root = [e for e in m.net.edges if e[0] == 0]
+    m.cost = Objective(expr=sum(PRICE[t] * m.net.p[e + (ph, t)] for e in root for ph in m.net.phases for t in m.time))
+
+
+@unittest.skipUnless(HIGHS, 'needs the highs solver')
+class TestAdmm(unittest.TestCase):
+    def setUp(self):
+        self.g = random_feeder(12, battery_share=0., seed=2)
+        for n, d in self.g.nodes(data=True):
+            d['fix_p_out'] = d['fix_q_out'] = [True] * 3
+        self.agents = [AdmmAgent(n, d['phase'], battery) for n, d in self.g.nodes(data=True)
+                       if d['kind'] == 'dwelling']
+
+    def centralized(self):
+        m = ConcreteModel()
+        m.time = RangeSet(0, NT - 1)
+        m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=self.g))
+        import_cost(m)
+        m.bat = Block(range(len(self.agents)))
+        for k, a in enumerate(self.agents):
+            _battery(m.bat[k], m.time)
+            m.bat[k].wear.deactivate()
+            for t in m.time:
+                m.net.p_out[a.node, a.phase, t].unfix()
+        connections = dict.fromkeys((a.node, a.phase) for a in self.agents)
+        m.link = Constraint(list(connections), m.time, rule=lambda m, n, ph, t: m.net.p_out[n, ph, t] == sum(
+            m.bat[k].p_out[t] for k, a in enumerate(self.agents) if (a.node, a.phase) == (n, ph)))
+        m.cost.deactivate()
+        m.obj = Objective(expr=m.cost.expr + sum(m.bat[k].wear.expr for k in m.bat))
+        SolverFactory('highs').solve(m)
+        return np.array([[value(m.bat[k].p_out[t]) for t in m.time] for k in m.bat]), value(m.obj)
+
+    def test_converge(self):
+        with AdmmCoordinator(self.g, self.agents, range(NT), network_rule=import_cost, processes=1) as admm:
+            res = admm.run(max_iter=300, tol=1e-4)
+        self.assertTrue(res.converged)
+        self.assertEqual(res.p.shape, (len(self.agents), NT))
+        self.assertTrue(np.isnan(res.q).all())
+        self.assertEqual(res.history.shape, (res.iterations, 3))
+
+        p, _ = self.centralized()
+        np.testing.assert_allclose(res.p, p, atol=1e-2)
+
+        # prices of the network, seen by the agents
+        np.testing.assert_allclose(res.price_p, np.broadcast_to(PRICE, res.price_p.shape), atol=1e-2)
+
+    def test_shared_node(self):
+        """ agents of the same node and phase are summed in the injection of the network """
+        a = self.agents[0]
+        self.agents.append(AdmmAgent(a.node, a.phase, battery, name='second'))
+        with AdmmCoordinator(self.g, self.agents, range(NT), network_rule=import_cost, processes=1) as admm:
+            res = admm.run(max_iter=300, tol=1e-4)
+            injection = [value(admm.model.net.p_out[a.node, a.phase, t]) for t in range(NT)]
+        self.assertTrue(res.converged)
+        np.testing.assert_allclose(injection, res.p[0] + res.p[-1], atol=1e-3)
+
+        p, _ = self.centralized()
+        np.testing.assert_allclose(res.p, p, atol=1e-2)
+
+    def test_pool(self):
+        with AdmmCoordinator(self.g, self.agents, range(NT), network_rule=import_cost, processes=1) as admm:
+            serial = admm.run(max_iter=20)
+        with AdmmCoordinator(self.g, self.agents, range(NT), network_rule=import_cost, processes=2) as admm:
+            pool = admm.run(max_iter=20)
+        np.testing.assert_allclose(pool.p, serial.p, atol=1e-6)
+        np.testing.assert_allclose(pool.history, serial.history, atol=1e-6)
+
+    def test_fixed_penalty(self):
+        with AdmmCoordinator(self.g, self.agents, range(NT), network_rule=import_cost, rho=0.5, tau=1.,
+                             processes=1) as admm:
+            res = admm.run(max_iter=5)
+        self.assertFalse(res.converged)
+        np.testing.assert_array_equal(res.history[:, 2], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
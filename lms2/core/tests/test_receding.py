@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import ConcreteModel, Block, Objective, SolverFactory, TransformationFactory, value
+from pyomo.dae import ContinuousSet
+
+from lms2.core.horizon import SimpleHorizon
+from lms2.core.receding import RecedingHorizon
+from lms2.electric.batteries import battery_v1
+from lms2.electric.sources import fixed_power_load, power_source
+
+
+def _solver():
+    for name in ['glpk', 'cbc', 'appsi_highs']:
+        solver = SolverFactory(name)
+        if solver.available(exception_flag=False):
+            return solver
+    return None
+
+
+class TestRecedingHorizon(unittest.TestCase):
+
+    def setUp(self):
+        self.horizon = SimpleHorizon(tstart='2020-01-01 00:00:00', tend='2020-01-01 04:00:00', time_step='1 hour')
+        study = SimpleHorizon(tstart='2020-01-01 00:00:00', tend='2020-01-02 00:00:00', time_step='1 hour')
+        self.load = pd.Series(np.arange(len(study.current), dtype=float), index=study.current)
+
+        m = ConcreteModel()
+        m.time = ContinuousSet(initialize=[0, self.horizon.horizon.total_seconds()])
+        m.bat = Block(rule=lambda b: battery_v1(b, time=m.time, c_bat=10, soc0=50, socf=None, soc_min=0))
+        m.charge = Block(rule=lambda b: fixed_power_load(b, time=m.time))
+        m.grid = Block(rule=lambda b: power_source(b, time=m.time))
+
+        @m.Constraint(m.time)
+        def balance(m, t):
+            return m.bat.p[t] + m.grid.p[t] == m.charge.p[t]
+
+        TransformationFactory('dae.finite_difference').apply_to(m, nfe=self.horizon.nfe)
+        m.obj = Objective(expr=sum(m.grid.p[t] for t in m.time))
+        self.m = m
+
+    def test_windows(self):
+        mpc = RecedingHorizon(self.m, self.horizon, tend='2020-01-01 08:00:00', shift='2 hours', solver=_solver())
+        windows = list(mpc.windows())
+        self.assertEqual(len(mpc), 3)
+        self.assertEqual(len(windows), 3)
+        self.assertEqual(windows[-1].TEND, pd.Timestamp('2020-01-01 08:00:00', tz='Europe/Paris'))
+        self.assertTrue((windows[1].index == self.horizon.index).all())
+
+    def test_not_mutable(self):
+        from pyomo.environ import Param
+        self.m.test_param = Param(initialize=0, mutable=False)
+        with self.assertRaises(ValueError):
+            RecedingHorizon(self.m, self.horizon, tend='2020-01-01 08:00:00', states=[(self.m.test_param, self.m.bat.soc)])
+
+    @unittest.skipIf(_solver() is None, 'no available LP solver')
+    def test_run(self):
+        m = self.m
+        mpc = RecedingHorizon(m, self.horizon, tend='2020-01-01 08:00:00', shift='1 hour', solver=_solver(),
+                              profiles=[(m.charge.p, self.load)],
+                              states=[(m.bat.soc0, m.bat.soc)],
+                              outputs={'soc': m.bat.soc, 'load': m.charge.p})
+
+        socs = []
+        res = []
+        for window, results, df in mpc.run():
+            socs.append(value(m.bat.soc0))
+            res.append(df)
+        res = pd.concat(res)
+
+        self.assertEqual(len(res), 5)
+        self.assertEqual(list(res['load']), [0, 1, 2, 3, 4])
+        # initial state of each window is the state reached after the first hour of the previous window
+        np.testing.assert_allclose(socs[1:], res['soc'].values[1:], atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
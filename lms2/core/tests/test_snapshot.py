@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from pyomo.environ import Any, Block, Expression, Param, Set, Var
+
+from lms2.core.models import LModel
+from lms2.core.snapshot import Snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        m = LModel()
+        m.time = Set(initialize=[0., 10., 20.])
+        m.nodes = Set(initialize=['a', 'b'])
+        m.x = Var(m.time, initialize=lambda m, t: t)
+        m.y = Var(m.nodes, m.time, initialize=1)
+        m.z = Var()
+        m.p = Param(m.time, mutable=True, default=2)
+        m.name_p = Param(initialize='text', within=Any)
+        m.b = Block()
+        m.b.e = Expression(m.time, rule=lambda b, t: m.x[t] * m.p[t])
+        self.m = m
+
+    def test_from_model(self):
+        snap = self.m.snapshot()
+        self.assertEqual(list(snap), ['x', 'y', 'z', 'p', 'b.e'])
+        np.testing.assert_array_equal(snap['b.e'].values, [0, 20, 40])
+        self.assertTrue(np.isnan(snap['z'].iloc[0]))
+        self.assertEqual(snap['y'][('b', 20.)], 1)
+        # labels of the components indexed by time are shared
+        self.assertIs(snap.data['x'][0], snap.data['p'][0])
+
+    def test_save_load(self):
+        snap = self.m.snapshot(attrs={'window': 0})
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'snap.npz')
+            snap.save(path)
+            loaded = Snapshot.load(path)
+        self.assertEqual(loaded.attrs, {'window': 0})
+        self.assertEqual(list(loaded), list(snap))
+        for name in snap:
+            np.testing.assert_array_equal(loaded[name].values, snap[name].values)
+            self.assertTrue(loaded[name].index.equals(snap[name].index))
+        self.assertIs(loaded.data['x'][0][0], loaded.data['p'][0][0])
+
+    def test_concat(self):
+        snaps = []
+        for k in range(3):
+            for t in self.m.time:
+                self.m.x[t].value = k
+            snaps.append(self.m.snapshot())
+        res = Snapshot.concat(snaps, keys=[0, 3600, 7200])
+        self.assertEqual(len(res['y']), 18)
+        self.assertEqual(res['x'][(3600, 10.)], 1)
+        self.assertEqual(res['z'].index.tolist(), [0, 3600, 7200])
+        self.assertIs(res.data['x'][0], res.data['p'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
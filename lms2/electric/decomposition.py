@@ -0,0 +1,190 @@
+"""
+Decomposition of LinDistFlow problems without intertemporal coupling into independent single time step problems,
+solved in parallel.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from pyomo.environ import Block, ConcreteModel, Objective, RangeSet, SolverFactory, TerminationCondition, value
+
+from lms2.electric.network import network_3phases_lindistflow
+from lms2.tools.model_processing import is_time_decomposable
+
+logger = logging.getLogger('lms2.decomposition')
+
+__all__ = ['TimestepResults', 'solve_per_timestep']
+
+
+@dataclass(repr=False)
+class TimestepResults:
+    """
+    Results of the time steps of a LinDistFlow problem (see :func:`solve_per_timestep`), in the (node, phase, time)
+    and (edge, phase, time) layouts of the model.
+    """
+    nodes: list                 # labels of the nodes
+    edges: list                 # labels of the edges
+    y: np.ndarray               # (N, 3, T) square voltage magnitudes
+    p: np.ndarray               # (E, 3, T) active powers of the edges
+    q: np.ndarray               # (E, 3, T) reactive powers of the edges
+    p_out: np.ndarray           # (N, 3, T) active powers of the nodes
+    q_out: np.ndarray           # (N, 3, T) reactive powers of the nodes
+    objective: np.ndarray       # (T,) values of the objective (nan if the time step is not solved)
+    status: list                # termination condition of each time step
+
+
+def _template(graph, rule, nt=1, **kwargs):
+    """ LinDistFlow model over `nt` time steps, completed by `rule` (e.g. objective). """
+
+    m = ConcreteModel()
+    m.time = RangeSet(0, nt - 1)
+    m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=graph, **kwargs))
+    if rule is not None:
+        rule(m)
+    return m
+
+
+class _Worker(object):
+    """ Single time step template, built once by each process, and solved for successive time steps. """
+
+    def __init__(self, graph, rule, solver, solver_options, kwargs):
+        self.m = m = _template(graph, rule, **kwargs)
+        self.opt = SolverFactory(solver)
+        for k, v in (solver_options or {}).items():
+            self.opt.options[k] = v
+
+        nodes, edges, phases = list(m.net.nodes), list(m.net.edges), [0, 1, 2]
+        self.y = [m.net.y[n, ph, 0] for n in nodes for ph in phases]
+        self.p = [m.net.p[e + (ph, 0)] for e in edges for ph in phases]
+        self.q = [m.net.q[e + (ph, 0)] for e in edges for ph in phases]
+        self.p_out = [m.net.p_out[n, ph, 0] for n in nodes for ph in phases]
+        self.q_out = [m.net.q_out[n, ph, 0] for n in nodes for ph in phases]
+        self.objectives = list(m.component_data_objects(Objective, active=True))
+
+    def solve(self, p_out, q_out):
+        """
+        Solves the time steps of a chunk.
+
+        :param p_out: (N * 3, T) fixed active powers of the nodes (nan to keep the values of the graph)
+        :param q_out: (N * 3, T) fixed reactive powers of the nodes
+        :return: list of the results of the time steps
+        """
+
+        results = []
+        for t in range(p_out.shape[1]):
+            for variables, values in [(self.p_out, p_out[:, t]), (self.q_out, q_out[:, t])]:
+                for v, x in zip(variables, values.tolist()):
+                    if v.fixed and x == x:
+                        v.set_value(x)
+
+            res = self.opt.solve(self.m, load_solutions=False)
+            status = res.solver.termination_condition
+            if status == TerminationCondition.optimal:
+                self.m.solutions.load_from(res)
+                values = tuple(np.array([v.value for v in variables], dtype=float)
+                               for variables in [self.y, self.p, self.q, self.p_out, self.q_out])
+                objective = value(self.objectives[0]) if self.objectives else 0.
+            else:
+                values, objective = None, np.nan
+            results.append((str(status), objective, values))
+        return results
+
+
+_worker = None
+
+
+def _init_worker(*args):
+    global _worker
+    _worker = _Worker(*args)
+
+
+def _solve_chunk(p_out, q_out):
+    return _worker.solve(p_out, q_out)
+
+
+def _as_array(values, n, name):
+    if values is None:
+        return np.full((3 * n, 1), np.nan)
+    values = np.asarray(values, dtype=float)
+    if values.ndim != 3 or values.shape[:2] != (n, 3):
+        raise ValueError(f'{name} must be an array of shape (nodes, 3, time), received {values.shape}.')
+    return values.reshape(3 * n, -1)
+
+
+def solve_per_timestep(graph, p_out=None, q_out=None, rule=None, solver='appsi_highs', processes=None, chunk=24,
+                       check=True, solver_options=None, **kwargs):
+    """
+    Solves a LinDistFlow problem without intertemporal coupling (no storage, only fixed injections) as independent
+    single time step problems.
+
+    A single time step model (block `net` built by :func:`lms2.electric.network.network_3phases_lindistflow`,
+    completed by `rule`) is built once by each process of a pool, and solved for successive time steps by updating
+    the values of the fixed injections `p_out` and `q_out`. Results are reassembled in the (node, phase, time) layout.
+
+    With `check=True`, the decomposition is checked on a model of two time steps
+    (see :func:`lms2.tools.model_processing.is_time_decomposable`): a ValueError is raised if any constraint couples
+    time steps, so that a problem with storage is not silently decomposed.
+
+    Example of rule, minimizing the sum of the powers of the root :
+
+    >>> def rule(m):
+    ...     m.obj = Objective(expr=sum(m.net.p[e + (ph, t)] for e in m.net.edges if e[0] == 0
+    ...                                for ph in m.net.phases for t in m.time))
+
+    :param graph: radial network (networkx.DiGraph, see :func:`lms2.electric.graph_utils.read_json_graph`)
+    :param p_out: (N, 3, T) values of the fixed active powers of the nodes, in the order of the graph (nan, or None,
+        to keep the values of the graph)
+    :param q_out: (N, 3, T) values of the fixed reactive powers of the nodes
+    :param rule: function of the model (with the `time` set and the `net` block) adding the objective and other
+        components, indexed by `m.time` if needed (a module level function, sent to the processes)
+    :param str solver: name of the solver
+    :param int processes: number of processes (None for the number of CPUs, 1 to solve in the current process)
+    :param int chunk: number of time steps sent to a process at once
+    :param bool check: checks that the problem has no intertemporal coupling
+    :param dict solver_options: options of the solver
+    :param kwargs: other options of :func:`lms2.electric.network.network_3phases_lindistflow`
+    :return: TimestepResults
+    """
+
+    nodes = list(graph.nodes())
+    p_out = _as_array(p_out, len(nodes), 'p_out')
+    q_out = _as_array(q_out, len(nodes), 'q_out')
+    nt = max(p_out.shape[1], q_out.shape[1])
+    p_out = np.broadcast_to(p_out, (3 * len(nodes), nt))
+    q_out = np.broadcast_to(q_out, (3 * len(nodes), nt))
+
+    if check:
+        m = _template(graph, rule, nt=2, **kwargs)
+        if not is_time_decomposable(m, m.time):
+            raise ValueError('The problem couples time steps (e.g. storage), and cannot be solved per time step.')
+
+    args = (graph, rule, solver, solver_options, kwargs)
+    chunks = [slice(t0, min(t0 + chunk, nt)) for t0 in range(0, nt, chunk)]
+    if processes == 1:
+        worker = _Worker(*args)
+        results = [worker.solve(p_out[:, t], q_out[:, t]) for t in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=args) as pool:
+            results = list(pool.map(_solve_chunk, [p_out[:, t] for t in chunks], [q_out[:, t] for t in chunks]))
+    results = [r for chunk_results in results for r in chunk_results]
+
+    edges = list(graph.edges())
+    shapes = [(len(nodes), 3), (len(edges), 3), (len(edges), 3), (len(nodes), 3), (len(nodes), 3)]
+    arrays = [np.full(shape + (nt,), np.nan) for shape in shapes]
+    status, objective = [], np.full(nt, np.nan)
+    for t, (s, obj, values) in enumerate(results):
+        status.append(s)
+        objective[t] = obj
+        if values is not None:
+            for a, x, shape in zip(arrays, values, shapes):
+                a[:, :, t] = x.reshape(shape)
+
+    failed = sum(s != str(TerminationCondition.optimal) for s in status)
+    if failed:
+        logger.warning(f'{failed} time steps over {nt} were not solved to optimality.')
+
+    y, p, q, p_res, q_res = arrays
+    return TimestepResults(nodes=nodes, edges=edges, y=y, p=p, q=q, p_out=p_res, q_out=q_res, objective=objective,
+                           status=status)
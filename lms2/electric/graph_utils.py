@@ -1,4 +1,8 @@
 import json
+import os
+import shutil
+from dataclasses import dataclass, fields
+
 import numpy as np
 from pyomo.environ import *
 import networkx as nx
@@ -41,17 +45,428 @@ def read_json_graph(file_path):
 
     # Créer un graphe à partir des données chargées
     # les listes des données sont castées en np.array()
-    edges = graph_data['links']
+    # the list of edges is named 'links' or 'edges', depending on the version of networkx that saved the graph
+    link = 'links' if 'links' in graph_data else 'edges'
+    edges = graph_data[link]
     for i, d in enumerate(edges):
         for k, v in d.items():
             if isinstance(v, list):
                 edges[i][k] = np.asarray(v)
 
-    graph_data.update({'link': edges})
-    graph = nx.node_link_graph(graph_data)
+    try:
+        graph = nx.node_link_graph(graph_data, edges=link)
+    except TypeError:
+        # networkx < 3.4
+        graph = nx.node_link_graph(graph_data, link=link)
     return graph
 
 
+# -------------------------------------------------------------------------------------------------------------------
+# binary format
+# -------------------------------------------------------------------------------------------------------------------
+
+BINARY_GRAPH_VERSION = 1
+_MISSING = object()
+
+
+@dataclass(repr=False)
+class GraphTables:
+    """
+    Columnar tables of a graph, as stored in the binary format (see :func:`save_binary_graph`).
+
+    Each attribute of the nodes (or of the edges) is a column, with one row per node (or edge), in the order of the
+    graph. Numerical arrays of the same shape (e.g. `pmatrix`) are stacked, e.g. as a (E, 3, 3) array. Cables are
+    stored once in `cables`, and the cable columns contain the positions of the cables in this list. Rows of
+    the attributes that are not defined for every node (or edge) are flagged by a mask.
+    """
+    directed: bool
+    multigraph: bool
+    graph: dict                 # attributes of the graph
+    nodes: np.ndarray           # (N,) labels of the nodes
+    source: np.ndarray          # (E,) positions of the sending nodes of the edges
+    target: np.ndarray          # (E,) positions of the receiving nodes of the edges
+    keys: np.ndarray            # (E,) keys of the edges (multigraphs only, else None)
+    node_data: dict             # columns of the attributes of the nodes
+    edge_data: dict             # columns of the attributes of the edges
+    node_mask: dict             # (N,) boolean masks of the attributes that are not defined for every node
+    edge_mask: dict             # (E,) boolean masks of the attributes that are not defined for every edge
+    cables: list                # Cable objects, deduplicated by name
+    columns: dict               # encoding of the columns ('nodes' and 'edges')
+
+    def to_graph(self):
+        """ Returns the networkx graph. Arrays are views of the (memory-mapped) columns. """
+
+        cls = {(False, False): nx.Graph, (True, False): nx.DiGraph,
+               (False, True): nx.MultiGraph, (True, True): nx.MultiDiGraph}[self.directed, self.multigraph]
+        g = cls()
+        g.graph.update(self.graph)
+
+        nodes = _decode_labels(self.nodes, self.columns['labels'])
+        node_data = _decode_columns(self.node_data, self.node_mask, self.columns['nodes'], self.cables, len(nodes))
+        g.add_nodes_from(zip(nodes, node_data))
+
+        source, target = self.source.tolist(), self.target.tolist()
+        edge_data = _decode_columns(self.edge_data, self.edge_mask, self.columns['edges'], self.cables, len(source))
+        if self.multigraph:
+            keys = _decode_labels(self.keys, self.columns['keys'])
+            g.add_edges_from((nodes[i], nodes[j], k, d) for i, j, k, d in zip(source, target, keys, edge_data))
+        else:
+            g.add_edges_from((nodes[i], nodes[j], d) for i, j, d in zip(source, target, edge_data))
+        return g
+
+
+def _is_number(v):
+    return isinstance(v, (bool, int, float, np.bool_, np.integer, np.floating))
+
+
+def _tuples(v):
+    return tuple(_tuples(e) for e in v) if isinstance(v, list) else v
+
+
+def _encode_labels(labels):
+    """ Encodes node labels (or edge keys) as an array: integers and strings are stored as such, other labels
+    (e.g. tuples) as json. """
+
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in labels):
+        return np.array(labels, dtype=np.int64), 'int'
+    if all(isinstance(v, str) for v in labels) and len(labels):
+        return np.array(labels, dtype=str), 'str'
+    return np.array([json.dumps(v, cls=NumpyArrayEncoder) for v in labels], dtype=str), 'json'
+
+
+def _decode_labels(array, kind):
+    if kind == 'json':
+        return [_tuples(json.loads(v)) for v in array.tolist()]
+    return array.tolist()
+
+
+def _encode_column(values, cables):
+    """
+    Encodes the values of an attribute (_MISSING if not defined) as a column.
+
+    :param list values: values of the attribute, one per row
+    :param dict cables: Cable objects already stored (name: position), updated with the new cables
+    :return: column, mask (None if the attribute is defined for every row), and encoding
+    """
+
+    mask = np.array([v is not _MISSING for v in values], dtype=bool)
+    present = [v for v in values if v is not _MISSING]
+    fill = lambda default: [default if v is _MISSING else v for v in values]
+
+    if all(isinstance(v, Cable) for v in present):
+        column = np.full(len(values), -1, dtype=np.int32)
+        for k, v in enumerate(values):
+            if v is _MISSING:
+                continue
+            if v.name not in cables:
+                cables[v.name] = (len(cables), v)
+            elif cables[v.name][1] is not v and not _same_cable(cables[v.name][1], v):
+                raise ValueError(f'Two different cables are named {v.name}.')
+            column[k] = cables[v.name][0]
+        encoding = dict(kind='cable')
+    elif all(_is_number(v) for v in present):
+        dtype = np.asarray(present).dtype if present else np.dtype(float)
+        column = np.array(fill(False if dtype.kind == 'b' else 0), dtype=dtype)
+        encoding = dict(kind='scalar')
+    elif all(isinstance(v, str) for v in present):
+        column = np.array(fill(''), dtype=str)
+        encoding = dict(kind='str')
+    else:
+        arrays = [np.asarray(v) if isinstance(v, (list, tuple, np.ndarray)) else None for v in present]
+        if all(a is not None and a.dtype.kind in 'biuf' and a.shape == arrays[0].shape for a in arrays):
+            # numerical arrays of the same shape are stacked
+            dtype = np.result_type(*arrays)
+            column = np.zeros((len(values),) + arrays[0].shape, dtype=dtype)
+            column[mask] = arrays
+            containers = {type(v) for v in present}
+            encoding = dict(kind='array', container='list' if containers == {list} else
+                            'tuple' if containers == {tuple} else 'ndarray')
+        else:
+            column = np.array(fill('null'), dtype=str)
+            column[mask] = [json.dumps(v, cls=NumpyArrayEncoder) for v in present]
+            encoding = dict(kind='json')
+
+    return column, (None if mask.all() else mask), encoding
+
+
+def _same_cable(c1, c2):
+    return all(np.array_equal(getattr(c1, f.name), getattr(c2, f.name)) for f in fields(Cable))
+
+
+def _decode_columns(data, masks, encodings, cables, n):
+    """ Returns the dictionaries of attributes of the rows of columns. """
+
+    rows = [dict() for _ in range(n)]
+    for name, encoding in encodings.items():
+        column, kind = data[name], encoding['kind']
+        if kind == 'cable':
+            values = [cables[k] if k >= 0 else None for k in column.tolist()]
+        elif kind in ['scalar', 'str']:
+            values = column.tolist()
+        elif kind == 'json':
+            values = [json.loads(v) for v in column.tolist()]
+        elif encoding['container'] == 'list':
+            values = column.tolist()
+        elif encoding['container'] == 'tuple':
+            values = [_tuples(v) for v in column.tolist()]
+        else:
+            values = list(column)
+
+        mask = masks.get(name)
+        for k, (d, v) in enumerate(zip(rows, values)):
+            if mask is None or mask[k]:
+                d[name] = v
+    return rows
+
+
+def _columns(rows, cables):
+    """ Encodes a list of attribute dictionaries as columns. """
+
+    names = list(dict.fromkeys(name for d in rows for name in d))
+    data, masks, encodings = dict(), dict(), dict()
+    for name in names:
+        data[name], mask, encodings[name] = _encode_column([d.get(name, _MISSING) for d in rows], cables)
+        if mask is not None:
+            masks[name] = mask
+    return data, masks, encodings
+
+
+def graph_tables(g):
+    """
+    Returns the columnar tables of a graph (see :class:`GraphTables`).
+
+    :param g: networkx graph
+    :return: GraphTables
+    """
+
+    nodes = list(g.nodes())
+    index = {n: k for k, n in enumerate(nodes)}
+    if g.is_multigraph():
+        edges = list(g.edges(keys=True, data=True))
+        keys, keys_kind = _encode_labels([k for _, _, k, _ in edges])
+    else:
+        edges = list(g.edges(data=True))
+        keys, keys_kind = None, None
+
+    cables = dict()
+    node_data, node_mask, node_encodings = _columns([d for _, d in g.nodes(data=True)], cables)
+    edge_data, edge_mask, edge_encodings = _columns([e[-1] for e in edges], cables)
+    labels, labels_kind = _encode_labels(nodes)
+
+    return GraphTables(directed=g.is_directed(), multigraph=g.is_multigraph(), graph=dict(g.graph),
+                       nodes=labels,
+                       source=np.array([index[e[0]] for e in edges], dtype=np.int64),
+                       target=np.array([index[e[1]] for e in edges], dtype=np.int64),
+                       keys=keys, node_data=node_data, edge_data=edge_data, node_mask=node_mask,
+                       edge_mask=edge_mask, cables=[c for _, c in sorted(cables.values(), key=lambda v: v[0])],
+                       columns=dict(labels=labels_kind, keys=keys_kind, nodes=node_encodings, edges=edge_encodings))
+
+
+def save_binary_graph(g, path):
+    """
+    Save a networkx graph in a compact binary format, with the same content as the json format (see
+    :func:`save_json_graph`), for large networks.
+
+    The graph is stored in a directory containing :
+
+        - `nodes.npy`, `source.npy` and `target.npy` : labels of the nodes, and positions of the nodes of the edges,
+        - `node_<k>.npy` and `edge_<k>.npy` : one file per attribute of the nodes and of the edges, numerical arrays
+          of the same shape being stacked (e.g. `pmatrix` as a (E, 3, 3) array), and `<...>_mask.npy` for the
+          attributes that are not defined for every node or edge,
+        - `cables_r.npy` and `cables_x.npy` : (C, 3, 3) impedances of the cables, stored once per cable name,
+        - `meta.json` : attributes of the graph, names and encoding of the columns and other fields of the cables.
+
+    Attributes that can not be stored as numerical or string arrays are stored as json strings.
+
+    An existing `path` is only replaced if it is a graph saved by this function (directory with a versioned
+    `meta.json`), a FileExistsError is raised otherwise.
+
+    @param g: networkx graph
+    @param path: directory to save the graph to
+    @return:
+    """
+
+    if os.path.lexists(path) and not _is_binary_graph(path):
+        raise FileExistsError(f'{path} exists and is not a binary graph, it is not replaced.')
+
+    tables = graph_tables(g)
+
+    # the graph is written in a temporary directory, and then moved
+    tmp = str(path) + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    np.save(os.path.join(tmp, 'nodes.npy'), tables.nodes)
+    np.save(os.path.join(tmp, 'source.npy'), tables.source)
+    np.save(os.path.join(tmp, 'target.npy'), tables.target)
+    if tables.keys is not None:
+        np.save(os.path.join(tmp, 'keys.npy'), tables.keys)
+
+    columns = dict(labels=tables.columns['labels'], keys=tables.columns['keys'])
+    for table, data, masks in [('node', tables.node_data, tables.node_mask),
+                               ('edge', tables.edge_data, tables.edge_mask)]:
+        encodings = tables.columns[f'{table}s']
+        columns[f'{table}s'] = []
+        for k, name in enumerate(data):
+            np.save(os.path.join(tmp, f'{table}_{k}.npy'), data[name])
+            if name in masks:
+                np.save(os.path.join(tmp, f'{table}_{k}_mask.npy'), masks[name])
+            columns[f'{table}s'].append(dict(encodings[name], name=name, masked=name in masks))
+
+    np.save(os.path.join(tmp, 'cables_r.npy'), np.array([c.r for c in tables.cables], dtype=float))
+    np.save(os.path.join(tmp, 'cables_x.npy'), np.array([c.x for c in tables.cables], dtype=float))
+    cables = [{f.name: getattr(c, f.name) for f in fields(Cable) if f.name not in ['r', 'x']} for c in tables.cables]
+
+    meta = dict(version=BINARY_GRAPH_VERSION, directed=tables.directed, multigraph=tables.multigraph,
+                graph=tables.graph, columns=columns, cables=cables)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f, cls=NumpyArrayEncoder)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def _is_binary_graph(path):
+    """ True if `path` is a directory written by :func:`save_binary_graph`. """
+
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return os.path.isdir(path) and isinstance(meta, dict) and 'version' in meta
+
+
+def read_graph_tables(path, mmap=True):
+    """
+    Read the columnar tables of a graph saved by :func:`save_binary_graph`, without building the networkx graph.
+
+    @param path: directory of the graph
+    @param mmap: memory-map the arrays (read only)
+    @return: GraphTables
+    """
+
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != BINARY_GRAPH_VERSION:
+        raise ValueError(f'Unknown version of binary graph {path}: {meta.get("version")}.')
+
+    def _load(name):
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+
+    columns = meta['columns']
+    r, x = _load('cables_r'), _load('cables_x')
+    cables = [Cable(r=r[k], x=x[k], **c) for k, c in enumerate(meta['cables'])]
+
+    tables = dict()
+    for table in ['node', 'edge']:
+        data, masks, encodings = dict(), dict(), dict()
+        for k, c in enumerate(columns[f'{table}s']):
+            c = dict(c)
+            name, masked = c.pop('name'), c.pop('masked')
+            data[name] = _load(f'{table}_{k}')
+            if masked:
+                masks[name] = _load(f'{table}_{k}_mask')
+            encodings[name] = c
+        tables[table] = data, masks, encodings
+
+    return GraphTables(directed=meta['directed'], multigraph=meta['multigraph'], graph=meta['graph'],
+                       nodes=_load('nodes'), source=_load('source'), target=_load('target'),
+                       keys=_load('keys') if meta['multigraph'] else None,
+                       node_data=tables['node'][0], edge_data=tables['edge'][0],
+                       node_mask=tables['node'][1], edge_mask=tables['edge'][1], cables=cables,
+                       columns=dict(labels=columns['labels'], keys=columns['keys'],
+                                    nodes=tables['node'][2], edges=tables['edge'][2]))
+
+
+def read_binary_graph(path, mmap=True):
+    """
+    Read a networkx graph saved by :func:`save_binary_graph`.
+
+    When `mmap` is True, the arrays of the attributes (e.g. `pmatrix`) are read-only views of the memory-mapped files,
+    and are only read from the disk when used.
+
+    @param path: directory of the graph
+    @param mmap: memory-map the arrays
+    @return: networkx graph
+    """
+
+    return read_graph_tables(path, mmap=mmap).to_graph()
+
+
+def calc_edge_pq_tensors(r, x, length):
+    """
+    Calculate P and Q matrices of a set of branches at once.
+
+    :param r: (E, 3, 3) real parts of the impedance matrices (Ohm/km)
+    :param x: (E, 3, 3) imaginary parts of the impedance matrices (Ohm/km)
+    :param length: (E,) lengths of the branches (km)
+    :return: pmatrix, qmatrix, as (E, 3, 3) arrays
+    """
+
+    r = np.asarray(r, dtype=float)
+    x = np.asarray(x, dtype=float)
+    l = np.asarray(length, dtype=float)
+    s3 = sqrt(3)
+
+    pmatrix = np.zeros(r.shape)
+    qmatrix = np.zeros(r.shape)
+
+    # same operations as the element by element computation, so that results are identical
+    for k in range(3):
+        pmatrix[:, k, k] = - 2 * r[:, k, k] * l
+        qmatrix[:, k, k] = - 2 * x[:, k, k] * l
+
+    for i, j in [(1, 0), (2, 1), (0, 2)]:
+        pmatrix[:, i, j] = r[:, i, j] * l + s3 * x[:, i, j] * l
+        qmatrix[:, i, j] = x[:, i, j] * l - s3 * r[:, i, j] * l
+    for i, j in [(0, 1), (1, 2)]:
+        pmatrix[:, i, j] = r[:, i, j] * l - s3 * x[:, i, j] * l
+        qmatrix[:, i, j] = x[:, i, j] * l + s3 * r[:, i, j] * l
+
+    return pmatrix, qmatrix
+
+
+def calc_edge_pq_arrays(g, write=True):
+    """
+    Calculate P and Q matrices of all the branches of the graph, as stacked arrays.
+
+    The impedances and lengths of the branches are stacked in (E, 3, 3) and (E,) arrays. Matrices are only computed
+    once for each couple of cable and length, so that identical segments of large feeders are computed once.
+
+    @param g: DiGraph that describe the distribution network (see :func:`calc_edge_pq_matrix`).
+    @param write: store the matrices in the data of the edges (`pmatrix` and `qmatrix`)
+    @return: list of edges, pmatrix and qmatrix as (E, 3, 3) arrays (in the order of the edges)
+    """
+
+    edges, data = [], []
+    for n1, n2, d in g.edges(data=True):
+        edges.append((n1, n2))
+        data.append(d)
+    if len(edges) == 0:
+        return edges, np.zeros((0, 3, 3)), np.zeros((0, 3, 3))
+
+    # segments are identified by their cable and length
+    cables = dict()
+    cable_index = [cables.setdefault(id(d['cable']), (len(cables), d['cable']))[0] for d in data]
+    keys = np.column_stack([cable_index, [d['length'] for d in data]]).astype(float)
+    segments, inverse = np.unique(keys, axis=0, return_inverse=True)
+
+    cable_list = [c for _, c in sorted(cables.values(), key=lambda v: v[0])]
+    r = np.stack([cable_list[int(c)].r for c in segments[:, 0]])
+    x = np.stack([cable_list[int(c)].x for c in segments[:, 0]])
+    pm, qm = calc_edge_pq_tensors(r, x, segments[:, 1])
+    pmatrix, qmatrix = pm[inverse.reshape(-1)], qm[inverse.reshape(-1)]
+
+    if write:
+        for d, pk, qk in zip(data, pmatrix, qmatrix):
+            d['pmatrix'] = pk
+            d['qmatrix'] = qk
+
+    return edges, pmatrix, qmatrix
+
+
 def calc_edge_pq_matrix(g):
     """
     Calculate P and Q matrix for each branch of the graph graphe.
@@ -59,44 +474,175 @@ def calc_edge_pq_matrix(g):
     graphe needs to store some data, such as l, rmatrix and xmatrix, respectively, the lenth in km,
     and the real and imaginary parts of the impedance (Ohm/km).
 
+    Matrices of all branches are computed at once (see :func:`calc_edge_pq_arrays`).
+
     @param graphe: DiGraphe that describe the distribution network.
     @return:
     """
-    #g = graphe.copy()
-
-    for n1, n2, data in g.edges(data=True):
-        l = data['length']
-        r = data['cable'].r
-        x = data['cable'].x
-
-        pmatrix = np.zeros(r.shape)
-        qmatrix = np.zeros(r.shape)
-
-        pmatrix[0, 0] = - 2 * r[0, 0] * l
-        pmatrix[2, 2] = - 2 * r[2, 2] * l
-        pmatrix[1, 1] = - 2 * r[1, 1] * l
-        pmatrix[1, 0] = r[1, 0] * l + sqrt(3) * x[1, 0] * l
-        pmatrix[2, 1] = r[2, 1] * l - sqrt(3) * x[2, 1] * l
-        pmatrix[0, 1] = r[0, 1] * l - sqrt(3) * x[0, 1] * l
-        pmatrix[2, 1] = r[2, 1] * l + sqrt(3) * x[2, 1] * l
-        pmatrix[0, 2] = r[0, 2] * l + sqrt(3) * x[0, 2] * l
-        pmatrix[1, 2] = r[1, 2] * l - sqrt(3) * x[1, 2] * l
-
-        qmatrix[0, 0] = - 2 * x[0, 0] * l
-        qmatrix[2, 2] = - 2 * x[2, 2] * l
-        qmatrix[1, 1] = - 2 * x[1, 1] * l
-        qmatrix[1, 0] = x[1, 0] * l - sqrt(3) * r[1, 0] * l
-        qmatrix[2, 1] = x[2, 1] * l + sqrt(3) * r[2, 1] * l
-        qmatrix[0, 1] = x[0, 1] * l + sqrt(3) * r[0, 1] * l
-        qmatrix[2, 1] = x[2, 1] * l - sqrt(3) * r[2, 1] * l
-        qmatrix[0, 2] = x[0, 2] * l - sqrt(3) * r[0, 2] * l
-        qmatrix[1, 2] = x[1, 2] * l + sqrt(3) * r[1, 2] * l
-
-        g[n1][n2]['qmatrix'] = qmatrix
-        g[n1][n2]['pmatrix'] = pmatrix
+
+    calc_edge_pq_arrays(g, write=True)
     return g
 
 
+@dataclass(repr=False)
+class NetworkReduction:
+    """
+    Mapping between a radial network and its reduced graph (see :func:`reduce_graph`), used to compute the voltages of
+    all the nodes of the network from the solution of the reduced model.
+
+    The square voltage magnitude of each removed node is the one of a reference node, plus the voltage variation
+    caused by the flow of an edge: y = y_ref + pmatrix p + qmatrix q (LinDistFlow equation).
+    """
+    nodes: list                 # nodes of the original graph
+    removed: list               # (node, reference node, edge, pmatrix, qmatrix), in the order of removal
+    aliases: dict               # merged edges, and the edge of the reduced graph carrying the same flow
+    constant_flows: dict        # folded edges, and their constant flows (p, q) by phase
+
+    def flow(self, edge, p, q):
+        """ Returns the flows of an edge of the original graph, from the flows of the reduced model. """
+
+        while edge in self.aliases:
+            edge = self.aliases[edge]
+        if edge in self.constant_flows:
+            pc, qc = self.constant_flows[edge]
+            return np.asarray(pc)[:, None], np.asarray(qc)[:, None]
+        return p[edge], q[edge]
+
+    def expand_voltages(self, y, p, q):
+        """
+        Computes the square voltage magnitudes of all the nodes.
+
+        :param dict y: (3, T) square voltage magnitudes of the nodes of the reduced model
+        :param dict p: (3, T) active flows of the edges of the reduced model
+        :param dict q: (3, T) reactive flows of the edges of the reduced model
+        :return: (N, 3, T) square voltage magnitudes, in the order of `nodes`
+        """
+
+        y = dict(y)
+        for node, ref, edge, pmatrix, qmatrix in reversed(self.removed):
+            pe, qe = self.flow(edge, p, q)
+            y[node] = y[ref] + pmatrix @ pe + qmatrix @ qe
+        nt = max(np.shape(v)[-1] for v in y.values())
+        return np.stack([np.broadcast_to(y[n], (3, nt)) for n in self.nodes])
+
+    def expand_block(self, dist):
+        """
+        Computes the square voltage magnitudes of all the nodes from a solved LinDistFlow block of the reduced graph
+        (see :meth:`expand_voltages`).
+
+        :param dist: solved block (see :func:`lms2.electric.network.network_3phases_lindistflow`)
+        :return: (N, 3, T) square voltage magnitudes, in the order of `nodes`
+        """
+        from lms2.electric.network import _var_array
+
+        nodes, edges = list(dist.nodes), list(dist.edges)
+        nt = len(dist.y) // (3 * len(nodes))
+        y = _var_array(dist.y, len(nodes), 3, nt)
+        p = _var_array(dist.p, len(edges), 3, nt)
+        q = _var_array(dist.q, len(edges), 3, nt)
+        return self.expand_voltages(dict(zip(nodes, y)), dict(zip(edges, p)), dict(zip(edges, q)))
+
+
+def _injection(data, key):
+    value = data.get(key)
+    return np.zeros(3) if value is None else np.asarray(value, dtype=float)
+
+
+def _is_fixed(data):
+    """ True if the powers of a node are fixed on all the phases (as by default in the model). """
+    return all(all(data.get(key, [True] * 3)) for key in ['fix_p_out', 'fix_q_out'])
+
+
+def reduce_graph(g, keep=()):
+    """
+    Reduces a radial network before building the LinDistFlow model, so that fewer variables and constraints are
+    created:
+
+        - leaves with fixed powers are folded into their parent: their powers are added to the ones of the parent (if
+          the powers of the parent are also fixed, and the parent is not in `keep`), so that whole sub-trees of fixed
+          loads are folded,
+        - series segments are merged: a node without power (fixed to 0), with one parent and one child, is removed, and
+          its two edges are replaced by one edge, whose `pmatrix`, `qmatrix` and `length` are the sums of the ones
+          of the two edges, and whose cable is the one with the smaller nominal power.
+
+    The LinDistFlow equations of the kept nodes are unchanged. The voltages of the removed nodes are computed from the
+    solution of the reduced model with :meth:`NetworkReduction.expand_block`. The voltage (and unbalance) limits of
+    the removed nodes are not enforced, and the powers of the folded nodes are the `p_out` and `q_out` of the graph
+    (time series loaded later in the model can not be folded: such nodes must be kept).
+
+    Edges need the `pmatrix` and `qmatrix` attributes (see :func:`calc_edge_pq_matrix`).
+
+    @param g: radial network (DiGraph)
+    @param keep: nodes that must not be removed, nor receive the powers of folded leaves (so that their powers
+        can be unfixed or loaded later)
+    @return: reduced graph (a copy), and NetworkReduction
+    """
+
+    from dataclasses import replace
+
+    r = g.copy()
+    for n, data in r.nodes(data=True):
+        r.nodes[n].update({k: list(v) for k, v in data.items() if k in ['p_out', 'q_out'] and v is not None})
+    # the root and its children are kept, so that the first edge (transformer) is unchanged
+    roots = [n for n in r.nodes if r.in_degree(n) == 0]
+    user_keep = set(keep)
+    keep = user_keep | set(roots) | {n for root in roots for n in r.successors(root)}
+
+    removed, aliases, constant_flows = [], dict(), dict()
+    queue = list(r.nodes)
+    while queue:
+        n = queue.pop()
+        if n in keep or n not in r:
+            continue
+        data = r.nodes[n]
+        if not _is_fixed(data):
+            continue
+
+        parent = next(iter(r.predecessors(n)))
+        children = list(r.successors(n))
+        p_out, q_out = _injection(data, 'p_out'), _injection(data, 'q_out')
+        edge = (parent, n)
+        e_data = r.edges[edge]
+
+        if len(children) == 0 and _is_fixed(r.nodes[parent]) and parent not in user_keep:
+            # fixed leaf, folded into its parent
+            pdata = r.nodes[parent]
+            pdata['p_out'] = (_injection(pdata, 'p_out') + p_out).tolist()
+            pdata['q_out'] = (_injection(pdata, 'q_out') + q_out).tolist()
+            removed.append((n, parent, edge, np.asarray(e_data['pmatrix']), np.asarray(e_data['qmatrix'])))
+            constant_flows[edge] = (p_out, q_out)
+            r.remove_node(n)
+            queue.append(parent)
+
+        elif len(children) == 1 and not p_out.any() and not q_out.any():
+            # series segment without power, merged
+            child = children[0]
+            c_data = r.edges[n, child]
+            c1, c2 = e_data['cable'], c_data['cable']
+            cable = c1 if c1.s_nom <= c2.s_nom else c2
+            if c1 is not c2 and c1.v_nom != c2.v_nom:
+                cable = replace(cable, v_nom=min(c1.v_nom, c2.v_nom))
+            merged = dict(length=e_data.get('length', 0) + c_data.get('length', 0), cable=cable,
+                          pmatrix=np.asarray(e_data['pmatrix']) + np.asarray(c_data['pmatrix']),
+                          qmatrix=np.asarray(e_data['qmatrix']) + np.asarray(c_data['qmatrix']))
+            removed.append((n, parent, (parent, child), np.asarray(e_data['pmatrix']), np.asarray(e_data['qmatrix'])))
+            aliases[edge] = (parent, child)
+            aliases[(n, child)] = (parent, child)
+            r.remove_node(n)
+            r.add_edge(parent, child, **merged)
+            queue += [parent, child]
+
+    # the order of the nodes and edges of the reduced graph follows the original graph
+    reduced = nx.DiGraph()
+    reduced.graph.update(r.graph)
+    reduced.add_nodes_from((n, r.nodes[n]) for n in g.nodes if n in r)
+    order = {n: k for k, n in enumerate(g.nodes)}
+    reduced.add_edges_from(sorted(r.edges(data=True), key=lambda e: (order[e[0]], order[e[1]])))
+
+    return reduced, NetworkReduction(nodes=list(g.nodes), removed=removed, aliases=aliases,
+                                     constant_flows=constant_flows)
+
+
 def radial_network(net, **kwargs):
     """
     Creates a radial distribution network
@@ -150,6 +696,110 @@ def radial_graph(Nd):
     return graph
 
 
+def random_feeder(n_nodes, branching=(1, 3), max_depth=None, cables=None, length=(0.02, 0.1), pv_share=0.3,
+                  battery_share=0.1, p_load=(3., 12.), p_pv=(3., 9.), p_battery=(3., 6.), pq=True, seed=None):
+    """
+    Creates a randomized radial feeder, for benchmarks and sizing of large networks.
+
+    The tree is grown level by level from the root (node 0, the secondary of the transformer): each node of a level has
+    a random number of children in `branching`, until `n_nodes` nodes are created. Nodes are labelled by integers,
+    in breadth first order, so that each node is larger than its parent.
+
+    Edges are assigned a cable of `cables` according to their depth (`cables[0]` for the edges leaving the root,
+    the last cable for the deepest edges), and a random length (rounded to the meter, so that identical segments are
+    computed once by :func:`calc_edge_pq_arrays`).
+
+    Leaves are dwellings, connected to one random phase, and the other nodes are junctions. Dwellings have a load, and
+    possibly a PV system and a battery. Their active power `p_out` is free on their phase, with bounds
+    (`p_out_min`, `p_out_max`) given by the load, the PV system and the battery. As in the power balance of
+    :func:`lms2.electric.network.network_3phases_lindistflow`, `p_out` is the power leaving the network at the node
+    (positive for a load). Other powers are fixed to 0.
+    Nodes also store their `kind` ('source', 'junction' or 'dwelling'), `depth`, `phase` and the power of their
+    `load`, `pv` and `battery` (kW).
+
+    The graph is directly usable by :func:`lms2.electric.network.network_3phases_lindistflow`.
+
+    :param int n_nodes: number of nodes
+    :param branching: minimum and maximum number of children of a node (the minimum should be at least 1)
+    :param int max_depth: maximum depth of the tree (no limit by default)
+    :param list cables: cables of the edges, from the root to the deepest edges (default: cable_3_150_95, cable_4_70)
+    :param length: minimum and maximum length of the edges (km)
+    :param float pv_share: share of the dwellings with a PV system
+    :param float battery_share: share of the dwellings with a battery
+    :param p_load: minimum and maximum peak load of the dwellings (kW)
+    :param p_pv: minimum and maximum peak power of the PV systems (kW)
+    :param p_battery: minimum and maximum power of the batteries (kW)
+    :param bool pq: compute the P and Q matrices of the edges (see :func:`calc_edge_pq_matrix`)
+    :param seed: seed of the random generator
+    :return: DiGraph
+    """
+
+    from lms2.electric.network import cable_3_150_95, cable_4_70
+
+    if cables is None:
+        cables = [cable_3_150_95, cable_4_70]
+    rng = np.random.default_rng(seed)
+    b_min, b_max = branching
+
+    # parents and depths of the nodes, grown level by level
+    parent = [np.array([-1])]
+    depth = [np.array([0])]
+    frontier = np.array([0])
+    size, level = 1, 0
+    while size < n_nodes:
+        level += 1
+        if len(frontier) == 0 or (max_depth is not None and level > max_depth):
+            raise ValueError(f'Could not create {n_nodes} nodes with branching {branching} and depth {max_depth}.')
+        counts = rng.integers(b_min, b_max + 1, size=len(frontier))
+        children = np.repeat(frontier, counts)[:n_nodes - size]
+        parent.append(children)
+        depth.append(np.full(len(children), level))
+        frontier = np.arange(size, size + len(children))
+        size += len(children)
+
+    parent = np.concatenate(parent)
+    depth = np.concatenate(depth)
+    n_children = np.bincount(parent[1:], minlength=n_nodes)
+
+    # dwellings and their equipments
+    dwelling = (n_children == 0)
+    dwelling[0] = False
+    phase = np.where(dwelling, rng.integers(0, 3, size=n_nodes), -1)
+    load = np.where(dwelling, np.round(rng.uniform(*p_load, size=n_nodes), 1), 0.)
+    pv = np.where(dwelling & (rng.random(n_nodes) < pv_share), np.round(rng.uniform(*p_pv, size=n_nodes), 1), 0.)
+    battery = np.where(dwelling & (rng.random(n_nodes) < battery_share),
+                       np.round(rng.uniform(*p_battery, size=n_nodes), 1), 0.)
+    p_min = - pv - battery
+    p_max = load + battery
+
+    kinds = np.where(dwelling, 'dwelling', 'junction')
+    kinds[0] = 'source'
+
+    g = nx.DiGraph()
+    zeros, fixed = [0.] * 3, [True] * 3
+    nodes = []
+    for n, (kind, d, ph, l, s, b, lb, ub) in enumerate(zip(kinds.tolist(), depth.tolist(), phase.tolist(),
+                                                           load.tolist(), pv.tolist(), battery.tolist(),
+                                                           p_min.tolist(), p_max.tolist())):
+        data = dict(kind=kind, depth=d, phase=ph, load=l, pv=s, battery=b, p_out=list(zeros), q_out=list(zeros),
+                    fix_p_out=list(fixed), fix_q_out=list(fixed))
+        if kind == 'dwelling':
+            data['fix_p_out'][ph] = False
+            data['p_out_min'], data['p_out_max'] = list(zeros), list(zeros)
+            data['p_out_min'][ph], data['p_out_max'][ph] = lb, ub
+        nodes.append((n, data))
+    g.add_nodes_from(nodes)
+
+    lengths = np.round(rng.uniform(*length, size=n_nodes), 3).tolist()
+    cable_index = np.minimum(depth - 1, len(cables) - 1).tolist()
+    g.add_edges_from((p, n, dict(length=lengths[n], cable=cables[cable_index[n]]))
+                     for n, p in enumerate(parent.tolist()) if n > 0)
+
+    if pq:
+        calc_edge_pq_matrix(g)
+    return g
+
+
 def full_island(dict_feeder):
     graph = nx.DiGraph()
     for fee in dict_feeder.keys():
@@ -1,8 +1,10 @@
+import functools
 import logging
 import numpy as np
 from pyomo.core import NonNegativeReals, Reals
 from pyomo.environ import *
 from pyomo.environ import units as u
+from pyomo.opt import check_optimal_termination
 from dataclasses import dataclass, field
 
 
@@ -45,6 +47,68 @@ cable_4_70 = Cable(name  = 'cable_4_70',
                    s_nom = 90/3)
 
 
+@dataclass(repr=False)
+class NetworkArrays:
+    """
+    Structure of a radial network, gathered once from its graph as compact arrays (see :func:`network_arrays`).
+
+    Nodes and edges are stored in the order of the graph. Labels are mapped to positions in the arrays by
+    `node_index` and `edge_index`.
+    """
+    nodes: list                 # labels of the nodes
+    edges: list                 # labels of the edges (couples of nodes)
+    node_index: dict            # position of each node
+    edge_index: dict            # position of each edge
+    edge_nodes: np.ndarray      # (E, 2) positions of the sending and receiving nodes of each edge
+    parent: dict                # parent node of each node (None for the root)
+    children: dict              # list of the children of each node
+    pmatrix: np.ndarray         # (E, 3, 3) active power coefficients of the LinDistFlow equation
+    qmatrix: np.ndarray         # (E, 3, 3) reactive power coefficients of the LinDistFlow equation
+    s_nom: np.ndarray           # (E,) nominal power of the cable of each edge
+    v_nom: np.ndarray           # (N,) smaller nominal voltage of the edges connected to each node (nan if none)
+
+
+def network_arrays(graph):
+    """
+    Gathers the structure and the data of a radial network once, as compact arrays.
+
+    Edges need the `cable` attribute, and the `pmatrix` and `qmatrix` attributes computed by
+    :func:`lms2.electric.graph_utils.calc_edge_pq_matrix` (matrices of the edges without these attributes are nan).
+
+    :param graph: radial network (networkx.DiGraph)
+    :return: NetworkArrays
+    """
+
+    nodes = list(graph.nodes())
+    edges = list(graph.edges())
+    node_index = {n: k for k, n in enumerate(nodes)}
+    edge_index = {e: k for k, e in enumerate(edges)}
+
+    n_edges = len(edges)
+    pmatrix = np.full((n_edges, 3, 3), np.nan)
+    qmatrix = np.full((n_edges, 3, 3), np.nan)
+    s_nom = np.zeros(n_edges)
+    v_edges = np.zeros(n_edges)
+    for k, (n1, n2, data) in enumerate(graph.edges(data=True)):
+        if 'pmatrix' in data and 'qmatrix' in data:
+            pmatrix[k], qmatrix[k] = data['pmatrix'], data['qmatrix']
+        s_nom[k] = data['cable'].s_nom
+        v_edges[k] = data['cable'].v_nom
+
+    edge_nodes = np.array([(node_index[n1], node_index[n2]) for n1, n2 in edges], dtype=int).reshape(n_edges, 2)
+    v_nom = np.full(len(nodes), np.inf)
+    np.minimum.at(v_nom, edge_nodes[:, 0], v_edges)
+    np.minimum.at(v_nom, edge_nodes[:, 1], v_edges)
+    v_nom[np.isinf(v_nom)] = np.nan
+
+    parent = {n: next(iter(graph.predecessors(n)), None) for n in nodes}
+    children = {n: list(graph.successors(n)) for n in nodes}
+
+    return NetworkArrays(nodes=nodes, edges=edges, node_index=node_index, edge_index=edge_index,
+                         edge_nodes=edge_nodes, parent=parent, children=children, pmatrix=pmatrix, qmatrix=qmatrix,
+                         s_nom=s_nom, v_nom=v_nom)
+
+
 def network_3phases_lindistflow(dist, **kwargs):
     """
     Linear load flow equation for tree phased unbalanced distribution network.
@@ -64,6 +128,17 @@ def network_3phases_lindistflow(dist, **kwargs):
     the power balance also needs to take into account this source/load --> this constraint needs to be added outside this
     function.
 
+    With `lazy=True`, the voltage unbalance constraints (`unbalance_1`, `unbalance_2`) and the apparent power limits of
+    the lines (`pq_line1`, `pq_line2`) are created empty, and only their violated indexes are added after each solve
+    (see :func:`solve_lazy`). Only a small fraction of them bind, which reduces the size of large models.
+
+    The circular constraints |S| <= Snom of the lines and of the transformer are approximated by an octagon (the bounds
+    of the variables, and `pq_line1`, `pq_line2`, `pq_transfo1` and `pq_transfo2`). With `pq_sides=n` (a multiple of
+    4), they are approximated by a regular polygon of n sides (`pq_line` and `pq_transfo`, indexed by the `sides`).
+    With `pq_cuts=True`, this polygon is refined by cuts tangent to the circle, added by :func:`solve_lazy` at the
+    operating points that are outside the circle by more than `pq_cut_tol` (relative to Snom). A coarse polygon
+    (e.g. `pq_sides=4`, the bounds only) and cuts keep the model small for a precise approximation.
+
     .. table::
         :width: 100%
         =============== ===================================================================
@@ -102,6 +177,10 @@ def network_3phases_lindistflow(dist, **kwargs):
         pq_transfo2     Linear approximation of the circular constraint on Snom
         pq_line1        Linear approximation of the circular constraint on Snom
         pq_line2        Linear approximation of the circular constraint on Snom
+        pq_transfo      Polygonal approximation of the circular constraint on Snom (pq_sides)
+        pq_line         Polygonal approximation of the circular constraint on Snom (pq_sides)
+        pq_transfo_cuts Cuts tangent to the circular constraint on Snom (pq_cuts)
+        pq_line_cuts    Cuts tangent to the circular constraint on Snom (pq_cuts)
         =============== ===================================================================
 
 
@@ -115,78 +194,73 @@ def network_3phases_lindistflow(dist, **kwargs):
         raise ValueError('Need to specify an input radial network')
 
     time = kwargs.get('time', RangeSet(0, 1))
-    dist.edges = Set(initialize=list(dist.graph.edges()), doc='lines of the electrical distribution network')
-    dist.nodes = Set(initialize=list(dist.graph.nodes()), doc='buses of the electrical distribution network')
+    lazy = kwargs.pop('lazy', False)
+    pq_sides = kwargs.pop('pq_sides', None)
+    pq_cuts = kwargs.pop('pq_cuts', False)
+    pq_cut_tol = kwargs.pop('pq_cut_tol', 1e-3)
+    net = network_arrays(dist.graph)
+    s_nom = net.s_nom.tolist()
+    pmatrix = [None if np.isnan(pm).any() else pm.tolist() for pm in net.pmatrix]
+    qmatrix = [None if np.isnan(qm).any() else qm.tolist() for qm in net.qmatrix]
+
+    dist.edges = Set(initialize=net.edges, doc='lines of the electrical distribution network')
+    dist.nodes = Set(initialize=net.nodes, doc='buses of the electrical distribution network')
     dist.phases = Set(initialize=[0, 1, 2], doc='phase index (instead of "a, b, c"')  # phases indexes
 
     # Here are some function to initialize variable and their bounds. We use data from the graph,
-    # nominal voltage or maximal power for instance.
-    def initialize_pout(b, node, phase, time):
+    # nominal voltage or maximal power for instance, gathered once in `net`.
+    def _node_data(key, node):
         try:
-            p_out_init = b.graph.nodes[node]['p_out'][phase]
-        except KeyError as err:
-            p_out_init = 0
-            logger.info(f'')
-        return p_out_init
+            return dist.graph.nodes[node][key]
+        except KeyError:
+            return None
+
+    p_out_init = {n: _node_data('p_out', n) for n in net.nodes}
+    q_out_init = {n: _node_data('q_out', n) for n in net.nodes}
+    p_out_bounds = {n: (_node_data('p_out_min', n), _node_data('p_out_max', n)) for n in net.nodes}
+    q_out_bounds = {n: (_node_data('q_out_min', n), _node_data('q_out_max', n)) for n in net.nodes}
+
+    def initialize_pout(b, node, phase, time):
+        return 0 if p_out_init[node] is None else p_out_init[node][phase]
 
     def initialize_y_bounds(b, node, phase, time):
-        """ Here we search for all edges connected to that node, and we consider the smaller nominal voltage
-        to compute the bounds +/- 10 %. todo : add +/- 10% as a parameter somehow. """
-        common_edges = list(b.graph.in_edges(node)) + list(b.graph.out_edges(node))
-        v_nom = min([b.graph.edges[n1, n2]['cable'].v_nom for n1, n2 in common_edges])
+        """ The smaller nominal voltage of the edges connected to the node is used to compute the bounds +/- 10 %.
+        todo : add +/- 10% as a parameter somehow. """
+        v_nom = float(net.v_nom[net.node_index[node]])
+        if np.isnan(v_nom):
+            raise ValueError(f'Node {node} is not connected to any edge.')
         return (v_nom*0.9)**2, (v_nom*1.1)**2
 
     def initialize_qout(b, node, phase, time):
-        try:
-            q_out_init = b.graph.nodes[node]['q_out'][phase]
-        except KeyError as err:
-            q_out_init = 0
-            logger.info(f'')
-        return q_out_init
+        return 0 if q_out_init[node] is None else q_out_init[node][phase]
 
     def intialize_pout_bounds(b, node, phase, time):
-        try:
-            ub = b.graph.nodes[node]['p_out_max'][phase]
-        except KeyError:
-            ub = None
-        try:
-            lb = b.graph.nodes[node]['p_out_min'][phase]
-        except KeyError:
-            lb = None
-        return lb, ub
+        lb, ub = p_out_bounds[node]
+        return None if lb is None else lb[phase], None if ub is None else ub[phase]
 
     def intialize_qout_bounds(b, node, phase, time):
-        try:
-            ub = b.graph.nodes[node]['q_out_max'][phase]
-        except KeyError:
-            ub = None
-        try:
-            lb = b.graph.nodes[node]['q_out_min'][phase]
-        except KeyError:
-            lb = None
-        return lb, ub
+        lb, ub = q_out_bounds[node]
+        return None if lb is None else lb[phase], None if ub is None else ub[phase]
 
-    def initialize_q_bounds(b, node1, node2, phase, time):
-        return -b.graph.edges[node1, node2]['cable'].s_nom, b.graph.edges[node1, node2]['cable'].s_nom
-
-    def initialize_p_bounds(b, node1, node2, phase, time):
-        return -b.graph.edges[node1, node2]['cable'].s_nom, b.graph.edges[node1, node2]['cable'].s_nom
+    def initialize_pq_bounds(b, node1, node2, phase, time):
+        s = s_nom[net.edge_index[node1, node2]]
+        return -s, s
 
     def initialize_y(b, node, phase, time):
-        """ Here we search for all edges connected to that node, and we consider the smaller nominal voltage"""
-        try:
-            common_edges = list(b.graph.in_edges(node)) + list(b.graph.out_edges(node))
-            return min([b.graph.edges[n1, n2]['cable'].v_nom for n1, n2 in common_edges])**2
-        except:
+        """ Here we consider the smaller nominal voltage of all edges connected to that node """
+        v_nom = float(net.v_nom[net.node_index[node]])
+        if np.isnan(v_nom):
             logger.error(f'Problem with the node {node}')
+            return None
+        return v_nom**2
 
     # We define variables
 
     dist.y = Var(dist.nodes, dist.phases, time, within=NonNegativeReals, bounds=initialize_y_bounds,
                  doc='voltage square magnitudes in V²', initialize=initialize_y, units=u.V * u.V)
-    dist.p = Var(dist.edges, dist.phases, time, within=Reals, bounds=initialize_p_bounds, initialize=0,
+    dist.p = Var(dist.edges, dist.phases, time, within=Reals, bounds=initialize_pq_bounds, initialize=0,
                  doc='active power between two nodes in kW',  units=u.kW)
-    dist.q  = Var(dist.edges, dist.phases, time, within=Reals, bounds=initialize_q_bounds, initialize=0,
+    dist.q  = Var(dist.edges, dist.phases, time, within=Reals, bounds=initialize_pq_bounds, initialize=0,
                  doc='reactive power between two nodes in kW',  units=u.kW)
     dist.q_out = Var(dist.nodes, dist.phases, time, initialize=initialize_qout, within=Reals,
                      bounds=intialize_qout_bounds, doc='reactive power injection, using source convention in kW', units=u.kW)
@@ -205,7 +279,8 @@ def network_3phases_lindistflow(dist, **kwargs):
             try:
                 for i, fix_boolean in enumerate(node_data['fix_p_out']):
                     if not fix_boolean:
-                        dist.p_out[node, i, :].unfix()
+                        for t in time:
+                            dist.p_out[node, i, t].unfix()
             except KeyError:
                 logger.warning(f'Could not initialize Variable {dist.p_out[node, :, :]}')
 
@@ -215,22 +290,43 @@ def network_3phases_lindistflow(dist, **kwargs):
             try:
                 for i, fix_boolean in enumerate(node_data['fix_q_out']):
                     if not fix_boolean:
-                        dist.q_out[node, i, :].unfix()
+                        for t in time:
+                            dist.q_out[node, i, t].unfix()
             except KeyError:
                 logger.warning(f'Could not initialize Variable {dist.q_out[node, :, :]}')
 
-    # Here we define the constraints
+    # Here we define the constraints (phases are iterated as a list, faster than the pyomo Set)
+    phases = list(dist.phases)
+
+    # in lazy mode, the rules of the lazy constraints are kept, and the constraints are created empty
+    rules = dict()
+
+    def _lazy(rule):
+        if not lazy:
+            return rule
+        rules[rule.__name__] = rule
+
+        @functools.wraps(rule)
+        def skip(*args):
+            return Constraint.Skip
+        return skip
 
     @dist.Constraint(dist.nodes, dist.phases, time, doc='Voltage unbalance 1')
+    @_lazy
     def unbalance_1(dist, j, phi, t):
-        y_avg = sum(dist.y[j, ph, t] for ph in dist.phases) / 3
+        y_avg = sum(dist.y[j, ph, t] for ph in phases) / 3
         return -0.1 * y_avg <= dist.y[j, phi, t] - y_avg
 
     @dist.Constraint(dist.nodes, dist.phases, time, doc='Voltage unbalance 2')
+    @_lazy
     def unbalance_2(dist, j, phi, t):
-        y_avg = sum(dist.y[j, ph, t] for ph in dist.phases) / 3
+        y_avg = sum(dist.y[j, ph, t] for ph in phases) / 3
         return dist.y[j, phi, t] - y_avg <= 0.1 * y_avg
 
+    # the balance of the first node (primary of the transformer) is not written
+    first_node = dist.nodes.first()
+    balanced = {j: first_node < j for j in net.nodes}
+
     @dist.Constraint(dist.nodes, dist.phases, time, doc='Active power balance on each node and phase')
     def active_balance(dist, j, phase, t):
         """
@@ -240,17 +336,12 @@ def network_3phases_lindistflow(dist, **kwargs):
         exiting the node (successors)
         P_{ij} = P_j_out + \sum_{m:j->m} P_{jm}
         """
-        Childs = list(dist.graph.successors(j))  # children nodes of node j
-        Parents = list(dist.graph.predecessors(j))
 
-        if dist.nodes.first() < j:
+        if balanced[j]:
             # if the node is not the first, then parents are not empty of lenth 1 (radial)
-            parent = Parents[0]
-            if len(Childs) > 0:
-                return (dist.p[(parent, j), phase, t] ==
-                        dist.p_out[j, phase, t] + sum(dist.p[(j, child), phase, t] for child in Childs))
-            else:
-                return dist.p[(parent, j), phase, t] == dist.p_out[j, phase, t]
+            parent = net.parent[j]
+            return (dist.p[parent, j, phase, t] ==
+                    dist.p_out[j, phase, t] + sum(dist.p[j, child, phase, t] for child in net.children[j]))
         else:
             return Constraint.Skip
 
@@ -264,17 +355,11 @@ def network_3phases_lindistflow(dist, **kwargs):
         Q_{pj} = Q_j_out + \sum_{m:k->m} Q_{jm}
         """
 
-        Childs = list(dist.graph.successors(j))  # children nodes of node j
-        Parents = list(dist.graph.predecessors(j))
-
-        if dist.nodes.first() < j:
+        if balanced[j]:
             # if the node is not the first, then parents are not empty of lenth 1 (radial)
-            parent = Parents[0]
-            if len(Childs) > 0:
-                return (dist.q[(parent, j), phase, t] == dist.q_out[j, phase, t]
-                        + sum(dist.q[(j, child), phase, t] for child in Childs))
-            else:
-                return dist.q[(parent, j), phase, t] == dist.q_out[j, phase, t]
+            parent = net.parent[j]
+            return (dist.q[parent, j, phase, t] == dist.q_out[j, phase, t]
+                    + sum(dist.q[j, child, phase, t] for child in net.children[j]))
         else:
             return Constraint.Skip
 
@@ -283,54 +368,249 @@ def network_3phases_lindistflow(dist, **kwargs):
         """
         |Vk|^2 = |Vi|^2 - 2(R_{ik}P_{ik} + X_{ik}Q_{ik})
         """
+        k = net.edge_index[i, j]
+        if pmatrix[k] is None or qmatrix[k] is None:
+            raise KeyError(f'Edge {(i, j)} has no pmatrix or qmatrix attribute, '
+                           f'consider using lms2.electric.graph_utils.calc_edge_pq_matrix.')
         return dist.y[i, phi, t] == dist.y[j, phi, t] - (
-                sum(dist.graph[i][j]['pmatrix'][phi][phase] * dist.p[(i, j), phase, t] for phase in dist.phases) +
-                sum(dist.graph[i][j]['qmatrix'][phi][phase] * dist.q[(i, j), phase, t] for phase in dist.phases))
+                sum(pmatrix[k][phi][phase] * dist.p[i, j, phase, t] for phase in phases) +
+                sum(qmatrix[k][phi][phase] * dist.q[i, j, phase, t] for phase in phases))
 
 
     # fixing voltage for the first node (supposed to be the primary of the transformer)
-    first_node = dist.nodes.first()
     dist.y[first_node, :, :].fix()
 
+    first_edge = dist.edges.first()
+    s_nom_transfo = s_nom[net.edge_index[first_edge]] if net.edges else None
+
     @dist.Constraint(dist.edges, time, doc='Active Power Bounds of the transformer')
     def active_transfo(b, i, j, t):
-        if (i, j) == b.edges.first():
-            return -3 * dist.graph.edges[i, j]['cable'].s_nom, sum(b.p[i, j, phi, t] for phi in b.phases), 3 * dist.graph.edges[i, j]['cable'].s_nom
+        if (i, j) == first_edge:
+            return -3 * s_nom_transfo, sum(b.p[i, j, phi, t] for phi in phases), 3 * s_nom_transfo
         else:
             return Constraint.Skip
 
     @dist.Constraint(dist.edges, time, doc='Reactive Power Bounds of the transformer')
     def reactive_transfo(b, i, j, t):
-        if (i, j) == b.edges.first():
-            return -3*dist.graph.edges[i, j]['cable'].s_nom, sum(b.q[i, j, phi, t] for phi in b.phases), 3*dist.graph.edges[i, j]['cable'].s_nom
+        if (i, j) == first_edge:
+            return -3 * s_nom_transfo, sum(b.q[i, j, phi, t] for phi in phases), 3 * s_nom_transfo
         else:
             return Constraint.Skip
 
-    @dist.Constraint(dist.edges, time, doc = 'Linear approximation of the circular constraint on Snom')
-    def pq_transfo1(b, i, j, t):
-        if (i, j) == b.edges.first():
-            return -np.sqrt(2) * 3 * dist.graph.edges[i, j]['cable'].s_nom, sum(b.q[(i, j), phi, t] + b.p[(i, j), phi, t] for phi in b.phases), np.sqrt(
-                2) * 3 * dist.graph.edges[i, j]['cable'].s_nom
-        else:
-            return Constraint.Skip
+    if pq_sides is None:
+        @dist.Constraint(dist.edges, time, doc = 'Linear approximation of the circular constraint on Snom')
+        def pq_transfo1(b, i, j, t):
+            if (i, j) == first_edge:
+                return -np.sqrt(2) * 3 * s_nom_transfo, sum(b.q[i, j, phi, t] + b.p[i, j, phi, t] for phi in phases), \
+                       np.sqrt(2) * 3 * s_nom_transfo
+            else:
+                return Constraint.Skip
 
-    @dist.Constraint(dist.edges, time, doc = 'Linear approximation of the circular constraint on Snom')
-    def pq_transfo2(b, i, j, t):
-        if (i, j) == b.edges.first():
-            return -np.sqrt(2) * 3 * dist.graph.edges[i, j]['cable'].s_nom, sum(b.p[i, j, phi, t] - b.q[i, j, phi, t] for phi in b.phases), np.sqrt(2) * 3 * dist.graph.edges[i, j]['cable'].s_nom
-        else:
-            return Constraint.Skip
+        @dist.Constraint(dist.edges, time, doc = 'Linear approximation of the circular constraint on Snom')
+        def pq_transfo2(b, i, j, t):
+            if (i, j) == first_edge:
+                return -np.sqrt(2) * 3 * s_nom_transfo, sum(b.p[i, j, phi, t] - b.q[i, j, phi, t] for phi in phases), \
+                       np.sqrt(2) * 3 * s_nom_transfo
+            else:
+                return Constraint.Skip
 
-    @dist.Constraint(dist.edges, dist.phases, time, doc = 'Linear approximation of the circular constraint on Snom')
-    def pq_line1(b, i, j, phi, t):
-        if (i, j) == b.edges.first():
-            return Constraint.Skip
-        else:
-            return -np.sqrt(2) * dist.graph.edges[i, j]['cable'].s_nom, b.q[i, j, phi, t] + b.p[i, j, phi, t], np.sqrt(2) * dist.graph.edges[i, j]['cable'].s_nom
+        @dist.Constraint(dist.edges, dist.phases, time, doc = 'Linear approximation of the circular constraint on Snom')
+        @_lazy
+        def pq_line1(b, i, j, phi, t):
+            if (i, j) == first_edge:
+                return Constraint.Skip
+            else:
+                s = s_nom[net.edge_index[i, j]]
+                return -np.sqrt(2) * s, b.q[i, j, phi, t] + b.p[i, j, phi, t], np.sqrt(2) * s
+
+        @dist.Constraint(dist.edges, dist.phases, time, doc = 'Linear approximation of the circular constraint on Snom')
+        @_lazy
+        def pq_line2(b, i, j, phi, t):
+            if (i, j) == first_edge:
+                return Constraint.Skip
+            else:
+                s = s_nom[net.edge_index[i, j]]
+                return -np.sqrt(2) * s, b.p[i, j, phi, t] - b.q[i, j, phi, t], np.sqrt(2) * s
+
+    else:
+        # regular polygon circumscribed to the circle |S| <= Snom, the sides parallel to the axes being the bounds of
+        # the variables (and of the transformer): each constraint gives two opposite sides
+        if pq_sides < 4 or pq_sides % 4 != 0:
+            raise ValueError(f'pq_sides must be a multiple of 4, and received {pq_sides}.')
+        angles = {k: 2 * np.pi * k / pq_sides for k in range(pq_sides // 2) if k % (pq_sides // 4) != 0}
+        dist.sides = Set(initialize=list(angles), doc='sides of the polygonal approximation of the circular '
+                                                       'constraint on Snom (other than the bounds)')
+
+        @dist.Constraint(dist.edges, time, dist.sides, doc='Polygonal approximation of the circular constraint on '
+                                                           'Snom of the transformer')
+        def pq_transfo(b, i, j, t, k):
+            if (i, j) == first_edge:
+                c, s = np.cos(angles[k]), np.sin(angles[k])
+                return -3 * s_nom_transfo, sum(c * b.p[i, j, phi, t] + s * b.q[i, j, phi, t] for phi in phases), \
+                       3 * s_nom_transfo
+            else:
+                return Constraint.Skip
+
+        @dist.Constraint(dist.edges, dist.phases, time, dist.sides,
+                         doc='Polygonal approximation of the circular constraint on Snom')
+        @_lazy
+        def pq_line(b, i, j, phi, t, k):
+            if (i, j) == first_edge:
+                return Constraint.Skip
+            else:
+                s = s_nom[net.edge_index[i, j]]
+                return -s, np.cos(angles[k]) * b.p[i, j, phi, t] + np.sin(angles[k]) * b.q[i, j, phi, t], s
 
-    @dist.Constraint(dist.edges, dist.phases, time, doc = 'Linear approximation of the circular constraint on Snom')
-    def pq_line2(b, i, j, phi, t):
-        if (i, j) == b.edges.first():
-            return Constraint.Skip
-        else:
-            return -np.sqrt(2) * dist.graph.edges[i, j]['cable'].s_nom, b.p[i, j, phi, t] - b.q[i, j, phi, t], np.sqrt(2) * dist.graph.edges[i, j]['cable'].s_nom
+    if pq_cuts:
+        # outer approximation: cuts tangent to the circle |S| <= Snom, added at the operating points outside it
+        dist.pq_transfo_cuts = ConstraintList(doc='Cuts tangent to the circular constraint on Snom of the transformer')
+        dist.pq_line_cuts = ConstraintList(doc='Cuts tangent to the circular constraint on Snom')
+
+        def pq_transfo_cuts(b, i, j, t, theta):
+            return np.cos(theta) * sum(b.p[i, j, phi, t] for phi in phases) \
+                + np.sin(theta) * sum(b.q[i, j, phi, t] for phi in phases) <= 3 * s_nom_transfo
+
+        def pq_line_cuts(b, i, j, phi, t, theta):
+            return np.cos(theta) * b.p[i, j, phi, t] + np.sin(theta) * b.q[i, j, phi, t] \
+                <= s_nom[net.edge_index[i, j]]
+
+        rules.update(pq_transfo_cuts=pq_transfo_cuts, pq_line_cuts=pq_line_cuts)
+
+    if lazy or pq_cuts:
+        line = np.ones(len(net.edges), dtype=bool)
+        if net.edges:
+            line[net.edge_index[first_edge]] = False
+        dist._lazy = LazyConstraints(rules=rules, time=list(time), s_nom=net.s_nom, line=line,
+                                     angles=None if pq_sides is None else angles, cut_tol=pq_cut_tol)
+
+
+@dataclass(repr=False)
+class LazyConstraints:
+    """
+    Lazy constraints of a LinDistFlow block (see :func:`network_3phases_lindistflow` with `lazy=True` or
+    `pq_cuts=True`).
+    """
+    rules: dict                 # rules of the lazy constraints, by name of constraint
+    time: list                  # time steps of the block
+    s_nom: np.ndarray           # (E,) nominal power of the cable of each edge
+    line: np.ndarray            # (E,) False for the first edge (transformer), True for the lines
+    angles: dict = None         # angles of the sides of the polygonal approximation of the limits on Snom
+    cut_tol: float = 1e-3       # relative tolerance on Snom of the outer approximation
+
+
+def _var_array(var, *shape):
+    """ Values of a dense indexed variable, as an array (nan for the variables without value). """
+    return np.array([np.nan if v.value is None else v.value for v in var.values()], dtype=float).reshape(shape)
+
+
+def lazy_violations(dist, tol=1e-6):
+    """
+    Returns the indexes of the lazy constraints of a solved LinDistFlow block that are violated by its solution, and
+    not yet in the model. The constraints are checked at once, as arrays.
+
+    For the outer approximation of the limits on Snom (`pq_cuts=True`), the indexes of the cuts are the indexes of the
+    power of the operating point, followed by the angle of the cut.
+
+    :param dist: LinDistFlow block created with `lazy=True` or `pq_cuts=True`
+    :param float tol: tolerance on the violation of the constraints
+    :return: dictionary of the violated indexes, by name of constraint
+    """
+
+    lazy = dist._lazy
+    nodes, edges = list(dist.nodes), list(dist.edges)
+    nt = len(lazy.time)
+    violated = dict()
+
+    if 'unbalance_1' in lazy.rules:
+        y = _var_array(dist.y, len(nodes), 3, nt)
+        y_avg = y.mean(axis=1, keepdims=True)
+        violated['unbalance_1'] = [(nodes[k], ph, lazy.time[t])
+                                   for k, ph, t in np.argwhere(y - y_avg < -0.1 * y_avg - tol).tolist()]
+        violated['unbalance_2'] = [(nodes[k], ph, lazy.time[t])
+                                   for k, ph, t in np.argwhere(y - y_avg > 0.1 * y_avg + tol).tolist()]
+
+    p = _var_array(dist.p, len(edges), 3, nt)
+    q = _var_array(dist.q, len(edges), 3, nt)
+    s_nom = lazy.s_nom[:, None, None]
+    line = lazy.line[:, None, None]
+
+    if 'pq_line1' in lazy.rules:
+        s = np.sqrt(2) * s_nom
+        violated['pq_line1'] = [(*edges[k], ph, lazy.time[t])
+                                for k, ph, t in np.argwhere(line & (np.abs(p + q) > s + tol)).tolist()]
+        violated['pq_line2'] = [(*edges[k], ph, lazy.time[t])
+                                for k, ph, t in np.argwhere(line & (np.abs(p - q) > s + tol)).tolist()]
+
+    if 'pq_line' in lazy.rules:
+        violated['pq_line'] = []
+        for side, angle in lazy.angles.items():
+            out = line & (np.abs(np.cos(angle) * p + np.sin(angle) * q) > s_nom + tol)
+            violated['pq_line'] += [(*edges[k], ph, lazy.time[t], side) for k, ph, t in np.argwhere(out).tolist()]
+
+    if 'pq_line_cuts' in lazy.rules:
+        out = line & (np.hypot(p, q) > s_nom * (1 + lazy.cut_tol))
+        violated['pq_line_cuts'] = [(*edges[k], ph, lazy.time[t], float(np.arctan2(q[k, ph, t], p[k, ph, t])))
+                                    for k, ph, t in np.argwhere(out).tolist()]
+
+        transfo = ~lazy.line
+        p3, q3 = p[transfo].sum(axis=1), q[transfo].sum(axis=1)
+        out = np.hypot(p3, q3) > 3 * lazy.s_nom[transfo][:, None] * (1 + lazy.cut_tol)
+        transfo_edges = [e for e, l in zip(edges, lazy.line) if not l]
+        violated['pq_transfo_cuts'] = [(*transfo_edges[k], lazy.time[t], float(np.arctan2(q3[k, t], p3[k, t])))
+                                       for k, t in np.argwhere(out).tolist()]
+
+    res = dict()
+    for name, index in violated.items():
+        con = dist.component(name)
+        res[name] = index if isinstance(con, ConstraintList) else [i for i in index if i not in con]
+    return res
+
+
+def add_lazy_constraints(dist, violations):
+    """
+    Adds lazy constraints to a LinDistFlow block.
+
+    :param dist: LinDistFlow block created with `lazy=True` or `pq_cuts=True`
+    :param dict violations: indexes of the constraints to add, by name of constraint (see :func:`lazy_violations`)
+    :return: number of added constraints
+    """
+
+    n = 0
+    for name, indexes in violations.items():
+        con, rule = dist.component(name), dist._lazy.rules[name]
+        for index in indexes:
+            if isinstance(con, ConstraintList):
+                con.add(rule(dist, *index))
+            else:
+                con.add(index, rule(dist, *index))
+            n += 1
+    return n
+
+
+def solve_lazy(model, opt, max_iter=50, tol=1e-6, **kwargs):
+    """
+    Solves a model containing LinDistFlow blocks created with `lazy=True` or `pq_cuts=True`, by constraint
+    generation: the model is solved, the violated lazy constraints (and the cuts of the outer approximation of the
+    limits on Snom) are added, and the model is solved again, until no lazy constraint is violated.
+
+    :param model: model to solve
+    :param opt: solver (e.g. `SolverFactory('gurobi')`)
+    :param int max_iter: maximum number of solves
+    :param float tol: tolerance on the violation of the constraints
+    :param kwargs: options of the `solve` method of the solver
+    :return: results of the last solve (the iterations stop at the first solve which is not optimal)
+    """
+
+    blocks = [b for b in model.block_data_objects(active=True) if hasattr(b, '_lazy')]
+    for it in range(1, max_iter + 1):
+        results = opt.solve(model, **kwargs)
+        if not check_optimal_termination(results):
+            # values of the variables are not a solution, no constraint is separated from them
+            logger.warning(f'solve_lazy: iteration {it} terminated with {results.solver.termination_condition}.')
+            return results
+        added = sum(add_lazy_constraints(b, lazy_violations(b, tol=tol)) for b in blocks)
+        logger.info(f'solve_lazy: iteration {it}, {added} constraints added.')
+        if added == 0:
+            return results
+    logger.warning(f'solve_lazy: lazy constraints are still violated after {max_iter} iterations.')
+    return results
@@ -0,0 +1,264 @@
+"""
+Unbalanced three-phase power flow of radial networks (backward/forward sweep), used to check the solutions of the
+linearized model :func:`lms2.electric.network.network_3phases_lindistflow`.
+"""
+
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+import networkx as nx
+from scipy import sparse
+
+logger = logging.getLogger('lms2.power_flow')
+
+__all__ = ['PowerFlowResult', 'power_flow', 'lindistflow_voltages', 'validate_lindistflow']
+
+# phase shifts of the phases a, b and c
+_PHASES = np.exp(-2j * np.pi / 3 * np.arange(3))
+
+
+@dataclass(repr=False)
+class PowerFlowResult:
+    """
+    Result of a power flow over a time horizon (see :func:`power_flow`).
+
+    Nodes and edges are in the order of the graph, time steps in the order of the given powers. Powers are in the
+    unit of the model (W by default, see `power_unit`).
+    """
+    nodes: list                 # labels of the nodes
+    edges: list                 # labels of the edges
+    v: np.ndarray               # (N, 3, T) complex phase voltages (V)
+    p: np.ndarray               # (E, 3, T) active power flowing from the sending node of each edge
+    q: np.ndarray               # (E, 3, T) reactive power flowing from the sending node of each edge
+    losses: np.ndarray          # (E, T) active losses of each edge (all phases)
+    iterations: int             # largest number of iterations of the time chunks
+    converged: bool
+
+    @property
+    def y(self):
+        """ (N, 3, T) square voltage magnitudes (V²), as the variable `y` of the LinDistFlow model. """
+        return np.abs(self.v) ** 2
+
+
+class _Feeder(object):
+    """ Structure of a radial feeder: path incidence and impedance matrices of the edges. """
+
+    def __init__(self, graph):
+        self.nodes = list(graph.nodes())
+        self.edges = list(graph.edges())
+        index = {n: k for k, n in enumerate(self.nodes)}
+
+        roots = [n for n in self.nodes if graph.in_degree(n) == 0]
+        if len(roots) != 1 or not nx.is_arborescence(graph):
+            raise ValueError('The graph of the network must be a radial tree (arborescence).')
+        self.root = index[roots[0]]
+
+        self.sending = np.array([index[n1] for n1, n2 in self.edges], dtype=int)
+        self.receiving = np.array([index[n2] for n1, n2 in self.edges], dtype=int)
+
+        # path incidence: edges on the path from the root to each node (one row per edge and phase, one column
+        # per node and phase), so that sweeps are sparse products
+        edge_in = np.full(len(self.nodes), -1, dtype=int)
+        edge_in[self.receiving] = np.arange(len(self.edges))
+        parent = np.full(len(self.nodes), -1, dtype=int)
+        parent[self.receiving] = self.sending
+        rows, cols = [], []
+        nodes, ancestors = np.arange(len(self.nodes)), np.arange(len(self.nodes))
+        while True:
+            keep = ancestors != self.root
+            nodes, ancestors = nodes[keep], ancestors[keep]
+            if len(nodes) == 0:
+                break
+            rows.append(edge_in[ancestors])
+            cols.append(nodes)
+            ancestors = parent[ancestors]
+        rows = np.concatenate(rows + [np.zeros(0, dtype=int)])
+        cols = np.concatenate(cols + [np.zeros(0, dtype=int)])
+        self.paths = sparse.csr_matrix(
+            (np.ones(3 * len(rows)), (np.concatenate([3 * rows + ph for ph in range(3)]),
+                                      np.concatenate([3 * cols + ph for ph in range(3)]))),
+            shape=(3 * len(self.edges), 3 * len(self.nodes)))
+
+        # impedance matrices of the edges (Ohm)
+        z = np.zeros((len(self.edges), 3, 3), dtype=complex)
+        for k, (n1, n2, data) in enumerate(graph.edges(data=True)):
+            cable = data['cable']
+            z[k] = (np.asarray(cable.r) + 1j * np.asarray(cable.x)) * data['length']
+        self.z_diag = sparse.block_diag(z, format='csr') if len(z) else sparse.csr_matrix((0, 0), dtype=complex)
+
+        v_nom = graph.edges[self.edges[0]]['cable'].v_nom if self.edges else np.nan
+        self.v_source = float(v_nom)
+
+
+def _as_array(values, n, name):
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 2:
+        values = values[:, :, None]
+    if values.ndim != 3 or values.shape[:2] != (n, 3):
+        raise ValueError(f'{name} must be an array of shape (nodes, 3, time), received {values.shape}.')
+    return values
+
+
+def _sweep(s_loaded, v0_loaded, paths, paths_t, z, tol, max_iter):
+    """
+    Backward/forward sweep over a chunk of time steps.
+
+    Only the voltages of the loads are iterated: the currents of the edges are the sums of the currents of the loads
+    of their sub-tree (backward sweep), and the voltages of the loads are the voltage of the root minus the voltage
+    drops of the edges on their path (forward sweep).
+
+    :param s_loaded: (L, T) complex powers of the loads (W)
+    :param v0_loaded: (L, T) complex voltages of the root, on the phases of the loads
+    :param paths: (E * 3, L) sparse path incidence of the loads (see :class:`_Feeder`)
+    :param paths_t: transposed path incidence of the loads
+    :param z: (E * 3, E * 3) sparse block diagonal impedance matrix of the edges
+    :return: currents of the loads (L, T), number of iterations, convergence
+    """
+
+    v_loaded = v0_loaded.copy()
+    scale = np.abs(v0_loaded).max() if v0_loaded.size else 1.
+
+    converged, it = v0_loaded.size == 0, 0
+    while not converged and it < max_iter:
+        it += 1
+        v_new = v0_loaded - paths_t @ (z @ (paths @ np.conj(s_loaded / v_loaded)))
+        converged = np.abs(v_new - v_loaded).max() / scale < tol
+        v_loaded = v_new
+
+    return np.conj(s_loaded / v_loaded), it, converged
+
+
+def power_flow(graph, p_out, q_out, v_source=None, power_unit=1., tol=1e-6, max_iter=50, chunk=64):
+    """
+    Unbalanced three-phase power flow of a radial network, solved by backward/forward sweep.
+
+    The network is described by the same graph as :func:`lms2.electric.network.network_3phases_lindistflow`: edges
+    need the `cable` (impedances per km) and `length` (km) attributes. As in the power balance of the model, `p_out`
+    and `q_out` are the powers leaving the network at each node (positive for a load), the root being the source.
+
+    All the time steps are solved at once (by chunks of `chunk` time steps, to bound the memory used), without any
+    pyomo model.
+
+    :param graph: radial network (networkx.DiGraph)
+    :param p_out: (N, 3, T) active powers of the nodes (in the order of the graph), in the unit of the model
+    :param q_out: (N, 3, T) reactive powers of the nodes, in the unit of the model
+    :param v_source: voltage magnitude of the root, (T,) array or scalar (V, default: nominal voltage of the first
+        edge)
+    :param float power_unit: value of the unit of power of the model in W (default: W, as seen by the voltage
+        equations of the LinDistFlow model, see :func:`validate_lindistflow`; 1e3 for kW)
+    :param float tol: tolerance on the voltages, relative to the voltage of the root
+    :param int max_iter: maximum number of iterations
+    :param int chunk: number of time steps solved together
+    :return: PowerFlowResult
+    """
+
+    feeder = _Feeder(graph)
+    n, e = len(feeder.nodes), len(feeder.edges)
+    p_out = _as_array(p_out, n, 'p_out').reshape(3 * n, -1)
+    q_out = _as_array(q_out, n, 'q_out').reshape(3 * n, -1)
+    nt = p_out.shape[1]
+
+    v_source = feeder.v_source if v_source is None else v_source
+    v_source = np.broadcast_to(np.asarray(v_source, dtype=float), (nt,))
+
+    # only the (node, phase) with a load draw a current
+    loaded = np.flatnonzero((p_out != 0).any(axis=1) | (q_out != 0).any(axis=1))
+    paths = feeder.paths[:, loaded]
+    loaded_t = paths.T.tocsr()
+    paths_t = feeder.paths.T.tocsr()
+    sending = (3 * feeder.sending[:, None] + np.arange(3)).reshape(-1)
+
+    v = np.empty((3 * n, nt), dtype=complex)
+    p = np.empty((3 * e, nt))
+    q = np.empty((3 * e, nt))
+    losses = np.empty((e, nt))
+    iterations, converged = 0, True
+
+    for t0 in range(0, nt, chunk):
+        t = slice(t0, min(t0 + chunk, nt))
+        v0 = _PHASES[:, None] * v_source[None, t]
+        s_loaded = (p_out[loaded, t] + 1j * q_out[loaded, t]) * power_unit
+        current, it, ok = _sweep(s_loaded, v0[loaded % 3], paths, loaded_t, feeder.z_diag, tol, max_iter)
+        iterations, converged = max(iterations, it), converged and ok
+
+        j = paths @ current
+        dv = feeder.z_diag @ j
+        vc = np.tile(v0, (n, 1)) - paths_t @ dv
+        s = vc[sending] * np.conj(j) / power_unit
+        v[:, t] = vc
+        p[:, t], q[:, t] = s.real, s.imag
+        losses[:, t] = (dv * np.conj(j)).real.reshape(e, 3, -1).sum(axis=1) / power_unit
+
+    if not converged:
+        logger.warning(f'The power flow did not converge in {max_iter} iterations.')
+
+    return PowerFlowResult(nodes=feeder.nodes, edges=feeder.edges, v=v.reshape(n, 3, nt), p=p.reshape(e, 3, nt),
+                           q=q.reshape(e, 3, nt), losses=losses, iterations=iterations, converged=converged)
+
+
+def lindistflow_voltages(graph, p_out, q_out, v_source=None, power_unit=1.):
+    """
+    Square voltage magnitudes given by the LinDistFlow equations (lossless flows, and the `pmatrix` and `qmatrix`
+    of the edges, see :func:`lms2.electric.graph_utils.calc_edge_pq_matrix`), for the same powers as
+    :func:`power_flow`.
+
+    :param float power_unit: value of the unit of power of `p_out` and `q_out` in W (see :func:`power_flow`)
+    :return: (N, 3, T) square voltage magnitudes (V²)
+    """
+
+    feeder = _Feeder(graph)
+    n = len(feeder.nodes)
+    p_out = _as_array(p_out, n, 'p_out').reshape(3 * n, -1) * power_unit
+    q_out = _as_array(q_out, n, 'q_out').reshape(3 * n, -1) * power_unit
+    nt = p_out.shape[1]
+
+    pmatrix = [graph.edges[e]['pmatrix'] for e in feeder.edges]
+    qmatrix = [graph.edges[e]['qmatrix'] for e in feeder.edges]
+    if not feeder.edges:
+        pmatrix = qmatrix = np.zeros((0, 0))
+
+    # lossless flows of the edges, and variations of the square voltages along the edges
+    dy = sparse.block_diag(pmatrix, format='csr') @ (feeder.paths @ p_out) \
+        + sparse.block_diag(qmatrix, format='csr') @ (feeder.paths @ q_out)
+
+    v_source = feeder.v_source if v_source is None else v_source
+    y0 = np.broadcast_to(np.asarray(v_source, dtype=float) ** 2, (nt,))
+    return (y0[None, :] + feeder.paths.T @ dy).reshape(n, 3, nt)
+
+
+def _values(var, nodes, phases, time):
+    return np.array([[[var[n, ph, t].value for t in time] for ph in phases] for n in nodes], dtype=float)
+
+
+def validate_lindistflow(dist, power_unit=1., **kwargs):
+    """
+    Checks the solution of a LinDistFlow block (see :func:`lms2.electric.network.network_3phases_lindistflow`) with
+    an exact power flow, using the solved `p_out` and `q_out` of the block.
+
+    The linearization error of each node is the difference between the square voltage magnitudes of the block (`y`)
+    and the exact ones.
+
+    The voltage equations of the block apply the `pmatrix` and `qmatrix` of the edges to its powers without
+    conversion, i.e. powers are in W for matrices computed from impedances in Ohm (`power_unit=1`), whatever the
+    units declared by the block.
+
+    :param dist: solved block
+    :param float power_unit: value of the unit of power of the model in W, as seen by its voltage equations
+    :param kwargs: other options of :func:`power_flow`
+    :return: PowerFlowResult, and errors (N, 3, T) on the square voltage magnitudes (V²)
+    """
+
+    time = list(list(dist.y.index_set().subsets())[2])
+    nodes, phases = list(dist.nodes), list(dist.phases)
+    graph = dist.graph
+
+    p_out = _values(dist.p_out, nodes, phases, time)
+    q_out = _values(dist.q_out, nodes, phases, time)
+    y = _values(dist.y, nodes, phases, time)
+
+    # nodes of the block are in the order of the graph
+    root = [n for n in nodes if graph.in_degree(n) == 0][0]
+    kwargs.setdefault('v_source', np.sqrt(y[nodes.index(root)].mean(axis=0)))
+    res = power_flow(graph, p_out, q_out, power_unit=power_unit, **kwargs)
+    return res, y - res.y
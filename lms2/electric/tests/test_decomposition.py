@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+from pyomo.environ import SolverFactory, Objective, Var, Constraint, NonNegativeReals
+
+from lms2.electric.graph_utils import random_feeder
+from lms2.electric.decomposition import solve_per_timestep
+from lms2.electric.power_flow import lindistflow_voltages
+
+HIGHS = SolverFactory('appsi_highs').available(exception_flag=False)
+
+
+def _objective(m):
+    m.obj = Objective(expr=sum(m.net.p[e + (ph, t)] for e in m.net.edges if e[0] == 0
+                               for ph in m.net.phases for t in m.time))
+
+
+def _storage(m):
+    m.e = Var(m.time, within=NonNegativeReals)
+    m.dyn = Constraint(m.time, rule=lambda m, t: Constraint.Skip if t == 0 else
+                       m.e[t] == m.e[t - 1] + m.net.p_out[1, 0, t])
+    _objective(m)
+
+
+class TestSolvePerTimestep(unittest.TestCase):
+    def setUp(self):
+        self.g = random_feeder(30, battery_share=0., seed=1)
+        for n, d in self.g.nodes(data=True):
+            d['fix_p_out'] = d['fix_q_out'] = [True] * 3
+        rng = np.random.default_rng(1)
+        self.p = np.zeros((30, 3, 5))
+        for k, (n, d) in enumerate(self.g.nodes(data=True)):
+            if d['kind'] == 'dwelling':
+                self.p[k, d['phase']] = rng.uniform(0, 2, 5)
+
+    def test_coupled(self):
+        with self.assertRaises(ValueError):
+            solve_per_timestep(self.g, self.p, rule=_storage, processes=1)
+
+    @unittest.skipUnless(HIGHS, 'needs the highs solver')
+    def test_solve(self):
+        res = solve_per_timestep(self.g, self.p, np.zeros_like(self.p), rule=_objective, processes=1, chunk=2)
+        self.assertEqual(res.status, ['optimal'] * 5)
+        self.assertEqual(res.y.shape, (30, 3, 5))
+        np.testing.assert_allclose(res.p_out, self.p)
+        np.testing.assert_allclose(res.objective, self.p.sum(axis=(0, 1)), atol=1e-6)
+
+        y = lindistflow_voltages(self.g, self.p, np.zeros_like(self.p))
+        np.testing.assert_allclose(res.y, y, rtol=1e-6)
+
+    @unittest.skipUnless(HIGHS, 'needs the highs solver')
+    def test_pool(self):
+        serial = solve_per_timestep(self.g, self.p, rule=_objective, processes=1)
+        pool = solve_per_timestep(self.g, self.p, rule=_objective, processes=2, chunk=2)
+        np.testing.assert_allclose(pool.y, serial.y)
+        self.assertEqual(pool.status, serial.status)
+
+
+if __name__ == '__main__':
+    unittest.main()
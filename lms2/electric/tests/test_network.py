@@ -1,5 +1,6 @@
 import unittest
 import networkx as nx
+import numpy as np
 import os
 from lms2.electric.graph_utils import read_json_graph, save_json_graph
 
@@ -24,11 +25,145 @@ class TestSaveGraph(unittest.TestCase):
         os.remove(self.file_name)
 
 
+class TestBinaryGraph(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        from lms2.electric.graph_utils import calc_edge_pq_matrix
+        from lms2.electric.network import cable_3_150_95, cable_4_70
+
+        edges = [(0, 1, {'length': 10, 'cable': cable_3_150_95}),
+                 (1, 2, {'length': 20, 'cable': cable_4_70}),
+                 (1, 3, {'length': 20, 'cable': cable_4_70})]
+        self.g = calc_edge_pq_matrix(nx.from_edgelist(edges, create_using=nx.DiGraph()))
+        for n, d in self.g.nodes(data=True):
+            d.update(p_out=[0.] * 3, fix_p_out=[n % 2 == 0] * 3)
+        self.g.nodes[2]['name'] = 'dwelling'
+        self.g.graph['name'] = 'feeder'
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'graph')
+
+    def test_save_and_load_graph(self):
+        from lms2.electric.graph_utils import save_binary_graph, read_binary_graph
+
+        save_binary_graph(self.g, self.path)
+        for mmap in [True, False]:
+            g = read_binary_graph(self.path, mmap=mmap)
+            self.assertEqual(list(g.edges()), list(self.g.edges()))
+            self.assertEqual(dict(g.nodes(data=True)), dict(self.g.nodes(data=True)))
+            self.assertEqual(g.graph, {'name': 'feeder'})
+            self.assertTrue((g[1][2]['pmatrix'] == self.g[1][2]['pmatrix']).all())
+            self.assertEqual(g[1][3]['length'], 20)
+            self.assertIs(g[1][2]['cable'], g[1][3]['cable'])
+            self.assertTrue((g[0][1]['cable'].x == self.g[0][1]['cable'].x).all())
+
+    def test_tables(self):
+        from lms2.electric.graph_utils import save_binary_graph, read_graph_tables
+
+        save_binary_graph(self.g, self.path)
+        tables = read_graph_tables(self.path)
+        self.assertEqual(tables.edge_data['pmatrix'].shape, (3, 3, 3))
+        self.assertEqual([c.name for c in tables.cables], ['cable_3_150_95', 'cable_4_70'])
+        self.assertEqual(tables.edge_data['cable'].tolist(), [0, 1, 1])
+        self.assertEqual(tables.node_mask['name'].tolist(), [False, False, True, False])
+
+    def test_overwrite(self):
+        from lms2.electric.graph_utils import save_binary_graph, read_binary_graph
+
+        # a previous graph is replaced
+        save_binary_graph(self.g, self.path)
+        self.g.graph['name'] = 'other'
+        save_binary_graph(self.g, self.path)
+        self.assertEqual(read_binary_graph(self.path).graph, {'name': 'other'})
+
+        # other directories and files are not
+        for path, content in [(os.path.join(self.dir.name, 'results'), 'results.csv'),
+                              (os.path.join(self.dir.name, 'graph.json'), None)]:
+            if content is None:
+                with open(path, 'w') as f:
+                    f.write('{}')
+            else:
+                os.makedirs(path)
+                open(os.path.join(path, content), 'w').close()
+            with self.assertRaises(FileExistsError):
+                save_binary_graph(self.g, path)
+            self.assertTrue(os.path.exists(os.path.join(path, content) if content else path))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+class TestRandomFeeder(unittest.TestCase):
+    def test_tree(self):
+        from lms2.electric.graph_utils import random_feeder
+
+        g = random_feeder(500, branching=(1, 3), max_depth=30, seed=0)
+        self.assertEqual(g.number_of_nodes(), 500)
+        self.assertTrue(nx.is_arborescence(g))
+        self.assertTrue(all(n1 < n2 for n1, n2 in g.edges()))
+        self.assertTrue(all('pmatrix' in d for _, _, d in g.edges(data=True)))
+
+        for n, d in g.nodes(data=True):
+            if d['kind'] == 'dwelling':
+                self.assertEqual(g.out_degree(n), 0)
+                self.assertEqual(d['fix_p_out'].count(False), 1)
+                self.assertLessEqual(d['p_out_min'][d['phase']], d['p_out_max'][d['phase']])
+
+        h = random_feeder(500, branching=(1, 3), max_depth=30, seed=0)
+        self.assertEqual(dict(g.nodes(data=True)), dict(h.nodes(data=True)))
+
+    def test_depth(self):
+        from lms2.electric.graph_utils import random_feeder
+
+        self.assertRaises(ValueError, random_feeder, 100, branching=(1, 1), max_depth=10)
+
+    def test_lindistflow(self):
+        from lms2.electric.graph_utils import random_feeder
+
+        g = random_feeder(50, seed=1)
+        m = ConcreteModel()
+        m.time = RangeSet(0, 1)
+        m.net = Block(rule=lambda b: network_3phases_lindistflow(b, **{'time': m.time, 'graph': g}))
+        dwellings = [n for n, d in g.nodes(data=True) if d['kind'] == 'dwelling']
+        self.assertEqual(sum(1 for v in m.net.p_out.values() if not v.fixed), len(dwellings) * 2)
+
+
 def test_calc_edge_pq_matrix():
     # todo : créer un cas simple et vérifier le résultat avec qq chose de connu
 
     assert True
 
+
+class TestCalcEdgePQ(unittest.TestCase):
+    def setUp(self):
+        from lms2.electric.network import cable_3_150_95, cable_4_70
+
+        self.g = nx.DiGraph()
+        self.g.add_edge(0, 1, length=0.5, cable=cable_3_150_95)
+        self.g.add_edge(1, 2, length=0.2, cable=cable_4_70)
+        self.g.add_edge(1, 3, length=0.2, cable=cable_4_70)
+
+    def test_tensors(self):
+        import numpy as np
+        from lms2.electric.graph_utils import calc_edge_pq_tensors
+
+        r, x, l = self.g[1][2]['cable'].r, self.g[1][2]['cable'].x, 0.2
+        pm, qm = calc_edge_pq_tensors(r[None], x[None], [l])
+        self.assertEqual(pm.shape, (1, 3, 3))
+        self.assertEqual(pm[0, 0, 0], -2 * r[0, 0] * l)
+        self.assertEqual(pm[0, 1, 0], r[1, 0] * l + np.sqrt(3) * x[1, 0] * l)
+        self.assertEqual(qm[0, 1, 2], x[1, 2] * l + np.sqrt(3) * r[1, 2] * l)
+        self.assertEqual(pm[0, 2, 0], 0)
+
+    def test_arrays(self):
+        import numpy as np
+        from lms2.electric.graph_utils import calc_edge_pq_arrays
+
+        edges, pm, qm = calc_edge_pq_arrays(self.g)
+        self.assertEqual(edges, [(0, 1), (1, 2), (1, 3)])
+        self.assertEqual(pm.shape, (3, 3, 3))
+        np.testing.assert_array_equal(pm[1], pm[2])
+        np.testing.assert_array_equal(self.g[0][1]['qmatrix'], qm[0])
+
 from pyomo.environ import *
 from lms2.electric.network import network_3phases_lindistflow, cable_3_150_95
 import networkx as nx
@@ -50,6 +185,213 @@ class TestNetwork_3phases_lindistflow(unittest.TestCase):
         assert True
 
 
+class TestNetworkArrays(unittest.TestCase):
+    def setUp(self):
+        from lms2.electric.graph_utils import calc_edge_pq_matrix
+        from lms2.electric.network import cable_4_70
+
+        edges = [(0, 1, {'length': 10, 'cable': cable_3_150_95}),
+                 (1, 2, {'length': 20, 'cable': cable_4_70}),
+                 (1, 3, {'length': 20, 'cable': cable_4_70})]
+        self.g = calc_edge_pq_matrix(nx.from_edgelist(edges, create_using=nx.DiGraph()))
+
+    def test_arrays(self):
+        from lms2.electric.network import network_arrays
+
+        net = network_arrays(self.g)
+        self.assertEqual(net.parent, {0: None, 1: 0, 2: 1, 3: 1})
+        self.assertEqual(net.children[1], [2, 3])
+        self.assertEqual(net.edge_nodes.tolist(), [[0, 1], [1, 2], [1, 3]])
+        self.assertTrue((net.pmatrix[1] == self.g[1][2]['pmatrix']).all())
+        self.assertEqual(net.s_nom.tolist(), [250 / 3, 30, 30])
+        self.assertEqual(net.v_nom.tolist(), [230] * 4)
+
+    def test_lindistflow(self):
+        m = ConcreteModel()
+        m.time = RangeSet(0, 1)
+        m.net = Block(rule=lambda b: network_3phases_lindistflow(b, **{'time': m.time, 'graph': self.g}))
+
+        self.assertEqual(len(m.net.active_balance), 3 * 3 * 2)
+        c = m.net.y_constraint[1, 3, 0, 1]
+        self.assertEqual(c.body.polynomial_degree(), 1)
+        self.assertEqual(m.net.p[1, 2, 0, 0].bounds, (-30, 30))
+        self.assertEqual(m.net.y[3, 0, 0].bounds, ((230 * 0.9) ** 2, (230 * 1.1) ** 2))
+
+
+class TestLazyConstraints(unittest.TestCase):
+    def setUp(self):
+        from lms2.electric.graph_utils import calc_edge_pq_matrix
+        from lms2.electric.network import cable_4_70
+
+        g = nx.DiGraph()
+        g.add_edge(0, 1, length=0.01, cable=cable_3_150_95)
+        g.add_edge(1, 2, length=0.2, cable=cable_4_70)
+        g.add_edge(1, 3, length=0.2, cable=cable_4_70)
+        for n, d in g.nodes(data=True):
+            d.update(p_out=[0.] * 3, q_out=[0.] * 3, fix_p_out=[True] * 3, fix_q_out=[True] * 3)
+        g.nodes[2].update(fix_p_out=[False, True, True], p_out_min=[0] * 3, p_out_max=[50, 0, 0],
+                          fix_q_out=[False, True, True], q_out_min=[0] * 3, q_out_max=[50, 0, 0])
+        g.nodes[3].update(fix_p_out=[True, False, True], p_out_min=[0] * 3, p_out_max=[0, 20, 0])
+        self.g = calc_edge_pq_matrix(g)
+
+    def build(self, lazy, **kwargs):
+        m = ConcreteModel()
+        m.time = RangeSet(0, 1)
+        m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=self.g, lazy=lazy, **kwargs))
+        m.obj = Objective(expr=sum(v for v in list(m.net.p_out.values()) + list(m.net.q_out.values())
+                                   if not v.fixed), sense=maximize)
+        return m
+
+    def test_violations(self):
+        from lms2.electric.network import lazy_violations, add_lazy_constraints
+
+        m = self.build(lazy=True)
+        for name in ['pq_line1', 'pq_line2', 'unbalance_1', 'unbalance_2']:
+            self.assertEqual(len(m.net.component(name)), 0)
+
+        for v in m.net.p.values():
+            v.value = 0
+        for v in m.net.q.values():
+            v.value = 0
+        m.net.p[1, 2, 0, 1].value = 30
+        m.net.q[1, 2, 0, 1].value = 30
+        m.net.y[3, 2, 0].value = 100
+
+        violations = lazy_violations(m.net)
+        self.assertEqual(violations['pq_line1'], [(1, 2, 0, 1)])
+        self.assertEqual(violations['pq_line2'], [])
+        self.assertEqual(violations['unbalance_1'], [(3, 2, 0)])
+        self.assertEqual(violations['unbalance_2'], [(3, 0, 0), (3, 1, 0)])
+        self.assertEqual(add_lazy_constraints(m.net, violations), 4)
+        self.assertEqual(lazy_violations(m.net)['pq_line1'], [])
+        self.assertIn((1, 2, 0, 1), m.net.pq_line1)
+
+    @unittest.skipUnless(SolverFactory('appsi_highs').available(exception_flag=False), 'needs the highs solver')
+    def test_solve_lazy(self):
+        from lms2.electric.network import solve_lazy
+
+        opt = SolverFactory('appsi_highs')
+        m = self.build(lazy=False)
+        opt.solve(m)
+        m_lazy = self.build(lazy=True)
+        solve_lazy(m_lazy, opt)
+        self.assertAlmostEqual(value(m.obj), value(m_lazy.obj), 6)
+        self.assertEqual(len(m_lazy.net.pq_line1), 2)
+
+    @unittest.skipUnless(SolverFactory('appsi_highs').available(exception_flag=False), 'needs the highs solver')
+    def test_solve_lazy_infeasible(self):
+        from lms2.electric.network import solve_lazy
+
+        m = self.build(lazy=True)
+        m.net.p_out[2, 0, 0].setlb(100)
+        with self.assertLogs('lms2.network', level='WARNING'):
+            results = solve_lazy(m, SolverFactory('appsi_highs'), load_solutions=False)
+        self.assertEqual(results.solver.termination_condition, TerminationCondition.infeasible)
+        self.assertEqual(len(m.net.pq_line1), 0)
+
+    def test_polygon(self):
+        m = self.build(lazy=False, pq_sides=16)
+        self.assertEqual(len(m.net.sides), 6)
+        self.assertEqual(len(m.net.pq_line), 2 * 3 * 2 * 6)
+        self.assertEqual(len(m.net.pq_transfo), 2 * 6)
+        self.assertFalse(hasattr(m.net, 'pq_line1'))
+        self.assertRaises(ValueError, self.build, lazy=False, pq_sides=6)
+
+    def test_cuts(self):
+        from lms2.electric.network import lazy_violations, add_lazy_constraints
+
+        m = self.build(lazy=False, pq_sides=4, pq_cuts=True)
+        for v in list(m.net.p.values()) + list(m.net.q.values()):
+            v.value = 0
+        m.net.p[1, 2, 0, 1].value = 30
+        m.net.q[1, 2, 0, 1].value = 30
+
+        violations = lazy_violations(m.net)
+        self.assertEqual(violations['pq_line_cuts'], [(1, 2, 0, 1, np.pi / 4)])
+        self.assertEqual(violations['pq_transfo_cuts'], [])
+        add_lazy_constraints(m.net, violations)
+        self.assertEqual(len(m.net.pq_line_cuts), 1)
+        self.assertAlmostEqual(m.net.pq_line_cuts[1].upper, 30)
+
+    @unittest.skipUnless(SolverFactory('appsi_highs').available(exception_flag=False), 'needs the highs solver')
+    def test_solve_cuts(self):
+        from lms2.electric.network import solve_lazy
+
+        opt = SolverFactory('appsi_highs')
+        m = self.build(lazy=False, pq_sides=4, pq_cuts=True, pq_cut_tol=1e-6)
+        m.obj.deactivate()
+        m.obj2 = Objective(expr=sum(2 * m.net.p_out[2, 0, t] + m.net.q_out[2, 0, t] for t in m.time), sense=maximize)
+        solve_lazy(m, opt)
+        # the circular limit of the line (1, 2) is binding
+        self.assertAlmostEqual(value(m.obj2) / 2, 30 * np.sqrt(5), 3)
+
+
+class TestReduceGraph(unittest.TestCase):
+    def setUp(self):
+        from lms2.electric.graph_utils import calc_edge_pq_matrix
+        from lms2.electric.network import cable_4_70
+
+        g = nx.DiGraph()
+        g.add_edge(0, 1, length=0.01, cable=cable_3_150_95)
+        for n1, n2 in [(1, 2), (2, 3), (3, 4), (3, 5)]:
+            g.add_edge(n1, n2, length=0.05, cable=cable_4_70)
+        for n, d in g.nodes(data=True):
+            d.update(p_out=[0.] * 3, q_out=[0.] * 3, fix_p_out=[True] * 3, fix_q_out=[True] * 3)
+        g.nodes[4]['p_out'] = [1., 0., 0.]
+        g.nodes[5].update(fix_p_out=[False, True, True], p_out_max=[10, 0, 0])
+        self.g = calc_edge_pq_matrix(g)
+
+    def test_reduce(self):
+        from lms2.electric.graph_utils import reduce_graph
+
+        r, reduction = reduce_graph(self.g)
+        self.assertEqual(list(r.nodes), [0, 1, 3, 5])
+        self.assertEqual(list(r.edges), [(0, 1), (1, 3), (3, 5)])
+        self.assertEqual(r.nodes[3]['p_out'], [1., 0., 0.])
+        self.assertEqual(self.g.nodes[3]['p_out'], [0., 0., 0.])
+        self.assertTrue(np.allclose(r[1][3]['pmatrix'], 2 * self.g[1][2]['pmatrix']))
+        self.assertAlmostEqual(r[1][3]['length'], 0.1)
+
+        self.assertEqual(list(reduce_graph(self.g, keep=[2, 4])[0].nodes), list(self.g.nodes))
+
+        # leaves are not folded into kept nodes, whose powers may be loaded later
+        r, _ = reduce_graph(self.g, keep=[3])
+        self.assertEqual(list(r.nodes), [0, 1, 3, 4, 5])
+        self.assertEqual(r.nodes[3]['p_out'], [0., 0., 0.])
+        self.assertEqual(r.nodes[4]['p_out'], [1., 0., 0.])
+
+    def test_expand_voltages(self):
+        from lms2.electric.graph_utils import reduce_graph
+
+        r, reduction = reduce_graph(self.g)
+        y = {n: np.full((3, 2), 5e4) for n in r.nodes}
+        p = {e: np.ones((3, 2)) for e in r.edges}
+        q = {e: np.zeros((3, 2)) for e in r.edges}
+        y_all = reduction.expand_voltages(y, p, q)
+
+        self.assertEqual(y_all.shape, (6, 3, 2))
+        self.assertTrue(np.allclose(y_all[2], 5e4 + self.g[1][2]['pmatrix'] @ np.ones((3, 2))))
+        self.assertTrue(np.allclose(y_all[4], 5e4 + (self.g[3][4]['pmatrix'] @ np.array([1., 0., 0.]))[:, None]))
+
+    @unittest.skipUnless(SolverFactory('appsi_highs').available(exception_flag=False), 'needs the highs solver')
+    def test_solve(self):
+        from lms2.electric.graph_utils import reduce_graph
+
+        r, reduction = reduce_graph(self.g)
+        models = []
+        for g in [self.g, r]:
+            m = ConcreteModel()
+            m.time = RangeSet(0, 1)
+            m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=g))
+            m.obj = Objective(expr=sum(m.net.p_out[5, 0, t] for t in m.time), sense=maximize)
+            SolverFactory('appsi_highs').solve(m)
+            models.append(m)
+
+        self.assertAlmostEqual(value(models[0].obj), value(models[1].obj), 6)
+        y = np.array([[[models[0].net.y[n, ph, t].value for t in range(2)] for ph in range(3)] for n in self.g.nodes])
+        self.assertTrue(np.allclose(reduction.expand_block(models[1].net), y))
+
+
 if __name__ == '__main__':
     unittest.main()
 
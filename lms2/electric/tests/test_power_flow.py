@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+from pyomo.environ import ConcreteModel, RangeSet, Block, Objective, SolverFactory
+
+from lms2.electric.graph_utils import random_feeder
+from lms2.electric.network import network_3phases_lindistflow
+from lms2.electric.power_flow import power_flow, lindistflow_voltages, validate_lindistflow
+
+HIGHS = SolverFactory('appsi_highs').available(exception_flag=False)
+
+
+class TestPowerFlow(unittest.TestCase):
+    def setUp(self):
+        self.g = random_feeder(60, seed=0)
+        rng = np.random.default_rng(0)
+        self.p = np.zeros((60, 3, 10))
+        for k, (n, d) in enumerate(self.g.nodes(data=True)):
+            if d['kind'] == 'dwelling':
+                self.p[k, d['phase']] = rng.uniform(0, 2, 10)
+
+    def test_no_load(self):
+        res = power_flow(self.g, np.zeros((60, 3, 2)), np.zeros((60, 3, 2)))
+        self.assertTrue(res.converged)
+        self.assertTrue(np.allclose(res.y, 230 ** 2))
+        self.assertTrue(np.allclose(res.losses, 0))
+
+    def test_balance(self):
+        # loads in kW
+        res = power_flow(self.g, self.p, 0.2 * self.p, power_unit=1e3, chunk=3)
+        self.assertTrue(res.converged)
+        first = [k for k, (n1, n2) in enumerate(res.edges) if n1 == 0]
+        supplied = res.p[first].sum(axis=(0, 1))
+        self.assertTrue(np.allclose(supplied, self.p.sum(axis=(0, 1)) + res.losses.sum(axis=0)))
+        self.assertTrue((res.losses > 0).any())
+
+        # the linearized voltages are close to the exact ones
+        y = lindistflow_voltages(self.g, self.p, 0.2 * self.p, power_unit=1e3)
+        self.assertLess(np.abs(y - res.y).max() / 230 ** 2, 1e-2)
+
+    def test_validate(self):
+        m = ConcreteModel()
+        m.time = RangeSet(0, 9)
+        m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=self.g))
+
+        y = lindistflow_voltages(self.g, self.p, np.zeros_like(self.p))
+        for k, n in enumerate(self.g.nodes()):
+            for ph in range(3):
+                for t in range(10):
+                    m.net.p_out[n, ph, t].value = self.p[k, ph, t]
+                    m.net.y[n, ph, t].value = y[k, ph, t]
+
+        res, error = validate_lindistflow(m.net)
+        self.assertEqual(error.shape, (60, 3, 10))
+        self.assertLess(np.abs(error).max() / 230 ** 2, 1e-2)
+
+    @unittest.skipUnless(HIGHS, 'needs the highs solver')
+    def test_validate_solved(self):
+        """ the errors of a solved block are linearization errors, small compared to the voltage drops """
+        m = ConcreteModel()
+        m.time = RangeSet(0, 9)
+        m.net = Block(rule=lambda b: network_3phases_lindistflow(b, time=m.time, graph=self.g))
+        loads = self.p
+        for k, n in enumerate(self.g.nodes()):
+            for ph in range(3):
+                for t in range(10):
+                    m.net.p_out[n, ph, t].fix(loads[k, ph, t])
+                    m.net.q_out[n, ph, t].fix(0.2 * loads[k, ph, t])
+        m.obj = Objective(expr=0)
+        SolverFactory('appsi_highs').solve(m)
+
+        res, error = validate_lindistflow(m.net)
+        y = np.array([[[m.net.y[n, ph, t].value for t in m.time] for ph in range(3)] for n in self.g.nodes()])
+        drop = y.max() - y.min()
+        self.assertGreater(drop, 0)
+        self.assertLess(np.abs(error).max(), 0.1 * drop)
+        np.testing.assert_allclose(y, lindistflow_voltages(self.g, loads, 0.2 * loads))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -41,5 +41,5 @@ def environment(env, **options):
 
     time  = options.pop('time', ContinuousSet(bounds=(0, 1), doc='Time set'))
 
-    env.Te  = Param(time, default=0, doc='External temperature', within=Reals, units=u.deg)
-    env.Tg  = Param(time, default=10, doc='Ground temperature', within=Reals, units=u.deg)
+    env.Te  = Param(time, default=0, mutable=True, doc='External temperature', within=Reals, units=u.deg)
+    env.Tg  = Param(time, default=10, mutable=True, doc='Ground temperature', within=Reals, units=u.deg)
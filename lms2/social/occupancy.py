@@ -34,21 +34,24 @@ def occupancy(occ, **kwargs):
         =============== ===================================================================
 
     :param occ: occupancy block
-    :param kwargs: kwargs for the block construction (time set)
+    :param kwargs: kwargs for the block construction (time set, and index: optional set of the block indexing the
+        parameters before the time, e.g. the dwellings of :func:`lms2.building.dwellings.dwelling_fleet`)
     :return:
     """
     time  = kwargs.pop('time', ContinuousSet(bounds=(0, 1), doc='Time set'))
+    index = kwargs.pop('index', None)
+    sets  = (time,) if index is None else (index, time)
 
     # solar gains are included here because it is treated as a heat gain in the graph description
-    occ.Q_sol_N = Param(time, default=0, doc='Northern component solar radiation', within=Reals, units=u.watt)
-    occ.Q_sol_S = Param(time, default=0, doc='Southern component solar radiation', within=Reals, units=u.watt)
-    occ.Q_sol_E = Param(time, default=0, doc='Eastern component solar radiation', within=Reals, units=u.watt)
-    occ.Q_sol_W = Param(time, default=0, doc='Western component solar radiation', within=Reals, units=u.watt)
-    occ.Q_int_D = Param(time, default=0, doc='Day zone Internal heat gains', within=Reals, units=u.watt)
-    occ.Q_int_N = Param(time, default=0, doc='Night zone Internal heat gains', within=Reals, units=u.watt)
-
-    occ.Tset_d  = Param(time, default=15, doc='Day zone set temperature', within=Reals, units=u.deg)
-    occ.Tset_n  = Param(time, default=15, doc='Night zone Set temperature', within=Reals, units=u.deg)
-    occ.Flow_HW = Param(time, default=0, doc='HW demand of the occupants', within=Reals, units=u.watt)
-    occ.u_N     = Param(time, default=1, mutable=True, within=NonNegativeReals, doc='comfort coefficient for night zone')
-    occ.u_D     = Param(time, default=1, mutable=True, within=NonNegativeReals, doc='comfort coefficient for day zone')
\ No newline at end of file
+    occ.Q_sol_N = Param(*sets, default=0, mutable=True, doc='Northern component solar radiation', within=Reals, units=u.watt)
+    occ.Q_sol_S = Param(*sets, default=0, mutable=True, doc='Southern component solar radiation', within=Reals, units=u.watt)
+    occ.Q_sol_E = Param(*sets, default=0, mutable=True, doc='Eastern component solar radiation', within=Reals, units=u.watt)
+    occ.Q_sol_W = Param(*sets, default=0, mutable=True, doc='Western component solar radiation', within=Reals, units=u.watt)
+    occ.Q_int_D = Param(*sets, default=0, mutable=True, doc='Day zone Internal heat gains', within=Reals, units=u.watt)
+    occ.Q_int_N = Param(*sets, default=0, mutable=True, doc='Night zone Internal heat gains', within=Reals, units=u.watt)
+
+    occ.Tset_d  = Param(*sets, default=15, mutable=True, doc='Day zone set temperature', within=Reals, units=u.deg)
+    occ.Tset_n  = Param(*sets, default=15, mutable=True, doc='Night zone Set temperature', within=Reals, units=u.deg)
+    occ.Flow_HW = Param(*sets, default=0, mutable=True, doc='HW demand of the occupants', within=Reals, units=u.watt)
+    occ.u_N     = Param(*sets, default=1, mutable=True, within=NonNegativeReals, doc='comfort coefficient for night zone')
+    occ.u_D     = Param(*sets, default=1, mutable=True, within=NonNegativeReals, doc='comfort coefficient for day zone')
\ No newline at end of file
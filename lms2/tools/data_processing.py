@@ -11,97 +11,216 @@ logger = logging.getLogger('lms2.tools.data_processing')
 from pyomo.environ import *
 
 
-def load_data(horizon, component, data, time_index_position=None):
+def _time_positions(horizon, times):
     """
-    Loading of data into the problem.
+    Positions of the time points `times` (in seconds) in the index of the horizon.
 
-    :param m: the model
-    :param data: vector of data (usually indexed by time)
-    :param component: name of the parameter in the model
-    :param index: name of the index in the model
-    :return:
+    Positions are computed with NumPy, and cached in the horizon, so that they are computed only once for each time
+    set of the model.
 
-    See this example_.
+    :param horizon: Time horizon
+    :param times: time points of the model (seconds from the beginning of the horizon)
+    :return: numpy.ndarray of integers
+    """
+
+    times = np.asarray(times, dtype=float)
+    key = times.tobytes()
+    cache = horizon._positions
+    if key in cache:
+        return cache[key]
+
+    index = horizon.index
+    right = np.clip(np.searchsorted(index, times), 0, len(index) - 1)
+    left = np.clip(right - 1, 0, len(index) - 1)
+    pos = np.where(np.abs(index[left] - times) < np.abs(index[right] - times), left, right)
+
+    missing = ~np.isclose(index[pos], times, rtol=0, atol=1e-6)
+    if missing.any():
+        raise KeyError(f'Time points {times[missing][:5]} are not in the horizon index. The model should be '
+                       f'discretized using horizon.nfe.')
+
+    cache[key] = pos
+    return pos
 
-    .. _example: ../examples/microgrid_1.html#Chargement-des-données
 
+def _horizon_values(horizon, data):
     """
-    # Cannot actually test this, because components_slices does not have index_set method.
-    # if data.index.name != component.index_set().name:
-    #     logger.warning('data index and variable index does not have the same name. This could be a source of error...')
+    Values of data over the current horizon, as a numpy array (one value per time step of the horizon).
 
-    if isinstance(component, pyomo.core.base.param.IndexedParam):
-        for i, v in component.items():
-            try:
-                # we set the value of the parameter v to the value of the dataframe at the index i
-                v.set_value(data[horizon.map[i]])
-            except ValueError:
-                print(f'Cannot set value {data[horizon.map[i]]} for {component.name}')
+    :param horizon: Time horizon
+    :param data: pandas.Series indexed by time stamps (or by seconds), or array-like of the length of the horizon
+    :return: numpy.ndarray
+    """
 
-    # if param is a component slice, we cannt iterate over with the iter fonction
-    elif isinstance(component, pyomo.core.base.indexed_component_slice.IndexedComponent_slice):
-        if time_index_position is None:
-            for v in component:
-                index = v.index()[-1]
-                v.set_value(data[horizon.map[index]])
+    if isinstance(data, pd.Series):
+        if not data.index.is_unique:
+            data = data[~data.index.duplicated()]
+        ref = horizon.current if isinstance(data.index, pd.DatetimeIndex) else horizon.index
+        indexer = data.index.get_indexer(ref)
+        if (indexer < 0).any():
+            raise KeyError(f'{ref[indexer < 0][0]} is not in the data index ({data.index[0]}, {data.index[-1]}).')
+        return data.to_numpy()[indexer]
 
-        else:
-            for v in component:
-                index = v.index()[time_index_position]
-                v.set_value(data[horizon.map[index]])
+    values = np.asarray(data)
+    if values.shape != (len(horizon.index),):
+        raise ValueError(f'data should be a pandas.Series, or an array of {len(horizon.index)} values, '
+                         f'not of shape {values.shape}.')
+    return values
 
 
+def _time_data(component, time_index_position=None):
+    """
+    Data objects of a time indexed Param (or of a slice), and their time index.
+
+    The data objects of a Param, or of a slice of a single Param (ex: `m.dist.p_out[1, 0, :]`), are returned with
+    their parent Param and their full indexes, so that values can be assigned in bulk (see :func:`_store_values`).
+    Slices through several components (ex: `m.b[:].p[0]`) have no parent (None).
+
+    :param component: IndexedParam or component slice
+    :param time_index_position: position of the time in the index of the data objects (default: the last one)
+    :return: list of data objects, list of time indexes, parent Param (or None) and list of indexes in the parent
+    """
+
+    pos = -1 if time_index_position is None else time_index_position
+
+    if isinstance(component, pyomo.core.base.param.IndexedParam):
+        keys, datas = zip(*component.items()) if len(component) > 0 else ((), ())
+        times = [k[pos] for k in keys] if keys and isinstance(keys[0], tuple) else list(keys)
+        return list(datas), times, component, list(keys)
+
+    # if param is a component slice, we cannt iterate over with the iter fonction
+    elif isinstance(component, pyomo.core.base.indexed_component_slice.IndexedComponent_slice):
+        items = list(component.expanded_items())
+        if not items:
+            return [], [], None, []
+        keys, datas = zip(*items)
+        parent = datas[0].parent_component()
+        if all(d.parent_component() is parent for d in datas):
+            # expanded keys are the indexes of the data objects in their parent
+            times = [k[pos] for k in keys] if isinstance(keys[0], tuple) else list(keys)
+            return list(datas), times, parent, list(keys)
+
+        # slice through several components, each data object gives its own index
+        indexes = [d.index() for d in datas]
+        times = [k[pos] for k in indexes] if isinstance(indexes[0], tuple) else indexes
+        return list(datas), times, None, indexes
 
     else:
         raise NotImplementedError('Unsupported component type.')
 
 
-def read_data(horizon, path, usecols=None, index_col=0, tz_data='Europe/Paris',
-              fillnan=False, filldict={}, unit='s', method='time', date_parser=None, start_date=None):
+def _store_values(datas, parent, indexes, values):
     """
-    Reading and interpolating data from csv source.
+    Assigns the values to the data objects, in bulk when they share a parent Param.
 
-    This function accepts two types of indexed data :
+    Values of Params whose domain is Any or Reals are stored without the checks of each element (much faster). Invalid
+    values are reported, as when the values are set one by one.
+    """
 
-        - data indexed by a date string ex: '2020/01/01 00:00:00'. In this case,
-          a date-parser might be needed for pandas to parse the date.
-        - data indexed by an integer. In this case, parsing is easier, and the user has to give a start date.
+    if parent is not None:
+        check = parent.domain is not Any and parent.domain is not Reals
+        try:
+            parent.store_values(dict(zip(indexes, values)), check=check)
+            return
+        except ValueError:
+            pass
+
+    for p, x in zip(datas, values):
+        try:
+            p.set_value(x)
+        except ValueError:
+            print(f'Cannot set value {x} for {p.name}')
+
+
+def load_data(horizon, component, data, time_index_position=None):
+    """
+    Loading of data into the problem.
 
-    :param method: interpolation method ('time' for date format index or 'linear' for integer index)
-    :param str date_parser: date format parser, ex: "%Y-%m-%d %H:%M:%S"
-    :param filldict:
-    :param fillnan:
-    :param usecols: list of useful colonnes of the file, ex: [0,1,5,8]
     :param horizon: Time horizon
-    :param path: csv data file
-    :param start_date: starting date (for integer index) ex: '2021-01-01 00:00:00'
-    :param tz_data: time zone information ('UTC' or 'Europe/Paris')
-    :return: pd.DataFrame
+    :param component: time indexed parameter of the model (IndexedParam or slice, ex: `m.dist.p_out[1, 0, :]`)
+    :param data: vector of data (usually indexed by time)
+    :param time_index_position: position of the time in the index of the component (default: the last one)
+    :return:
 
     See this example_.
 
     .. _example: ../examples/microgrid_1.html#Chargement-des-données
 
     """
-    import os
 
-    os.path.exists(path), f'Could not find the path {path}.'
+    load_bulk_data(horizon, [(component, data, time_index_position)])
+
+
+def load_bulk_data(horizon, data):
+    """
+    Loading of data into many components of the problem, in one pass.
+
+    The data is synchronized with the horizon once per profile, and the positions of the time points of the model in
+    the horizon are computed only once per time set (see :func:`load_data`).
+
+    :param horizon: Time horizon
+    :param data: dict (or ComponentMap) of components and data, or list of tuples `(component, data)` or
+        `(component, data, time_index_position)`. Data may also be a tuple `(data, time_index_position)`.
+    :return:
+
+    Example:
+        >>> load_bulk_data(horizon, [(m.pv.p0, data_pv['p_PV']),
+        ...                          (m.charge.p, data_charge['base_load1']),
+        ...                          (m.dist.p_out[1, 0, :], data_P['profil_2'], 2)])
+    """
+
+    items = data.items() if hasattr(data, 'items') else data
+    values = dict()
+
+    for item in items:
+        component, d = item[0], item[1]
+        time_index_position = item[2] if len(item) > 2 else None
+        if isinstance(d, tuple):
+            d, time_index_position = d
+
+        datas, times, parent, indexes = _time_data(component, time_index_position)
+        if not datas:
+            continue
+        pos = _time_positions(horizon, times)
 
+        # the same profile is often loaded in many components
+        if id(d) not in values:
+            values[id(d)] = (d, _horizon_values(horizon, d))
+        _store_values(datas, parent, indexes, values[id(d)][1][pos].tolist())
+
+
+def _parse_csv(path, usecols=None, index_col=0, fillnan=False, filldict={}, unit='s', date_parser=None,
+               start_date=None, chunksize=None):
+    """
+    Reading of a csv source (see :func:`read_data`).
+
+    :param path: csv data file (or buffer)
+    :param chunksize: if given, the file is read by chunks of `chunksize` rows
+    :return: data (pd.DataFrame, indexed by dates), and the type of the index of the csv file
+        (or a generator of those, for each chunk)
+    """
     import datetime
+
     mydateparser = None
     if date_parser is not None:
         mydateparser = lambda x: datetime.datetime.strptime(x, date_parser)  # "%Y %m %d %H:%M:%S"
 
-    # reading data file (all of it)
-    # if usecols is not None:
+    # reading data file (all of it, or by chunks)
     d1 = pd.read_csv(path,
                      index_col=index_col,
                      usecols=usecols,
                      parse_dates=True,
                      dayfirst=True,
-                     date_parser=mydateparser)
-    # else:
-    #     d1 = pd.read_csv(path, index_col=index_col, parse_dates=True, dayfirst=True, date_parser=mydateparser)
+                     date_parser=mydateparser,
+                     chunksize=chunksize)
+
+    if chunksize is not None:
+        return (_prepare(chunk, fillnan, filldict, unit, start_date) for chunk in d1)
+    return _prepare(d1, fillnan, filldict, unit, start_date)
+
+
+def _prepare(d1, fillnan=False, filldict={}, unit='s', start_date=None):
+    """ Indexing by dates and filling of the data read from a csv file (see :func:`read_data`). """
 
     index_type = d1.index.dtype
 
@@ -113,7 +232,6 @@ def read_data(horizon, path, usecols=None, index_col=0, tz_data='Europe/Paris',
             start_date = pd.to_datetime(start_date)
         except:
             logger.error(f'Could not parse the start_date {start_date}')
-        date_index = pd.TimedeltaIndex(d1.index) + pd.Timestamp(start_date)
         d1['date'] = pd.TimedeltaIndex(d1.index, unit=unit) + pd.Timestamp(start_date)
         d1[f'time ({unit})'] = d1.index
         d1 = d1.set_index('date')
@@ -126,25 +244,290 @@ def read_data(horizon, path, usecols=None, index_col=0, tz_data='Europe/Paris',
         except KeyError as e:
             raise e
 
-    # convert date time index to the correct time zone
+    return d1, index_type
+
+
+def _localize(d1, tz_data, tz):
+    """ Convert the date time index of the data to the time zone `tz` (inplace). """
+
     if type(d1.index) == pd.DatetimeIndex:
         if d1.index.tzinfo is None:
-            d1.index = d1.index.tz_localize(tz_data, ambiguous=True, nonexistent='shift_forward').tz_convert(
-                horizon.tz_info)
+            d1.index = d1.index.tz_localize(tz_data, ambiguous=True, nonexistent='shift_forward').tz_convert(tz)
+        else:
+            d1.index = d1.index.tz_convert(tz)
+    else:
+        logger.warning('Could not parse index_col as a date. The time zone of the data cannot be determined.')
+
+
+_day_offsets_cache = dict()
+
+
+def _day_offsets(path, step=2 ** 16, tz_data='Europe/Paris', **options):
+    """
+    Index of byte offsets of a csv file, per day.
+
+    Rows of the file are sampled every `step` bytes, and only the time stamps of the sampled rows are parsed.
+    For each day, the first sampled row is kept. The file must be sorted by time. The index is cached, as long as the
+    file is not modified (one index per file and options, replaced when the file is modified).
+
+    :param path: csv data file
+    :param step: sampling step (bytes)
+    :param tz_data: time zone information of the data
+    :param options: reading options (see :func:`read_data`)
+    :return: header of the file (bytes), and pd.DataFrame of the time stamps (UTC) and offsets of the rows, indexed by
+        days
+    """
+    import io
+    import json
+    import os
+
+    stat = os.stat(path)
+    key = (os.path.abspath(path), step, tz_data, json.dumps(options, sort_keys=True, default=str))
+    version = (stat.st_mtime_ns, stat.st_size)
+    if key in _day_offsets_cache and _day_offsets_cache[key][0] == version:
+        return _day_offsets_cache[key][1:]
+
+    offsets, lines = [], []
+    with open(path, 'rb') as f:
+        header = f.readline()
+        pos = len(header)
+        while pos < stat.st_size:
+            f.seek(pos)
+            if pos != len(header):
+                f.readline()  # end of the previous row
+            start = f.tell()
+            line = f.readline()
+            if line.strip() and (not offsets or start != offsets[-1]):
+                offsets.append(start)
+                lines.append(line if line.endswith(b'\n') else line + b'\n')
+            pos += step
+
+    sample, _ = _parse_csv(io.BytesIO(header + b''.join(lines)), **options)
+    _localize(sample, tz_data, 'UTC')
+    if not sample.index.is_monotonic_increasing:
+        raise ValueError(f'{path} is not sorted by time, and can not be read in stream mode.')
+
+    index = pd.DataFrame({'time': sample.index, 'offset': offsets})
+    index = index.groupby(sample.index.floor('D')).first()
+
+    _day_offsets_cache[key] = version, header, index
+    return header, index
+
+
+def _stream_csv(path, tstart, tend, chunksize=100000, step=2 ** 16, tz_data='Europe/Paris', tz='Europe/Paris',
+                **options):
+    """
+    Reading of the rows of a csv file between tstart and tend only, by chunks (see :func:`read_data`).
+
+    The byte range covering [tstart, tend] is found using the index of byte offsets per day of the file
+    (see :func:`_day_offsets`), only this range is read and parsed.
+
+    :return: data (pd.DataFrame, indexed by dates in the time zone `tz`), and the type of the index of the csv file
+    """
+    import io
+
+    header, index = _day_offsets(path, step=step, tz_data=tz_data, **options)
+
+    i = index['time'].searchsorted(tstart, side='right') - 1
+    j = index['time'].searchsorted(tend, side='right')
+    start = int(index['offset'].iloc[max(i, 0)])
+    end = int(index['offset'].iloc[j]) if j < len(index) else None
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        raw = f.read() if end is None else f.read(end - start)
+
+    chunks, index_type = [], None
+    for d1, index_type in _parse_csv(io.BytesIO(header + raw), chunksize=chunksize, **options):
+        _localize(d1, tz_data, tz)
+        chunks.append(d1[(d1.index >= tstart) & (d1.index <= tend)])
+
+    if not chunks or sum(map(len, chunks)) == 0:
+        raise ValueError(f'No data found in {path} between {tstart} and {tend}.')
+
+    return pd.concat(chunks), index_type
+
+
+def _interp(x, xp, fp):
+    """
+    Linear interpolation of the rows of fp (finite values) at x, vectorized over the rows.
+
+    The formula (and the handling of exact hits and bounds) is the one of `numpy.interp`, so that results are
+    identical.
+    """
+
+    x, xp = np.asarray(x, dtype=float), np.asarray(xp, dtype=float)
+    j = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, len(xp) - 2)
+    res = fp[:, j]
+
+    # exact hits are kept, others are interpolated
+    miss = x != xp[j]
+    if miss.any():
+        jm, xm = j[miss], x[miss]
+        slopes = (fp[:, jm + 1] - fp[:, jm]) / (xp[jm + 1] - xp[jm])
+        res[:, miss] = slopes * (xm - xp[jm]) + fp[:, jm]
+
+    res[:, x >= xp[-1]] = fp[:, -1:]
+    res[:, x < xp[0]] = fp[:, :1]
+    return res
+
+
+def resample(index, values, target, method='time', step=None):
+    """
+    Resampling of data on a target index.
+
+    Indexes are int64 time stamps (for instance `pd.DatetimeIndex.asi8`), and must be sorted. NaN values of the data
+    are ignored (each column is resampled using its valid values only). Available methods are :
+
+        - 'time' : linear interpolation in time. Values before the first valid value are NaN, values after the last
+          valid value are equal to the last valid value.
+        - 'linear' : linear interpolation with respect to the position of the time stamps in the union of both
+          indexes (as `pandas.DataFrame.interpolate(method='linear')` would do on the joined data).
+        - 'pad' : last valid value.
+        - 'mean' : mean of the valid values over [t, t + step) (down-sampling of energy or power data). Intervals
+          without data are interpolated as with 'time'.
+
+    :param index: index of the data (int64, sorted)
+    :param values: data, array of shape (len(index),) or (len(index), n)
+    :param target: target index (int64, sorted)
+    :param method: 'time', 'linear', 'pad' or 'mean'
+    :param step: length of the intervals of the 'mean' method (int64, default: step of the target index)
+    :return: numpy.ndarray of shape (len(target),) or (len(target), n)
+    """
+
+    if method not in ['time', 'linear', 'pad', 'mean']:
+        raise ValueError(f'Unknown resampling method : {method}.')
+
+    index = np.asarray(index, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    values = np.asarray(values)
+    squeeze = values.ndim == 1
+
+    # columns are stored contiguously
+    values = np.ascontiguousarray(values.reshape(len(index), -1).T)
+    valid = ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(values.shape, dtype=bool)
+    out = np.full((values.shape[0], len(target)), np.nan)
+
+    if method == 'mean':
+        if step is None:
+            step = target[1] - target[0] if len(target) > 1 else 1
+        lo, hi = np.searchsorted(index, target), np.searchsorted(index, target + step)
+        zeros = np.zeros((values.shape[0], 1))
+        sums = np.concatenate([zeros, np.cumsum(np.where(valid, values, 0), axis=1)], axis=1)
+        counts = np.concatenate([zeros, np.cumsum(valid, axis=1)], axis=1)
+        n = counts[:, hi] - counts[:, lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (sums[:, hi] - sums[:, lo]) / n
+        out = resample(index, values.T, target, method='time').reshape(len(target), -1).T
+        out[n > 0] = mean[n > 0]
+        return out[0] if squeeze else out.T
+
+    if method == 'linear':
+        # positions of the time stamps in the union of both indexes
+        union = np.union1d(index, target)
+        x, xt = np.searchsorted(union, index), np.searchsorted(union, target)
+    else:
+        x, xt = index, target
+
+    # columns without NaN are resampled all at once (as np.interp would do, for 'time' and 'linear')
+    full = valid.all(axis=1)
+    if method != 'pad':
+        full &= np.isfinite(values).all(axis=1)
+    if full.any() and len(x) > 1:
+        fp = values if full.all() else values[full]
+        if method == 'pad':
+            pos = np.searchsorted(x, xt, side='right') - 1
+            out[np.ix_(full, pos >= 0)] = fp[:, pos[pos >= 0]]
         else:
-            d1.index = d1.index.tz_convert(horizon.tz_info)
+            out[full] = _interp(xt, x, fp)
+            out[np.ix_(full, xt < x[0])] = np.nan
+    else:
+        full[:] = False
+
+    # other columns are resampled one by one
+    for k in np.flatnonzero(~full & valid.any(axis=1)):
+        xv, yv = x[valid[k]], values[k, valid[k]]
+
+        if method == 'pad':
+            pos = np.searchsorted(xv, xt, side='right') - 1
+            out[k, pos >= 0] = yv[pos[pos >= 0]]
+            continue
+
+        res = np.interp(xt, xv, yv)
+        # valid data are kept as is, and leading values are not extrapolated
+        pos = np.searchsorted(xv, xt)
+        hit = pos < len(xv)
+        hit[hit] = xv[pos[hit]] == xt[hit]
+        res[hit] = yv[pos[hit]]
+        res[xt < xv[0]] = np.nan
+        out[k] = res
+
+    return out[0] if squeeze else out.T
+
+
+def _synchronize(horizon, d1, method, index_type):
+    """
+    Synchronizing / Interpolating data to the current horizon date time index (see :func:`read_data`).
+
+    Data are resampled with :func:`resample`. Data that can not be handled by the kernel (non numerical data,
+    duplicated time stamps) are synchronized by joining the data and the horizon with pandas. With the 'mean'
+    method, numerical columns are averaged (duplicated time stamps first) and other columns are padded.
+
+    :param horizon: Time horizon
+    :param d1: data, indexed by dates in the time zone of the horizon
+    :param method: interpolation method
+    :param index_type: type of the index of the data source
+    :return: pd.DataFrame
+    """
+
+    if type(d1.index) == pd.DatetimeIndex:
         # be sure that the current horizon is in the data index set
         assert horizon.current[0] >= d1.index[0], \
             f"Start time {horizon.current[0]} is not include in data index : ({d1.index[0], d1.index[-1]})"
         assert horizon.current[-1] <= d1.index[-1], \
             f"End time {horizon.current[-1]} is not include in data index: ({d1.index[0], d1.index[-1]})"
-    else:
-        logger.warning('Could not parse index_col as a date. The time zone of the data cannot be determined.')
 
-    # Synchronizing / Interpolating data to the current horizon date time index
+    if type(d1.index) != pd.DatetimeIndex or not d1.index.is_unique \
+            or any(d1[c].dtype.kind not in 'biuf' for c in d1.columns) \
+            or (method == 'linear' and index_type != np.int64):
+        return _synchronize_join(horizon, d1, method, index_type)
 
+    if not d1.index.is_monotonic_increasing:
+        d1 = d1.sort_index()
+
+    index, target = d1.index.asi8, horizon.current.asi8
+    values = resample(index, d1.T.to_numpy(dtype=float).T, target, method=method, step=horizon.time_step.value)
+    data_horizon = pd.DataFrame(values, index=horizon.current, columns=d1.columns)
+
+    # without new time stamps, the types of the columns are kept
+    pos = np.searchsorted(index, target)
+    if method != 'mean' and (pos < len(index)).all() and (index[pos] == target).all():
+        data_horizon = data_horizon.astype(d1.dtypes.to_dict())
+
+    return data_horizon
+
+
+def _synchronize_join(horizon, d1, method, index_type):
+    """
+    Synchronizing data to the current horizon, by joining the data and the horizon, and interpolating the
+    union of both indexes with pandas (see :func:`_synchronize`).
+    """
     import warnings
 
+    if method == 'mean':
+        if type(d1.index) != pd.DatetimeIndex:
+            raise ValueError("The 'mean' method needs data indexed by dates.")
+        # duplicated time stamps of numerical columns are averaged, other columns are padded
+        numeric = [c for c in d1.columns if d1[c].dtype.kind in 'biuf']
+        others = [c for c in d1.columns if c not in numeric]
+        parts = []
+        if numeric:
+            parts.append(_synchronize(horizon, d1[numeric].groupby(level=0).mean(), method, index_type))
+        if others:
+            d2 = d1[others][~d1.index.duplicated(keep='last')]
+            parts.append(_synchronize_join(horizon, d2, 'pad', index_type))
+        return pd.concat(parts, axis=1)[d1.columns]
+
     # if data are index by datetime index (of the form : '2021:01:01 00:00:00')
     if type(d1.index) == pd.DatetimeIndex:
         dh1 = pd.DataFrame([np.NaN] * len(horizon.current), index=horizon.current, columns=['tmp'])
@@ -174,6 +557,75 @@ def read_data(horizon, path, usecols=None, index_col=0, tz_data='Europe/Paris',
     return data_horizon
 
 
+def read_data(horizon, path, usecols=None, index_col=0, tz_data='Europe/Paris',
+              fillnan=False, filldict={}, unit='s', method='time', date_parser=None, start_date=None, cache=False,
+              stream=False, margin='1 day', chunksize=100000):
+    """
+    Reading and interpolating data from csv source.
+
+    This function accepts two types of indexed data :
+
+        - data indexed by a date string ex: '2020/01/01 00:00:00'. In this case,
+          a date-parser might be needed for pandas to parse the date.
+        - data indexed by an integer. In this case, parsing is easier, and the user has to give a start date.
+
+    When `cache` is set, the csv file is only parsed once, and stored in a binary columnar cache
+    (see :class:`lms2.tools.profile_store.ProfileStore`). The window of the horizon is then read from the
+    (memory-mapped) cache.
+
+    In stream mode, only the rows of the file between `horizon.TSTART - margin` and `horizon.TEND + margin` are read
+    (by chunks of `chunksize` rows), so that the memory used depends on the length of the horizon, and not on the size
+    of the file. The file must be sorted by time, and the margin must be long enough to contain the values used for
+    the interpolation at the bounds of the horizon.
+
+    :param method: interpolation method ('time' for date format index or 'linear' for integer index, 'pad', or
+        'mean' for down-sampling, see :func:`resample`)
+    :param str date_parser: date format parser, ex: "%Y-%m-%d %H:%M:%S"
+    :param filldict:
+    :param fillnan:
+    :param usecols: list of useful colonnes of the file, ex: [0,1,5,8]
+    :param horizon: Time horizon
+    :param path: csv data file
+    :param start_date: starting date (for integer index) ex: '2021-01-01 00:00:00'
+    :param tz_data: time zone information ('UTC' or 'Europe/Paris')
+    :param cache: use a profile store (True for the default cache directory, or path of the cache directory)
+    :param bool stream: read only the window of the horizon
+    :param margin: margin of the window read in stream mode (default: '1 day')
+    :param int chunksize: number of rows of the chunks read in stream mode
+    :return: pd.DataFrame
+
+    See this example_.
+
+    .. _example: ../examples/microgrid_1.html#Chargement-des-données
+
+    """
+    import os
+
+    os.path.exists(path), f'Could not find the path {path}.'
+
+    if cache:
+        from lms2.tools.profile_store import ProfileStore
+
+        store = ProfileStore(path, cache_dir=None if cache is True else cache, usecols=usecols, index_col=index_col,
+                             tz_data=tz_data, fillnan=fillnan, filldict=filldict, unit=unit,
+                             date_parser=date_parser, start_date=start_date)
+        d1 = store.window(horizon.current[0], horizon.current[-1], tz=horizon.tz_info)
+        index_type = store.index_type
+    elif stream:
+        margin = pd.Timedelta(margin)
+        d1, index_type = _stream_csv(path, horizon.current[0] - margin, horizon.current[-1] + margin,
+                                     chunksize=chunksize, usecols=usecols, index_col=index_col, tz_data=tz_data,
+                                     tz=horizon.tz_info, fillnan=fillnan, filldict=filldict, unit=unit,
+                                     date_parser=date_parser, start_date=start_date)
+    else:
+        d1, index_type = _parse_csv(path, usecols=usecols, index_col=index_col, fillnan=fillnan, filldict=filldict,
+                                    unit=unit, date_parser=date_parser, start_date=start_date)
+        # convert date time index to the correct time zone
+        _localize(d1, tz_data, horizon.tz_info)
+
+    return _synchronize(horizon, d1, method, index_type)
+
+
 def interpolation(input_data, param, time, dt):
     """
     depreciated, use read_data()
@@ -40,50 +40,168 @@ def unfix_binary(model):
                 u.unfix()
 
 
-def get_duals(model, dual_name='dual'):
+def _constraint_names(c):
+    """ Column names of the duals and slacks of a constraint (see :func:`get_duals` and :func:`get_slack`). """
+
+    return c.getname(fully_qualified=True), c.getname(fully_qualified=True).replace('.', '_'), c.getname()
+
+
+def extract_constraints(model, dual_name=None, slacks=False):
+    """
+    Extraction of the duals and/or slacks of all the active indexed constraints of a model, in one pass.
+
+    For each constraint, the values are stored in numpy arrays. The lower and upper slacks are computed from the
+    value of the body of the constraint, evaluated once.
+
+    :param model: model or block
+    :param str dual_name: name of the dual Suffix (duals are not extracted if None)
+    :param bool slacks: extract the lower and upper slacks
+    :return: list of tuples (constraint, indexes, dict of numpy arrays)
+    """
+    import numpy as np
+
+    if dual_name is not None:
+        assert hasattr(model, dual_name), f'"{model.name}" does not have attribute named "{dual_name}".'
+        dual = model.component(dual_name)
+
+    data = []
+    for c in model.component_objects(Constraint, active=True):
+        if not c.is_indexed():
+            Warning('Trying to get dual coefficient from a non-index variable. Not Implemented Yet')
+            continue
+
+        n = len(c)
+        keys, cdata = list(c.keys()), list(c.values())
+        values = dict()
+
+        if dual_name is not None:
+            values['dual'] = np.fromiter((dual[cd] for cd in cdata), dtype=float, count=n)
+
+        if slacks:
+            body = np.fromiter((np.nan if v is None else v for v in (value(cd.body, exception=False) for cd in cdata)),
+                               dtype=float, count=n)
+            lb = np.fromiter((-np.inf if cd.lb is None else cd.lb for cd in cdata), dtype=float, count=n)
+            ub = np.fromiter((np.inf if cd.ub is None else cd.ub for cd in cdata), dtype=float, count=n)
+            values['ls'] = np.where(np.isinf(lb), np.inf, body - lb)
+            values['us'] = np.where(np.isinf(ub), np.inf, ub - body)
+
+        data.append((c, keys, values))
+    return data
+
+
+def _constraints_frame(data, columns):
+    """
+    Build a DataFrame from the data returned by :func:`extract_constraints`.
+
+    :param data: data returned by :func:`extract_constraints`
+    :param columns: function returning the list of couples (column name, value name) of a constraint
+    :return: DataFrame
+    """
+    import numpy as np
+    from pandas import DataFrame, Index, concat
+
+    names = [name for c, _, _ in data for name, _ in columns(c)]
+    if not data:
+        return DataFrame()
+
+    # when all the constraints are indexed by the same set, values are stored in one preallocated array
+    keys = data[0][1]
+    if all(k == keys for _, k, _ in data[1:]):
+        array = np.empty((len(keys), len(names)))
+        j = 0
+        for c, _, values in data:
+            for _, v in columns(c):
+                array[:, j] = values[v]
+                j += 1
+        return DataFrame(array, index=Index(keys), columns=names)
+
+    dims = {len(k[0]) if k and isinstance(k[0], tuple) else 1 for _, k, _ in data}
+    if len(dims) == 1:
+        return concat([DataFrame({name: values[v] for name, v in columns(c)}, index=Index(k))
+                       for c, k, values in data], axis=1)
+
+    # indexes of different dimensions can not be aligned by pandas, the union is built once, with tuples as labels
+    positions = dict()
+    for _, k, _ in data:
+        for i in k:
+            positions.setdefault(i if isinstance(i, tuple) else (i,), len(positions))
+    array = np.full((len(positions), len(names)), np.nan)
+    j = 0
+    for c, k, values in data:
+        rows = np.fromiter((positions[i if isinstance(i, tuple) else (i,)] for i in k), dtype=int, count=len(k))
+        for _, v in columns(c):
+            array[rows, j] = values[v]
+            j += 1
+    labels = np.empty(len(positions), dtype=object)
+    labels[:] = list(positions)
+    return DataFrame(array, index=Index(labels, tupleize_cols=False), columns=names)
+
+
+def _constraints_dataset(data, columns):
+    """
+    Build a xarray Dataset from the data returned by :func:`extract_constraints`. Dimensions of each variable are
+    named after the index sets of the constraints.
+    """
+    import numpy as np
+    from pandas import factorize
+
+    try:
+        import xarray as xr
+    except ImportError as err:
+        raise ImportError('xarray is needed to export constraints data as a Dataset.') from err
+
+    variables = dict()
+    for c, keys, values in data:
+        keys = [k if isinstance(k, tuple) else (k,) for k in keys]
+        n = len(keys[0]) if keys else 0
+
+        dims = []
+        for sub in c.index_set().subsets():
+            dimen = sub.dimen if isinstance(sub.dimen, int) else 0
+            dims += [sub.local_name] if dimen == 1 else [f'{sub.local_name}_{i}' for i in range(dimen)]
+        if len(dims) != n or len(set(dims)) != n:
+            dims = [f'{c.local_name}_dim_{j}' for j in range(n)]
+
+        codes, coords = zip(*(factorize([k[j] for k in keys], sort=True) for j in range(n)))
+        for name, v in columns(c):
+            array = np.full(tuple(len(cj) for cj in coords), np.nan)
+            array[codes] = values[v]
+            variables[name] = xr.DataArray(array, coords=dict(zip(dims, coords)), dims=dims)
+
+    return xr.Dataset(variables)
+
+
+def get_duals(model, dual_name='dual', as_xarray=False):
     """
     Return dual coefficient of LP abstract model.
 
     :param str dual_name: name of the Suffix
+    :param bool as_xarray: return a xarray Dataset, with dimensions named after the index sets of the constraints
 
     :return : Dual coefficient (DataFrame)
     """
-    from pandas import DataFrame, concat
-    from pyomo.environ import Constraint
-    df = DataFrame()
 
-    assert hasattr(model, dual_name), f'"{model.name}" does not have attribute named "{dual_name}".'
+    data = extract_constraints(model, dual_name=dual_name)
+    columns = lambda c: [(_constraint_names(c)[0] + '_' + dual_name, 'dual')]
+    if as_xarray:
+        return _constraints_dataset(data, columns)
+    return _constraints_frame(data, columns)
 
-    for cst in model.component_objects(Constraint, active=True):
-        if cst.is_indexed():
-            s = DataFrame(
-                {cst.getname(fully_qualified=True) + '_' + dual_name: {i: model.component(dual_name)[c]
-                                                                       for (i, c) in cst.iteritems()}})
-            df = concat([df, s], axis=1)
-        else:
-            Warning('Trying to get dual coefficient from a non-index variable. Not Implemented Yet')
-    return df
 
-
-def get_slack(model):
+def get_slack(model, as_xarray=False):
     """
     Return slack variables values for all
     the active constraints of a abstract model.
 
+    :param bool as_xarray: return a xarray Dataset, with dimensions named after the index sets of the constraints
     :return: DataFrame
     """
 
-    from pandas import DataFrame, Series, concat
-
-    df = DataFrame()
-    for c in model.component_objects(Constraint, active=True):
-        if c.is_indexed():
-            s1 = Series({i: c[i].lslack() for i in c.__iter__()})
-            s2 = Series({i: c[i].uslack() for i in c.__iter__()})
-            df_c = DataFrame(
-                {c.getname(fully_qualified=True).replace('.', '_') + '_ls': s1, c.getname() + '_us': s2})
-            df = concat([df, df_c], axis=1)
-    return df
+    data = extract_constraints(model, slacks=True)
+    columns = lambda c: [(_constraint_names(c)[1] + '_ls', 'ls'), (_constraint_names(c)[2] + '_us', 'us')]
+    if as_xarray:
+        return _constraints_dataset(data, columns)
+    return _constraints_frame(data, columns)
 
 
 def get_doc(bloc):
@@ -196,4 +314,47 @@ def construct_objective(self):
     for obj in self.component_map(active=True, ctype=Objective):
         rule = self.component(obj).rule
         self.del_component(obj)
-        self.add_component(obj, Objective(rule=rule))
\ No newline at end of file
+        self.add_component(obj, Objective(rule=rule))
+
+
+def _time_position(component, time):
+    """ Position of the time in the (flattened) indexes of a component (None if it is not indexed by time). """
+
+    if not component.is_indexed():
+        return None
+    k = 0
+    for s in component.index_set().subsets():
+        if s is time:
+            return k
+        k += s.dimen
+    return None
+
+
+def is_time_decomposable(model, time):
+    """
+    Returns True if the time steps of a model are independent, i.e. if each active constraint only involves free
+    variables of one time step (no storage, dynamic or intertemporal constraint), and no free variable that is not
+    indexed by time (e.g. a sizing variable). The problem over the horizon is then a set of independent problems,
+    one per time step (if the objective is a sum over the time steps).
+
+    :param model: model or block
+    :param time: time set of the model
+    :return: bool
+    """
+    from pyomo.core.expr.visitor import identify_variables
+
+    positions = dict()
+    for c in model.component_data_objects(Constraint, active=True, descend_into=True):
+        times = set()
+        for v in identify_variables(c.body, include_fixed=False):
+            parent = v.parent_component()
+            if id(parent) not in positions:
+                positions[id(parent)] = _time_position(parent, time)
+            pos = positions[id(parent)]
+            if pos is None:
+                return False
+            index = v.index()
+            times.add(index[pos] if isinstance(index, tuple) else index)
+            if len(times) > 1:
+                return False
+    return True
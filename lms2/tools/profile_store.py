@@ -0,0 +1,210 @@
+"""binary columnar cache of csv data sources"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from lms2.tools.data_processing import _parse_csv, _localize
+
+logger = logging.getLogger('lms2.tools.profile_store')
+
+__all__ = ['ProfileStore']
+
+
+def _file_hash(path, chunk_size=2 ** 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ProfileStore(object):
+    """
+    Profile store
+
+    Binary, columnar cache of a csv data source. The csv file is parsed once (using the same options as
+    :func:`lms2.tools.data_processing.read_data`), and stored in a directory containing :
+
+        - `index.npy` : sorted index of the data, as int64 epoch time stamps (ns, UTC),
+        - `<k>.npy` : one file per column of the data,
+        - `meta.json` : source file (path, modification time, size and hash), reading options and column names.
+
+    Arrays are memory-mapped, so that a window of the data can be read without loading the whole file.
+    The cache is rebuilt when the source file changes. It is first checked by its modification time and size, and
+    then by its hash (a file that has only been touched is not parsed again).
+
+    A cache is kept for each set of reading options, by default in a `.lms2_cache` directory, next to the source file.
+
+    Example:
+        >>> store = ProfileStore('data/pv_2020.csv', usecols=[0, 2], date_parser="%d/%m/%Y %H:%M")
+        >>> store.window('2020-01-01 00:00:00', '2020-01-02 00:00:00', tz='Europe/Paris')
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, cache_dir=None, mmap=True, usecols=None, index_col=0, tz_data='Europe/Paris',
+                 fillnan=False, filldict={}, unit='s', date_parser=None, start_date=None):
+        """
+
+        :param path: csv data file
+        :param cache_dir: directory of the cache (default: `.lms2_cache`, next to the data file)
+        :param bool mmap: memory-map the cached arrays
+        :param usecols: list of useful colonnes of the file, ex: [0,1,5,8]
+        :param tz_data: time zone information of the data ('UTC' or 'Europe/Paris')
+        :param others: see :func:`lms2.tools.data_processing.read_data`
+        """
+
+        assert os.path.exists(path), f'Could not find the path {path}.'
+
+        self.path = os.path.abspath(path)
+        self.mmap = mmap
+        self.options = dict(usecols=usecols, index_col=index_col, tz_data=tz_data, fillnan=fillnan,
+                            filldict=filldict, unit=unit, date_parser=date_parser,
+                            start_date=None if start_date is None else str(pd.Timestamp(start_date)))
+
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(self.path), '.lms2_cache')
+        key = hashlib.sha1(json.dumps(self.options, sort_keys=True, default=str).encode()).hexdigest()[:12]
+        self.directory = os.path.join(cache_dir, f'{os.path.basename(self.path)}-{key}')
+
+        if not self.is_valid():
+            self.build()
+        self._load()
+
+    def __repr__(self):
+        return f'ProfileStore(path={self.path}, columns={self.columns}, length={len(self)})'
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_valid(self):
+        """
+        Returns True if the cache exists, and corresponds to the current version of the source file.
+        """
+
+        meta = self._read_meta()
+        if meta is None or meta.get('version') != self.VERSION:
+            return False
+
+        stat = os.stat(self.path)
+        if meta['mtime'] == stat.st_mtime_ns and meta['size'] == stat.st_size:
+            return True
+        if meta['size'] != stat.st_size or meta['hash'] != _file_hash(self.path):
+            return False
+
+        # the file has been touched, but not modified
+        meta['mtime'] = stat.st_mtime_ns
+        with open(self._meta_path, 'w') as f:
+            json.dump(meta, f)
+        return True
+
+    def build(self):
+        """
+        Parse the source file, and (re)build the cache.
+        """
+
+        logger.info(f'Building the profile store of {self.path} in {self.directory}.')
+
+        stat = os.stat(self.path)
+        opts = {k: v for k, v in self.options.items() if k != 'tz_data'}
+        d1, index_type = _parse_csv(self.path, **opts)
+        if type(d1.index) != pd.DatetimeIndex:
+            raise ValueError(f'Could not parse the index of {self.path} as dates.')
+        _localize(d1, self.options['tz_data'], 'UTC')
+
+        index = d1.index.asi8
+        order = np.argsort(index, kind='stable')
+        for c in d1.columns:
+            if d1[c].dtype.kind not in 'biuf':
+                raise TypeError(f'Column {c} of {self.path} is not numeric, and can not be stored.')
+
+        # the cache is written in a temporary directory, and then moved
+        tmp = self.directory + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, 'index.npy'), index[order])
+        for k, c in enumerate(d1.columns):
+            np.save(os.path.join(tmp, f'{k}.npy'), d1[c].to_numpy()[order])
+
+        meta = dict(version=self.VERSION, path=self.path, mtime=stat.st_mtime_ns, size=stat.st_size,
+                    hash=_file_hash(self.path), options=self.options, columns=list(map(str, d1.columns)),
+                    index_name=d1.index.name, index_type=str(index_type))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(tmp, self.directory)
+
+    def _load(self):
+        mmap_mode = 'r' if self.mmap else None
+        meta = self._read_meta()
+        self.columns = meta['columns']
+        self.index_name = meta['index_name']
+        self.index_type = np.dtype(meta['index_type'])
+        self.index = np.load(os.path.join(self.directory, 'index.npy'), mmap_mode=mmap_mode)
+        self._data = [np.load(os.path.join(self.directory, f'{k}.npy'), mmap_mode=mmap_mode)
+                      for k in range(len(self.columns))]
+
+    def _bounds(self, tstart, tend):
+        """
+        Positions of the rows needed to interpolate the data over [tstart, tend]: the last valid value before
+        tstart and the first valid value after tend are included for each column.
+        """
+
+        n = len(self.index)
+        i0 = max(np.searchsorted(self.index, pd.Timestamp(tstart).value, side='right') - 1, 0)
+        i1 = min(np.searchsorted(self.index, pd.Timestamp(tend).value, side='left') + 1, n)
+
+        for col in self._data:
+            if col.dtype.kind != 'f':
+                continue
+            while i0 > 0 and np.isnan(col[i0]):
+                valid = np.flatnonzero(~np.isnan(col[max(i0 - 1024, 0):i0]))
+                i0 = max(i0 - 1024, 0) + valid[-1] if len(valid) else max(i0 - 1024, 0)
+            while i1 < n and np.isnan(col[i1 - 1]):
+                valid = np.flatnonzero(~np.isnan(col[i1:i1 + 1024]))
+                i1 = i1 + valid[0] + 1 if len(valid) else min(i1 + 1024, n)
+
+        return i0, i1
+
+    def window(self, tstart=None, tend=None, tz='Europe/Paris'):
+        """
+        Reads the data needed over [tstart, tend] (the whole data by default).
+
+        :param tstart: start time stamp (tz-aware, or in the time zone `tz`)
+        :param tend: end time stamp (tz-aware, or in the time zone `tz`)
+        :param tz: time zone of the returned index
+        :return: pd.DataFrame
+        """
+
+        def _stamp(t):
+            t = pd.Timestamp(t)
+            return t.tz_localize(tz) if t.tzinfo is None else t
+
+        i0 = 0 if tstart is None else None
+        i1 = len(self) if tend is None else None
+        if i0 is None or i1 is None:
+            j0, j1 = self._bounds(_stamp(tstart) if tstart is not None else self.index[0],
+                                  _stamp(tend) if tend is not None else self.index[-1])
+            i0 = j0 if i0 is None else i0
+            i1 = j1 if i1 is None else i1
+
+        index = pd.DatetimeIndex(np.array(self.index[i0:i1]), tz='UTC', name=self.index_name).tz_convert(tz)
+        return pd.DataFrame({c: np.array(d[i0:i1]) for c, d in zip(self.columns, self._data)}, index=index)
@@ -0,0 +1,289 @@
+"""profiling of the construction of models"""
+
+import functools
+import json
+import logging
+import time
+import tracemalloc
+
+from pyomo.environ import Block, Var, Constraint, Param, Expression, Objective
+from pyomo.dae import DerivativeVar
+from pyomo.core.base.transformation import Transformation, TransformationFactory
+
+logger = logging.getLogger('lms2.tools.profiling')
+
+__all__ = ['BuildProfiler']
+
+
+class _Node(object):
+    """ Construction of a component (or application of a transformation), and its nested constructions. """
+
+    __slots__ = ('path', 'kind', 'time', 'memory', 'variables', 'constraints', 'skips', 'children', 'component',
+                 '_mem0', '_peak')
+
+    def __init__(self, path, kind, component=None):
+        self.path = path
+        self.kind = kind
+        self.component = component
+        self.time = 0.
+        self.memory = 0
+        self.variables = 0
+        self.constraints = 0
+        self.skips = 0
+        self.children = []
+
+    def totals(self):
+        """ Returns the number of variables, constraints and skipped constraints created by the node and its
+        children. """
+
+        v, c, s = self.variables, self.constraints, self.skips
+        for child in self.children:
+            cv, cc, cs = child.totals()
+            v, c, s = v + cv, c + cc, s + cs
+        return v, c, s
+
+    def to_dict(self):
+        variables, constraints, skips = self.totals()
+        children = dict()
+        for child in self.children:
+            key, k = child.path, 1
+            while key in children:
+                k += 1
+                key = f'{child.path}#{k}'
+            children[key] = child.to_dict()
+        return dict(kind=self.kind, time=self.time, memory=self.memory, variables=variables,
+                    constraints=constraints, skips=skips, children=children)
+
+
+def _counts(component):
+    """ Number of variables, constraints and skipped constraints of a constructed component. """
+
+    if isinstance(component, Var):
+        return len(component), 0, 0
+    if isinstance(component, Constraint):
+        skips = 0
+        if component.is_indexed() and component.index_set().isfinite():
+            skips = len(component.index_set()) - len(component)
+        return 0, len(component), skips
+    return 0, 0, 0
+
+
+def _transformation_name(transformation):
+    for name in TransformationFactory:
+        if TransformationFactory.get_class(name) is type(transformation):
+            return name
+    return type(transformation).__name__
+
+
+def _model_counts(model):
+    return sum(len(v) for v in model.component_objects((Var, DerivativeVar), descend_into=True)), \
+           sum(len(c) for c in model.component_objects(Constraint, descend_into=True))
+
+
+class BuildProfiler(object):
+    """
+    Build profiler
+
+    Opt-in instrumentation of the construction of models. While the profiler is active (as a context manager), the
+    construction of blocks (and of their rules), variables, constraints, parameters, expressions and objectives, as
+    well as the application of transformations (e.g. `dae.finite_difference` or `network.expand_arcs`), are recorded
+    with :
+
+        - the wall time,
+        - the peak memory increase during the construction (if `memory` is True, using tracemalloc),
+        - the number of variables, constraints and skipped constraints (indexes for which the rule returned
+          `Constraint.Skip`) created.
+
+    Constructions are nested: the components created by the rule of a block are children of the block.
+    The report is available as text (:meth:`report`) or as a dictionary keyed by component path
+    (:meth:`to_dict` and :meth:`to_json`).
+
+    The construct methods of pyomo components are patched while the profiler is active, only one profiler may thus
+    be active at a time.
+
+    Example:
+        >>> with BuildProfiler() as prof:
+        ...     m = LModel()
+        ...     m.time = ContinuousSet(bounds=(0, 86400))
+        ...     m.bat = Block(rule=lambda b: battery_v2(b, time=m.time))
+        ...     TransformationFactory('dae.finite_difference').apply_to(m, nfe=96)
+        >>> print(prof.report(depth=2))
+        >>> prof.to_json('build.json')
+    """
+
+    components = (Block, Var, Constraint, Param, Expression, Objective)
+
+    _active = None
+
+    def __init__(self, memory=True):
+        """
+
+        :param bool memory: record the peak memory increase of each construction (slows down the construction)
+        """
+
+        self.memory = memory
+        self.root = _Node('root', 'Profile')
+        self._stack = []
+        self._patched = []
+        self._tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """ Starts the instrumentation. """
+
+        if BuildProfiler._active is not None:
+            raise RuntimeError('A BuildProfiler is already active.')
+        BuildProfiler._active = self
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+        for cls in self.components:
+            self._patch(cls, 'construct', self._wrap_construct)
+        self._patch(Transformation, 'apply_to', self._wrap_transformation)
+
+        self._stack = [self.root]
+        self._enter(self.root)
+
+    def stop(self):
+        """ Stops the instrumentation, and restores the construct methods of pyomo components. """
+
+        if BuildProfiler._active is not self:
+            return
+        self._exit(self.root)
+        for cls, name, method in reversed(self._patched):
+            setattr(cls, name, method)
+        self._patched = []
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        BuildProfiler._active = None
+
+    def _patch(self, cls, name, wrapper):
+        method = cls.__dict__[name]
+        self._patched.append((cls, name, method))
+        setattr(cls, name, wrapper(method))
+
+    def _enter(self, node):
+        node.time = time.perf_counter()
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # the peak of the parent is kept, before measuring the peak of the node
+            parent = self._stack[-2] if len(self._stack) > 1 else None
+            if parent is not None:
+                parent._peak = max(parent._peak, peak)
+            tracemalloc.reset_peak()
+            node._mem0, node._peak = current, current
+
+    def _exit(self, node):
+        node.time = time.perf_counter() - node.time
+        if self.memory:
+            node._peak = max(node._peak, tracemalloc.get_traced_memory()[1])
+            node.memory = node._peak - node._mem0
+            parent = self._stack[-2] if len(self._stack) > 1 else None
+            if parent is not None:
+                parent._peak = max(parent._peak, node._peak)
+
+    def _push(self, node):
+        self._stack[-1].children.append(node)
+        self._stack.append(node)
+        self._enter(node)
+
+    def _pop(self, node):
+        self._exit(node)
+        self._stack.pop()
+
+    def _wrap_construct(self, method):
+        profiler = self
+
+        @functools.wraps(method)
+        def construct(component, *args, **kwargs):
+            if component._constructed or profiler._stack[-1].component is component:
+                return method(component, *args, **kwargs)
+
+            node = _Node(component.name, component.ctype.__name__, component)
+            profiler._push(node)
+            try:
+                return method(component, *args, **kwargs)
+            finally:
+                profiler._pop(node)
+                node.component = None
+                node.path = component.name
+                node.variables, node.constraints, node.skips = _counts(component)
+
+        return construct
+
+    def _wrap_transformation(self, method):
+        profiler = self
+
+        @functools.wraps(method)
+        def apply_to(transformation, model, **kwds):
+            node = _Node(f'{_transformation_name(transformation)}({model.name})', 'Transformation')
+            v0, c0 = _model_counts(model)
+            profiler._push(node)
+            try:
+                return method(transformation, model, **kwds)
+            finally:
+                profiler._pop(node)
+                v1, c1 = _model_counts(model)
+                cv, cc, _ = node.totals()
+                node.variables, node.constraints = v1 - v0 - cv, c1 - c0 - cc
+
+        return apply_to
+
+    def to_dict(self):
+        """
+        Returns the report as a nested dictionary, keyed by component path. Each entry contains the kind of the
+        component, the wall time (s), the peak memory increase (bytes), the number of variables, constraints and
+        skipped constraints created (children included), and its children.
+        """
+
+        return self.root.to_dict()['children']
+
+    def to_json(self, path=None, **kwargs):
+        """
+        Returns the report in json format (see :meth:`to_dict`), and saves it if a path is given.
+
+        :param path: path of the json file (optional)
+        :return: str
+        """
+
+        s = json.dumps(self.to_dict(), **kwargs)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(s)
+        return s
+
+    def report(self, depth=None, min_time=0.):
+        """
+        Returns the report as a text table.
+
+        :param int depth: maximum depth of the displayed constructions
+        :param float min_time: constructions faster than `min_time` (s) are not displayed
+        :return: str
+        """
+
+        lines = [f'{"component":<60} {"kind":<15} {"time (s)":>10} {"memory (MB)":>12} '
+                 f'{"variables":>10} {"constraints":>12} {"skips":>8}']
+
+        def _lines(node, level):
+            if depth is not None and level >= depth:
+                return
+            for child in node.children:
+                if child.time < min_time:
+                    continue
+                v, c, s = child.totals()
+                name = '  ' * level + child.path
+                lines.append(f'{name:<60} {child.kind:<15} {child.time:>10.4f} {child.memory / 2 ** 20:>12.3f} '
+                             f'{v:>10} {c:>12} {s:>8}')
+                _lines(child, level + 1)
+
+        _lines(self.root, 0)
+        return '\n'.join(lines)
@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import ConcreteModel, Param, RangeSet, TransformationFactory, value
+from pyomo.dae import ContinuousSet
+
+from lms2.core.horizon import SimpleHorizon
+from lms2.tools.data_processing import load_data, load_bulk_data, read_data, resample, _synchronize, \
+    _synchronize_join
+
+
+class TestLoadData(unittest.TestCase):
+
+    def setUp(self):
+        self.horizon = SimpleHorizon(tstart='2021-01-01 00:00:00', tend='2021-01-02 00:00:00', time_step='1 hour')
+        self.data = pd.Series(np.arange(len(self.horizon.current), dtype=float), index=self.horizon.current)
+
+        m = ConcreteModel()
+        m.time = ContinuousSet(bounds=(0, self.horizon.horizon.total_seconds()))
+        TransformationFactory('dae.finite_difference').apply_to(m, wrt=m.time, nfe=self.horizon.nfe)
+        m.nodes = RangeSet(0, 2)
+        m.p = Param(m.time, mutable=True, default=0)
+        m.q = Param(m.nodes, m.time, mutable=True, default=0)
+        self.m = m
+
+    def test_indexed_param(self):
+        m = self.m
+        load_data(self.horizon, m.p, self.data)
+        self.assertEqual([value(m.p[t]) for t in m.time], list(self.data.values))
+
+    def test_slice(self):
+        m = self.m
+        load_data(self.horizon, m.q[1, :], self.data)
+        self.assertEqual([value(m.q[1, t]) for t in m.time], list(self.data.values))
+        self.assertEqual(sum(value(m.q[0, t]) for t in m.time), 0)
+
+        load_data(self.horizon, m.q[:, :], 2 * self.data, time_index_position=1)
+        self.assertEqual([value(m.q[2, t]) for t in m.time], list(2 * self.data.values))
+
+    def test_bulk(self):
+        m = self.m
+        load_bulk_data(self.horizon, [(m.p, self.data), (m.q[0, :], self.data.values)])
+        self.assertEqual([value(m.p[t]) for t in m.time], list(self.data.values))
+        self.assertEqual([value(m.q[0, t]) for t in m.time], list(self.data.values))
+
+        # positions are computed once for the time set
+        self.assertEqual(len(self.horizon._positions), 1)
+
+        load_bulk_data(self.horizon, [(m.q[:, :], (self.data, 1))])
+        self.assertEqual([value(m.q[2, t]) for t in m.time], list(self.data.values))
+
+    def test_missing_data(self):
+        with self.assertRaises(KeyError):
+            load_data(self.horizon, self.m.p, self.data.iloc[:-1])
+
+
+class TestReadData(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'data.csv')
+        index = pd.date_range('2021-01-01 00:00:00', '2021-02-01 00:00:00', freq='10 min')
+        df = pd.DataFrame({'a': np.random.rand(len(index)), 'b': np.arange(len(index))},
+                          index=pd.Index(index.strftime('%Y-%m-%d %H:%M:%S'), name='Time'))
+        df.to_csv(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_stream(self):
+        horizon = SimpleHorizon(tstart='2021-01-10 12:00:00', tend='2021-01-12 12:00:00', time_step='15 min')
+        for method in ['time', 'pad']:
+            ref = read_data(horizon, self.path, method=method)
+            streamed = read_data(horizon, self.path, method=method, stream=True, margin='1 hour', chunksize=50)
+            pd.testing.assert_frame_equal(ref, streamed)
+
+    def test_stream_modified(self):
+        """ the index of the file is replaced, and not accumulated, when the file is modified """
+        from lms2.tools.data_processing import _day_offsets_cache
+
+        horizon = SimpleHorizon(tstart='2021-01-10 12:00:00', tend='2021-01-12 12:00:00', time_step='15 min')
+        read_data(horizon, self.path, stream=True)
+        n = len(_day_offsets_cache)
+
+        df = pd.read_csv(self.path, index_col=0)
+        df['a'] = -1.
+        df.to_csv(self.path)
+        os.utime(self.path, ns=(0, 0))
+        streamed = read_data(horizon, self.path, stream=True)
+        self.assertEqual(len(_day_offsets_cache), n)
+        self.assertTrue((streamed['a'] == -1.).all())
+
+    def test_stream_bounds(self):
+        horizon = SimpleHorizon(tstart='2021-01-31 00:00:00', tend='2021-02-02 00:00:00', time_step='15 min')
+        with self.assertRaises(AssertionError):
+            read_data(horizon, self.path, stream=True)
+
+
+class TestResample(unittest.TestCase):
+
+    def setUp(self):
+        index = pd.date_range('2021-01-01 00:00:00', '2021-01-03 00:00:00', freq='7 min', tz='Europe/Paris')
+        self.data = pd.DataFrame({'a': np.random.rand(len(index)), 'b': np.arange(len(index))}, index=index)
+        self.data.iloc[100:120, 0] = np.nan
+        self.horizon = SimpleHorizon(tstart='2021-01-01 06:00:00', tend='2021-01-02 06:00:00', time_step='5 min')
+
+    def test_join_equivalence(self):
+        for method, index_type in [('time', self.data.index.dtype), ('pad', self.data.index.dtype),
+                                   ('linear', np.int64)]:
+            ref = _synchronize_join(self.horizon, self.data, method, index_type)
+            res = _synchronize(self.horizon, self.data, method, index_type)
+            pd.testing.assert_frame_equal(ref, res, check_exact=True, check_freq=False)
+
+    def test_mean(self):
+        horizon = SimpleHorizon(tstart='2021-01-01 06:00:00', tend='2021-01-02 06:00:00', time_step='1 hour')
+        res = _synchronize(horizon, self.data, 'mean', self.data.index.dtype)
+        ref = self.data.resample('1H').mean().loc[horizon.current]
+        np.testing.assert_allclose(res.values[ref.notna()], ref.values[ref.notna()])
+
+        # intervals without valid data are interpolated
+        self.assertFalse(res.isna().any().any())
+
+    def test_mean_fallback(self):
+        horizon = SimpleHorizon(tstart='2021-01-01 06:00:00', tend='2021-01-02 06:00:00', time_step='1 hour')
+        ref = _synchronize(horizon, self.data, 'mean', self.data.index.dtype)
+
+        # non numerical column
+        data = self.data.assign(c=[f'v{k}' for k in range(len(self.data))])
+        res = _synchronize(horizon, data, 'mean', data.index.dtype)
+        self.assertEqual(list(res.columns), ['a', 'b', 'c'])
+        pd.testing.assert_frame_equal(res[['a', 'b']], ref, check_freq=False)
+        pad = _synchronize(horizon, data[['c']], 'pad', data.index.dtype)
+        pd.testing.assert_series_equal(res['c'], pad['c'], check_freq=False)
+
+        # duplicated time stamps are averaged
+        data = pd.concat([self.data, self.data.iloc[::10] + 1.]).sort_index()
+        res = _synchronize(horizon, data, 'mean', data.index.dtype)
+        ref = _synchronize(horizon, data.groupby(level=0).mean(), 'mean', data.index.dtype)
+        pd.testing.assert_frame_equal(res, ref, check_freq=False)
+
+        with self.assertRaises(ValueError):
+            _synchronize(horizon, self.data.reset_index(drop=True), 'mean', np.int64)
+
+    def test_bounds(self):
+        res = resample([0, 10, 20], [0., np.nan, 2.], [-5, 0, 5, 15, 25], method='time')
+        np.testing.assert_equal(res, [np.nan, 0., 0.5, 1.5, 2.])
+        res = resample([0, 10, 20], [0., np.nan, 2.], [-5, 0, 5, 15, 25], method='pad')
+        np.testing.assert_equal(res, [np.nan, 0., 0., 0., 2.])
+
+
+if __name__ == '__main__':
+    unittest.main()
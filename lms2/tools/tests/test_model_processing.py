@@ -0,0 +1,95 @@
+import unittest
+
+import numpy as np
+from pyomo.environ import ConcreteModel, Constraint, Var, Set, Suffix, Block, Objective
+
+from lms2.tools.model_processing import extract_constraints, get_duals, get_slack, is_time_decomposable
+
+
+class TestConstraintsExtraction(unittest.TestCase):
+
+    def setUp(self):
+        m = ConcreteModel()
+        m.time = Set(initialize=[0, 1, 2])
+        m.nodes = Set(initialize=['a', 'b'])
+        m.x = Var(m.nodes, m.time, initialize=1)
+        m.b = Block()
+        m.b.y = Var(m.time, initialize=2)
+        m.c1 = Constraint(m.nodes, m.time, rule=lambda m, n, t: (0, m.x[n, t], 3))
+        m.b.c2 = Constraint(m.time, rule=lambda b, t: b.y[t] >= 0.5)
+        m.obj = Objective(expr=0)
+        m.dual = Suffix(direction=Suffix.IMPORT)
+        for k, c in enumerate(m.c1.values()):
+            m.dual[c] = k
+        for c in m.b.c2.values():
+            m.dual[c] = -1
+        self.m = m
+
+    def test_extract(self):
+        data = extract_constraints(self.m, dual_name='dual', slacks=True)
+        self.assertEqual([c.name for c, _, _ in data], ['c1', 'b.c2'])
+        c, keys, values = data[0]
+        self.assertEqual(keys, list(self.m.c1.keys()))
+        np.testing.assert_array_equal(values['dual'], np.arange(6))
+        np.testing.assert_array_equal(values['ls'], np.ones(6))
+        np.testing.assert_array_equal(values['us'], 2 * np.ones(6))
+        np.testing.assert_array_equal(data[1][2]['us'], np.inf)
+
+    def test_duals(self):
+        df = get_duals(self.m)
+        self.assertEqual(list(df.columns), ['c1_dual', 'b.c2_dual'])
+        self.assertEqual(len(df), 9)
+        self.assertEqual(df.at[('b', 2), 'c1_dual'], 5)
+        self.assertTrue(np.isnan(df.at[('b', 2), 'b.c2_dual']))
+        self.assertEqual(df.at[(1,), 'b.c2_dual'], -1)
+
+    def test_duals_same_index(self):
+        self.m.c1.deactivate()
+        df = get_duals(self.m)
+        self.assertEqual(list(df.index), [0, 1, 2])
+        self.assertEqual(list(df['b.c2_dual']), [-1, -1, -1])
+
+    def test_slack(self):
+        df = get_slack(self.m)
+        self.assertEqual(list(df.columns), ['c1_ls', 'c1_us', 'b_c2_ls', 'c2_us'])
+        self.assertEqual(df.at[(2,), 'b_c2_ls'], 1.5)
+
+    def test_xarray(self):
+        ds = get_duals(self.m, as_xarray=True)
+        self.assertEqual(ds['c1_dual'].dims, ('nodes', 'time'))
+        self.assertEqual(ds['b.c2_dual'].dims, ('time',))
+        self.assertEqual(float(ds['c1_dual'].sel(nodes='b', time=2)), 5)
+
+
+class TestTimeDecomposable(unittest.TestCase):
+
+    def setUp(self):
+        m = ConcreteModel()
+        m.time = Set(initialize=[0, 1, 2])
+        m.nodes = Set(initialize=['a', 'b'])
+        m.x = Var(m.nodes, m.time)
+        m.e = Var(m.time)
+        m.c = Constraint(m.time, rule=lambda m, t: m.x['a', t] + m.x['b', t] == 1)
+        self.m = m
+
+    def test_independent(self):
+        self.assertTrue(is_time_decomposable(self.m, self.m.time))
+
+    def test_storage(self):
+        m = self.m
+        m.dyn = Constraint(m.time, rule=lambda m, t: Constraint.Skip if t == 0 else m.e[t] == m.e[t - 1] + m.x['a', t])
+        self.assertFalse(is_time_decomposable(m, m.time))
+
+        # with fixed states, the time steps are independent again
+        m.e.fix(0)
+        self.assertTrue(is_time_decomposable(m, m.time))
+
+    def test_not_indexed(self):
+        m = self.m
+        m.size = Var()
+        m.c_size = Constraint(m.time, rule=lambda m, t: m.x['a', t] <= m.size)
+        self.assertFalse(is_time_decomposable(m, m.time))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lms2.core.horizon import SimpleHorizon
+from lms2.tools.data_processing import read_data
+from lms2.tools.profile_store import ProfileStore
+
+
+class TestProfileStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'data.csv')
+        index = pd.date_range('2021-01-01 00:00:00', '2021-01-10 00:00:00', freq='10 min')
+        values = np.arange(len(index), dtype=float)
+        values[100:110] = np.nan
+        self.df = pd.DataFrame({'a': values, 'b': 2 * np.arange(len(index))},
+                               index=pd.Index(index.strftime('%Y-%m-%d %H:%M:%S'), name='Time'))
+        self.df.to_csv(self.path)
+        self.horizon = SimpleHorizon(tstart='2021-01-01 12:00:00', tend='2021-01-02 12:00:00', time_step='15 min')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_read_data(self):
+        for method in ['time', 'pad']:
+            ref = read_data(self.horizon, self.path, method=method)
+            cached = read_data(self.horizon, self.path, method=method, cache=True)
+            pd.testing.assert_frame_equal(ref, cached)
+            cached = read_data(self.horizon, self.path, method=method, cache=True)
+            pd.testing.assert_frame_equal(ref, cached)
+
+    def test_window(self):
+        store = ProfileStore(self.path)
+        self.assertEqual(store.columns, ['a', 'b'])
+        self.assertEqual(len(store), len(self.df))
+
+        d = store.window('2021-01-01 16:40:00', '2021-01-01 17:00:00')
+        # the window is extended to the last (first) valid value before (after) the window
+        self.assertEqual(d['a'].iloc[0], 99.)
+        self.assertEqual(d['a'].iloc[-1], 110.)
+        self.assertEqual(d['b'].iloc[-1], 2 * 110)
+
+    def test_invalidation(self):
+        store = ProfileStore(self.path)
+        self.assertTrue(store.is_valid())
+
+        os.utime(self.path, ns=(0, 0))
+        self.assertTrue(ProfileStore(self.path).is_valid())
+
+        self.df['a'] = 1.
+        self.df.to_csv(self.path)
+        self.assertFalse(store.is_valid())
+        self.assertEqual(ProfileStore(self.path).window()['a'].sum(), len(self.df))
+
+
+if __name__ == '__main__':
+    unittest.main()
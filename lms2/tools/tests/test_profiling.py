@@ -0,0 +1,59 @@
+import json
+import unittest
+
+from pyomo.environ import Block, Constraint, TransformationFactory, Var
+from pyomo.dae import ContinuousSet, DerivativeVar
+
+from lms2.core.models import LModel
+from lms2.tools.profiling import BuildProfiler
+
+
+def _model():
+    m = LModel()
+    m.time = ContinuousSet(bounds=(0, 10))
+
+    def rule(b):
+        b.x = Var(m.time)
+        b.dx = DerivativeVar(b.x, wrt=m.time)
+
+    m.b = Block(rule=rule)
+    m.c = Constraint(range(10), rule=lambda m, i: Constraint.Skip if i % 2 else m.b.x[0] >= i)
+    TransformationFactory('dae.finite_difference').apply_to(m, nfe=4)
+    return m
+
+
+class TestBuildProfiler(unittest.TestCase):
+
+    def test_report(self):
+        with BuildProfiler() as prof:
+            m = _model()
+        d = prof.to_dict()
+
+        self.assertEqual(d['b']['kind'], 'Block')
+        self.assertIn('b.x', d['b']['children'])
+        self.assertEqual(d['c'], dict(kind='Constraint', time=d['c']['time'], memory=d['c']['memory'],
+                                      variables=0, constraints=5, skips=5, children={}))
+
+        # the transformation creates the discretization points and equations
+        t = d[f'dae.finite_difference({m.name})']
+        self.assertEqual(t['variables'], 2 * 5 - 2 * 2)
+        self.assertEqual(t['constraints'], 4)
+        self.assertIn('b.dx_disc_eq', t['children'])
+
+        self.assertEqual(json.loads(prof.to_json()), d)
+        self.assertIn('b.x', prof.report())
+        self.assertNotIn('b.x', prof.report(depth=1))
+
+    def test_restore(self):
+        construct = Var.construct
+        with BuildProfiler(memory=False) as prof:
+            self.assertIsNot(Var.construct, construct)
+            with self.assertRaises(RuntimeError):
+                BuildProfiler().start()
+            _model()
+        self.assertIs(Var.construct, construct)
+        self.assertEqual(prof.to_dict()['b']['memory'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()